@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Compare the sync and async cf_get clients against a stub Codeforces API
+with a fixed latency: the latency of one get_contest_info call (which makes
+a contest.standings and a user.info call), and the throughput of many
+concurrent calls served by a fixed number of sync workers or by one event loop.
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import sys
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from os.path import dirname, abspath
+
+BASE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from devel.stub_cf_api import start_stub_server
+from main import cf_get
+
+HANDLES = ['user{}'.format(i) for i in range(50)]
+
+async def gather_calls(n):
+    # type: (int) -> None
+    await asyncio.gather(*[cf_get.get_contest_info_async(i, HANDLES, True) for i in range(n)])
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.2, help='Stub API latency in seconds')
+    parser.add_argument('--calls', type=int, default=40, help='Concurrent calls in the throughput test')
+    parser.add_argument('--workers', type=int, default=4, help='Number of simulated sync workers')
+    args = parser.parse_args()
+
+    server = start_stub_server(latency=args.latency)
+    cf_get.configure(base_url=server.base_url, pool_maxsize=2 * args.calls) # type: ignore
+    loop = asyncio.new_event_loop()
+    loop.set_default_executor(ThreadPoolExecutor(2 * args.calls))
+
+    start = time.perf_counter()
+    cf_get.get_contest_info(1, HANDLES, True)
+    sync_latency = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loop.run_until_complete(cf_get.get_contest_info_async(1, HANDLES, True))
+    async_latency = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.workers) as executor:
+        list(executor.map(lambda i: cf_get.get_contest_info(i, HANDLES, True), range(args.calls)))
+    sync_total = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loop.run_until_complete(gather_calls(args.calls))
+    async_total = time.perf_counter() - start
+
+    print('single call:  sync {:.0f} ms   async {:.0f} ms'.format(sync_latency * 1000, async_latency * 1000))
+    print('{} calls:     {} sync workers {:.1f} calls/s   event loop {:.1f} calls/s'.format(
+        args.calls, args.workers, args.calls / sync_total, args.calls / async_total))
+    loop.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Compare per-request latency of a fresh requests.Session per API call
+(the old behaviour of cf_get.log_and_request) with the pooled session,
+against a stub Codeforces API running on localhost.
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import sys
+import time
+import argparse
+from os.path import dirname, abspath
+
+import requests
+
+from typing import Callable, List
+
+BASE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from devel.stub_cf_api import start_stub_server
+from main import cf_get
+
+def fresh_session_request(**kwargs):
+    # type: (**object) -> requests.Response
+    prequest = requests.Request('GET', **kwargs).prepare() # type: ignore
+    with requests.Session() as session:
+        return session.send(prequest)
+
+def measure(request_func, url, n):
+    # type: (Callable[..., requests.Response], str, int) -> List[float]
+    timings = []
+    for i in range(n):
+        start = time.perf_counter()
+        request_func(url=url, params={'handles': 'tourist;Petr'})
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def summary(name, timings):
+    # type: (str, List[float]) -> str
+    timings = sorted(timings)
+    p50 = timings[len(timings) // 2]
+    p90 = timings[int(len(timings) * 0.9)]
+    return '{:<16} p50 {:8.3f} ms   p90 {:8.3f} ms   mean {:8.3f} ms'.format(
+        name, p50 * 1000, p90 * 1000, sum(timings) / len(timings) * 1000)
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=500, help='Requests per variant')
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    url = server.base_url + '/user.info' # type: ignore
+
+    fresh = measure(fresh_session_request, url, args.n)
+    pooled = measure(cf_get.log_and_request, url, args.n)
+    print(summary('fresh session', fresh))
+    print(summary('pooled session', pooled))
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Measure how long registering thousands of handles takes, with the old add
+users path (user.info for each chunk, then a query or two per handle) and
+with main.importing (bulk writes per chunk).
+Uses a stub Codeforces API on localhost and a temporary SQLite database.
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+from os.path import dirname, abspath
+
+BASE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project_conf.settings")
+
+from django.conf import settings
+
+DB_DIR = tempfile.mkdtemp()
+settings.DATABASES = {'default': {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': os.path.join(DB_DIR, 'bench.sqlite3'),
+}}
+
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+
+from devel.stub_cf_api import start_stub_server
+from main import cf_get
+from main import importing
+from main.models import Handle
+
+from typing import List
+
+def import_old(handles):
+    # type: (List[str]) -> None
+    # What main.views.index used to do, a chunk of handles at a time.
+    for chunk in cf_get.chunked(handles, settings.CF_API_HANDLES_PER_REQUEST):
+        for cf_user in cf_get.get_user_info(chunk):
+            try:
+                user = User.objects.get(username=cf_user.username)
+                user.first_name = cf_user.first_name
+                user.last_name = cf_user.last_name
+                user.save()
+            except User.DoesNotExist:
+                User.objects.create_user(cf_user.username, first_name=cf_user.first_name,
+                    last_name=cf_user.last_name)
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=5000, help='Number of handles')
+    parser.add_argument('--latency', type=float, default=0.05,
+        help='Latency of the stub API in seconds')
+    args = parser.parse_args()
+
+    server = start_stub_server(latency=args.latency)
+    cf_get.configure(base_url=server.base_url)
+    # The stub has no call limit.
+    cf_get.rate_limiter = None
+    call_command('migrate', verbosity=0)
+    handles = ['user{}'.format(i) for i in range(args.count)]
+
+    print('{} handles'.format(args.count))
+    for name, func in [('old', import_old), ('bulk', importing.import_handles)]:
+        for run in ['new', 'existing']:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                func(handles)
+                elapsed = time.perf_counter() - start
+            print('{:<5} {:<9} users {:8.2f} s'.format(name, run, elapsed))
+        User.objects.all().delete()
+        Handle.objects.all().delete()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Measure how long a fresh process takes to import a module, by default the
+WSGI application (which sets Django up), with python -X importtime.
+
+Runs the import several times in new interpreters and reports medians: the
+total, the wall-clock time of the process, and the self time of imports
+summed by top-level package, e.g. to see what a change added to worker
+start-up. Bytecode caches are used, as they are in deployments; the first
+run only warms them up and isn't counted.
+
+Examples:
+
+    devel/bench_import_time.py
+    devel/bench_import_time.py --target main.cf_get --top 5
+    devel/bench_import_time.py --json > import_time.json
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from os.path import dirname, abspath
+
+from typing import Dict, List, Tuple
+
+BASE_DIR = dirname(dirname(abspath(__file__)))
+
+def parse_importtime(stderr):
+    # type: (str) -> Tuple[Dict[str, int], Dict[str, int]]
+    """
+    Return self times by top-level package and cumulative times of the
+    imports at the outermost level, in microseconds.
+    """
+    by_package = {} # type: Dict[str, int]
+    outermost = {} # type: Dict[str, int]
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        self_us, cumulative_us = int(parts[0]), int(parts[1])
+        # Nested imports are indented by two more spaces per level.
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        package = name.split('.')[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+        if depth == 0:
+            outermost[name] = outermost.get(name, 0) + cumulative_us
+    return (by_package, outermost)
+
+def run_once(target, settings_module):
+    # type: (str, str) -> Tuple[float, Dict[str, int], int]
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + target],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit('Importing {} failed'.format(target))
+    by_package, outermost = parse_importtime(proc.stderr)
+    return (wall, by_package, sum(outermost.values()))
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description='Measure import times of a module in fresh processes.')
+    parser.add_argument('--target', default='project_conf.wsgi', help='Module to import')
+    parser.add_argument('--settings', default='project_conf.settings',
+        help='DJANGO_SETTINGS_MODULE, unless it is set in the environment')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of measured runs')
+    parser.add_argument('--top', type=int, default=15, help='Packages to list')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    run_once(args.target, args.settings)
+    walls = [] # type: List[float]
+    totals = [] # type: List[int]
+    samples = {} # type: Dict[str, List[int]]
+    for i in range(args.repeat):
+        wall, by_package, total = run_once(args.target, args.settings)
+        walls.append(wall)
+        totals.append(total)
+        for package, us in by_package.items():
+            samples.setdefault(package, []).append(us)
+    # Packages imported in only some runs count as 0 in the others.
+    packages = {package: statistics.median(values + [0] * (args.repeat - len(values)))
+        for package, values in samples.items()}
+    top = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+
+    results = {
+        'target': args.target,
+        'repeat': args.repeat,
+        'wall_ms': round(statistics.median(walls) * 1000, 1),
+        'import_ms': round(statistics.median(totals) / 1000, 1),
+        'packages_ms': {package: round(us / 1000, 2) for package, us in top},
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print('import {}: {} ms of imports, {} ms process wall time (median of {})'.format(
+        args.target, results['import_ms'], results['wall_ms'], args.repeat))
+    print('{:<28} {:>12}'.format('package', 'self (ms)'))
+    for package, ms in results['packages_ms'].items():
+        print('{:<28} {:>12.2f}'.format(package, ms))
+
+if __name__ == "__main__":
+    main()
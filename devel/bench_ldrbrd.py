@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+"""
+Benchmark the leaderboard request path against synthetic standings served
+by a local stub API, with a breakdown across fetch, parse, object
+construction, DB queries and rendering, and end-to-end timings of the
+leaderboard view (uncached, from the database, cached and 304).
+Uses a throwaway test database, like manage.py test.
+
+Examples:
+
+    devel/bench_ldrbrd.py
+    devel/bench_ldrbrd.py --handles 5000 --participants 500 --json > before.json
+    python manage.py bench_ldrbrd --handles 5000
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import contextlib
+import subprocess
+from os.path import dirname, abspath
+
+BASE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project_conf.settings")
+
+import django
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from devel.stub_cf_api import start_stub_server
+from main import cf_get
+from main import models
+from main import userinfo
+from main import views
+from main.groups import set_intra_ranks
+from main.handles import bump_version, get_handle_set
+
+PHASES = ['fetch', 'parse', 'construct', 'db', 'render', 'cf_get',
+    'view_cold', 'view_stored', 'view_cached', 'view_not_modified']
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Timer:
+    def __init__(self):
+        self.samples = {phase: [] for phase in PHASES}
+
+    @contextlib.contextmanager
+    def __call__(self, phase):
+        start = time.perf_counter()
+        yield
+        self.samples[phase].append((time.perf_counter() - start) * 1000)
+
+    def summary(self):
+        return {phase: {
+            'median': round(statistics.median(samples), 3),
+            'mean': round(statistics.mean(samples), 3),
+            'min': round(min(samples), 3),
+        } for phase, samples in self.samples.items() if samples}
+
+class Bench:
+    def __init__(self, args):
+        if args.participants is None:
+            args.participants = args.handles
+        if not 0 <= args.participants <= args.handles:
+            raise SystemExit('--participants must be between 0 and --handles.')
+        self.args = args
+        # Sorted like the handle set, so that the same chunks are requested as were recorded.
+        self.usernames = sorted('user{}'.format(i) for i in range(args.handles))
+        self.contest_ids = list(range(1, args.contests + 1))
+        self.show_unofficial = settings.SHOW_UNOFFICIAL
+        self.factory = RequestFactory()
+
+    def run(self):
+        args = self.args
+        n_participants = args.participants
+        fixture_dir = tempfile.mkdtemp()
+        old_db_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        saved = (cf_get.BASE_URL, cf_get.MODE, cf_get.FIXTURE_DIR, cf_get.rate_limiter)
+        # The stub has no call limit.
+        cf_get.rate_limiter = None
+        try:
+            # Keep benchmark entries out of the real cache.
+            with override_settings(CACHES={'default': {
+                    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                    'LOCATION': 'bench_ldrbrd'}}):
+                self.setup(fixture_dir, args.problems, n_participants / max(args.handles, 1))
+                # Standings are generated once and recorded, then served from the
+                # recordings, so that fetch times don't include generating them.
+                stub = start_stub_server(latency=args.latency, fixture_dir=fixture_dir)
+                cf_get.configure(base_url=stub.base_url, mode='live')
+                timer = Timer()
+                rows, size = self.run_all(timer, args.repeat)
+                stub.shutdown()
+        finally:
+            cf_get.configure(base_url=saved[0], mode=saved[1], fixture_dir=saved[2])
+            cf_get.rate_limiter = saved[3]
+            connection.creation.destroy_test_db(old_db_name, verbosity=0)
+            shutil.rmtree(fixture_dir, ignore_errors=True)
+
+        results = {
+            'commit': git_commit(),
+            'sizes': {
+                'contests': args.contests,
+                'problems': args.problems,
+                'handles': args.handles,
+                'participants': n_participants,
+            },
+            'repeat': args.repeat,
+            'latency': args.latency,
+            'rows': rows,
+            'response_bytes': size,
+            'phases_ms': timer.summary(),
+        }
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+
+    def setup(self, fixture_dir, n_problems, participation):
+        stub = start_stub_server(n_problems=n_problems, participation=participation)
+        cf_get.configure(base_url=stub.base_url, mode='record', fixture_dir=fixture_dir)
+        for contest_id in self.contest_ids:
+            cf_get.get_contest_info(contest_id, self.usernames, self.show_unofficial, fetch_colors=False)
+        User.objects.bulk_create([User(username=username) for username in self.usernames])
+        userinfo.save_user_info(cf_get.get_user_info(self.usernames))
+        stub.shutdown()
+
+    def fetch_bodies(self, contest_id, usernames):
+        def fetch(chunk):
+            query = {
+                'contestId': contest_id,
+                'handles': ';'.join(chunk),
+                'showUnofficial': 'true' if self.show_unofficial else 'false',
+            }
+            return cf_get.log_and_request(reader=lambda response: response.content,
+                url=cf_get.BASE_URL + '/contest.standings', params=query)
+        return cf_get.map_parallel(fetch, cf_get.handle_chunks(usernames))
+
+    def measure(self, timer, contest_id):
+        with timer('fetch'):
+            bodies = self.fetch_bodies(contest_id, self.usernames)
+        with timer('parse'):
+            results = [json.loads(body.decode('utf-8'))['result'] for body in bodies]
+        with timer('construct'):
+            contest = cf_get.Contest(results[0]['contest'])
+            problems = [cf_get.Problem(problem) for problem in results[0]['problems']]
+            participants = cf_get.merge_participants([[cf_get.Participant(row)
+                for row in result['rows']] for result in results])
+        with timer('db'):
+            bump_version()
+            handle_set = get_handle_set()
+            userinfo.apply_colors(participants)
+        with timer('render'):
+            set_intra_ranks(participants)
+            context = {
+                'contest_id': contest_id,
+                'show_unofficial': self.show_unofficial,
+                'contest': contest,
+                'problems': problems,
+                'participants': participants,
+            }
+            context['table_html'] = render_to_string('ldrbrd_table.html', context)
+            render_to_string('ldrbrd.html', context)
+        with timer('cf_get'):
+            cf_get.get_contest_info(contest_id, handle_set.usernames, self.show_unofficial,
+                fetch_colors=False)
+
+        request = self.factory.get('/ldrbrd/{}/'.format(contest_id))
+        cache.clear()
+        models.Contest.objects.filter(contest_id=contest_id).delete()
+        bump_version()
+        with timer('view_cold'):
+            views.ldrbrd(request, contest_id)
+        cache.clear()
+        with timer('view_stored'):
+            views.ldrbrd(request, contest_id)
+        with timer('view_cached'):
+            response = views.ldrbrd(request, contest_id)
+        request = self.factory.get('/ldrbrd/{}/'.format(contest_id), HTTP_IF_NONE_MATCH=response['ETag'])
+        with timer('view_not_modified'):
+            views.ldrbrd(request, contest_id)
+        return (len(participants), sum(len(body) for body in bodies))
+
+    def run_all(self, timer, repeat):
+        rows = []
+        sizes = []
+        for contest_id in self.contest_ids:
+            # Warm up connections and lazily built state, like templates.
+            self.measure(Timer(), contest_id)
+            for i in range(repeat):
+                n_rows, size = self.measure(timer, contest_id)
+            rows.append(n_rows)
+            sizes.append(size)
+        return (round(statistics.mean(rows)), round(statistics.mean(sizes)))
+
+    def report(self, results):
+        sizes = results['sizes']
+        print('{contests} contests x {problems} problems, {handles} handles, '
+            '{participants} participants'.format(**sizes))
+        print('{} rows and {} bytes per leaderboard, commit {}'.format(
+            results['rows'], results['response_bytes'], results['commit']))
+        print('{:<18} {:>12} {:>12} {:>12}'.format('phase', 'median (ms)', 'mean (ms)', 'min (ms)'))
+        for phase, summary in results['phases_ms'].items():
+            print('{:<18} {:>12.2f} {:>12.2f} {:>12.2f}'.format(phase,
+                summary['median'], summary['mean'], summary['min']))
+
+def add_arguments(parser):
+    # type: (argparse.ArgumentParser) -> None
+    # Shared with manage.py bench_ldrbrd.
+    parser.add_argument('--contests', type=int, default=3, help='Number of contests')
+    parser.add_argument('--problems', type=int, default=6, help='Problems per contest')
+    parser.add_argument('--handles', type=int, default=1000, help='Number of registered handles')
+    parser.add_argument('--participants', type=int,
+        help='Registered handles which took part in each contest (default: all of them)')
+    parser.add_argument('--repeat', type=int, default=5, help='Measurements per contest')
+    parser.add_argument('--latency', type=float, default=0.0,
+        help='Latency of the stub API in seconds')
+    parser.add_argument('--json', action='store_true',
+        help='Print results as JSON, for comparing them between commits')
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description='Benchmark the leaderboard request path.')
+    add_arguments(parser)
+    Bench(parser.parse_args()).run()
+
+if __name__ == "__main__":
+    main()
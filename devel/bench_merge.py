@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Measure how long cf_get takes to fetch and merge standings for large
+handle lists, which are split into chunks and fetched in parallel.
+Uses a stub Codeforces API on localhost.
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+import argparse
+import contextlib
+from os.path import dirname, abspath
+
+BASE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from devel.stub_cf_api import start_stub_server, make_standings
+from main import cf_get
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--counts', type=int, nargs='+', default=[300, 1000, 3000, 10000],
+        help='Handle counts to measure')
+    parser.add_argument('--latency', type=float, default=0.05,
+        help='Latency of the stub API in seconds')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    server = start_stub_server(latency=args.latency)
+    cf_get.BASE_URL = server.base_url # type: ignore
+
+    print('{:>8} {:>7} {:>12} {:>12}'.format('handles', 'chunks', 'merge (ms)', 'fetch (ms)'))
+    for count in args.counts:
+        handles = ['user{}'.format(i) for i in range(count)]
+        chunks = cf_get.handle_chunks(handles)
+        chunk_rows = [[cf_get.Participant(row) for row in make_standings(1, chunk, 6)['rows']]
+            for chunk in chunks]
+
+        start = time.perf_counter()
+        for i in range(args.repeat):
+            cf_get.merge_participants(chunk_rows)
+        merge_time = (time.perf_counter() - start) / args.repeat
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            cf_get.get_contest_info(1, handles, True, fetch_colors=False)
+            fetch_time = time.perf_counter() - start
+
+        print('{:>8} {:>7} {:>12.3f} {:>12.1f}'.format(count, len(chunks),
+            merge_time * 1000, fetch_time * 1000))
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+Measure time and peak memory of fetching and parsing a large contest.standings
+response, with the old approach (the body decoded twice with response.json(),
+objects with per-instance dicts) and with cf_get.
+
+The standings fixture is a JSON file in the format of contest.standings.
+If it doesn't exist, a synthetic one is generated. Each variant runs in a
+fresh process, so peak RSS isn't shared between them.
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+import resource
+import tempfile
+import subprocess
+import contextlib
+from datetime import timedelta
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from os.path import dirname, abspath
+
+import requests
+
+from typing import Any, Mapping
+
+BASE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+class OldAttempt:
+    def __init__(self, problem_result):
+        # type: (Mapping[str, Any]) -> None
+        self.points = problem_result["points"]
+        self.rejects = problem_result["rejectedAttemptCount"]
+        self.time = timedelta(seconds=problem_result.get("bestSubmissionTimeSeconds", 0))
+
+class OldParticipant:
+    def __init__(self, ranklist_row):
+        # type: (Mapping[str, Any]) -> None
+        self.type = ranklist_row["party"]["participantType"]
+        self.rank = ranklist_row["rank"]
+        self.points = ranklist_row["points"]
+        self.attempts = [OldAttempt(att) for att in ranklist_row["problemResults"]]
+        self.username = ranklist_row["party"].get("teamName") or ranklist_row["party"]["members"][0]["handle"]
+        self.is_team = "teamName" in ranklist_row["party"]
+
+def run_old(url):
+    # type: (str) -> int
+    with requests.Session() as session:
+        response = session.get(url)
+    if response.json()["status"] != 'OK':
+        raise ValueError(response.text)
+    result = response.json()["result"]
+    return len([OldParticipant(row) for row in result["rows"]])
+
+def run_new(url):
+    # type: (str) -> int
+    from main import cf_get
+    cf_get.configure(base_url=url.rsplit('/', 1)[0])
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        contest, problems, participants = cf_get.get_contest_info(1, [], True, fetch_colors=False)
+    return len(participants)
+
+def make_fixture(path, rows, n_problems):
+    # type: (str, int, int) -> None
+    from devel.stub_cf_api import make_standings
+    result = make_standings(1, ['user{}'.format(i) for i in range(rows)], n_problems)
+    with open(path, 'w') as f:
+        json.dump({'status': 'OK', 'result': result}, f)
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    # Serves the fixture for every path, whatever the query string.
+    fixture = ''
+
+    def do_GET(self):
+        # type: () -> None
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(os.path.getsize(self.fixture)))
+        self.end_headers()
+        with open(self.fixture, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def log_message(self, format, *args):
+        # type: (str, *Any) -> None
+        pass
+
+def child(variant, url):
+    # type: (str, str) -> None
+    start = time.perf_counter()
+    count = (run_old if variant == 'old' else run_new)(url)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux.
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'rows': count, 'seconds': elapsed, 'maxrss_kb': maxrss}))
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--fixture', default=os.path.join(tempfile.gettempdir(), 'cf_standings_fixture.json'))
+    parser.add_argument('--rows', type=int, default=30000, help='Rows in a generated fixture')
+    parser.add_argument('--problems', type=int, default=8, help='Problems in a generated fixture')
+    parser.add_argument('--child', nargs=2, metavar=('VARIANT', 'URL'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    if not os.path.exists(args.fixture):
+        make_fixture(args.fixture, args.rows, args.problems)
+
+    handler = type('Handler', (FixtureHandler,), {'fixture': args.fixture})
+    server = HTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/contest.standings'.format(server.server_address[1])
+
+    try:
+        import ijson
+        parser_name = 'ijson ' + getattr(ijson, 'backend', '')
+    except ImportError:
+        parser_name = 'json (ijson is not installed)'
+    print('fixture: {} ({:.1f} MB), new parser: {}'.format(args.fixture,
+        os.path.getsize(args.fixture) / 1e6, parser_name))
+    for variant in ['old', 'new']:
+        output = subprocess.check_output([sys.executable, abspath(__file__), '--child', variant, url],
+            universal_newlines=True)
+        stats = json.loads(output.strip().splitlines()[-1])
+        print('{:<4} {rows} rows  {seconds:.2f} s  peak RSS {maxrss_mb:.0f} MB'.format(variant,
+            maxrss_mb=stats['maxrss_kb'] / 1024, **stats))
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Measure how long the leaderboard table takes to render, against the number
+of participants, and compare it with what an unchanged board costs when the
+rendered table is cached under a hash of the standings.
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+import argparse
+from os.path import dirname, abspath
+
+BASE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project_conf.settings")
+
+import django
+django.setup()
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from devel.stub_cf_api import make_standings
+from main import cf_get
+from main.caching import standings_digest
+from main.views import ldrbrd_etag, render_table, templates_version
+
+from typing import Any, Callable
+
+def timed(func, repeat):
+    # type: (Callable[[], Any], int) -> float
+    start = time.perf_counter()
+    for i in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--counts', type=int, nargs='+', default=[50, 200, 500, 1000, 3000],
+        help='Participant counts to measure')
+    parser.add_argument('--problems', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print('{:>8} {:>12} {:>12} {:>12}'.format('rows', 'render (ms)', 'digest (ms)', 'cached (ms)'))
+    for count in args.counts:
+        result = make_standings(1, ['user{}'.format(i) for i in range(count)], args.problems)
+        contest = cf_get.Contest(result['contest'])
+        problems = [cf_get.Problem(problem) for problem in result['problems']]
+        participants = [cf_get.Participant(row) for row in result['rows']]
+        standings = (contest, problems, participants)
+        context = {
+            'contest_id': 1,
+            'contest': contest,
+            'problems': problems,
+            'participants': participants,
+        }
+
+        render_time = timed(lambda: render_to_string('ldrbrd_table.html', context), args.repeat)
+        # The digest is computed once per upstream fetch, not per request.
+        digest = standings_digest(standings)
+        digest_time = timed(lambda: standings_digest(standings), args.repeat)
+
+        cache.clear()
+        context['etag'] = ldrbrd_etag(templates_version(), 1, digest, participants)
+        render_table(context)
+        def cached():
+            # type: () -> None
+            context['etag'] = ldrbrd_etag(templates_version(), 1, digest, participants)
+            render_table(context)
+        cached_time = timed(cached, args.repeat)
+
+        print('{:>8} {:>12.2f} {:>12.2f} {:>12.2f}'.format(len(participants),
+            render_time, digest_time, cached_time))
+
+if __name__ == "__main__":
+    main()
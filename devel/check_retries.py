@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Exercise the rate limiter and retries of cf_get against a stub Codeforces API
+which injects 503s and "Call limit exceeded" errors.
+
+Interactive and background calls are issued concurrently; the report shows
+how many calls succeeded, what the stub answered and how long each priority
+class waited on average.
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+import argparse
+import contextlib
+import threading
+from collections import defaultdict
+from os.path import dirname, abspath
+
+from typing import Dict, List
+
+BASE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from devel.stub_cf_api import start_stub_server
+from main import cf_get
+from main.ratelimit import RateLimiter
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=20, help='Calls per priority class')
+    parser.add_argument('--rate', type=float, default=20.0, help='Client rate limit (calls per second)')
+    parser.add_argument('--burst', type=float, default=2.0)
+    parser.add_argument('--error-rate', type=float, default=0.2)
+    parser.add_argument('--limit-rate', type=float, default=0.1)
+    args = parser.parse_args()
+
+    # The stub enforces a slightly lower interval than the client's rate limit.
+    server = start_stub_server(error_rate=args.error_rate, limit_rate=args.limit_rate,
+        min_interval=0.9 / args.rate)
+    url = server.base_url + '/user.info' # type: ignore
+    cf_get.configure(limiter=RateLimiter(args.rate, args.burst), max_retries=5)
+    cf_get.BACKOFF_BASE = 0.05
+
+    waits = defaultdict(list) # type: Dict[str, List[float]]
+    outcomes = defaultdict(int) # type: Dict[str, int]
+    lock = threading.Lock()
+
+    def call(name, priority):
+        # type: (str, int) -> None
+        start = time.time()
+        try:
+            cf_get.log_and_request(priority, url=url, params={'handles': 'tourist'})
+            outcome = 'ok'
+        except cf_get.CfApiError:
+            outcome = 'failed'
+        with lock:
+            waits[name].append(time.time() - start)
+            outcomes[outcome] += 1
+
+    threads = []
+    for i in range(args.n):
+        threads.append(threading.Thread(target=call, args=('background', cf_get.PRIORITY_BACKGROUND)))
+        threads.append(threading.Thread(target=call, args=('interactive', cf_get.PRIORITY_INTERACTIVE)))
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    print('outcomes:', dict(outcomes))
+    print('stub responses:', dict(server.status_counts)) # type: ignore
+    for name in sorted(waits):
+        print('{:<12} mean latency {:.3f} s'.format(name, sum(waits[name]) / len(waits[name])))
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
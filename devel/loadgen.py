@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+A small HTTP load generator. Each simulated client sends requests back to
+back on its own keep-alive connection; the report shows throughput and
+latency percentiles.
+
+To compare the sync and async leaderboard views, run the stub API and
+point the webapp at it, then load both servers with the same settings:
+
+    devel/stub_cf_api.py --port 8001 --latency 0.3
+    CF_API_BASE_URL=http://127.0.0.1:8001/api gunicorn project_conf.wsgi -w 2 -b :8000
+    CF_API_BASE_URL=http://127.0.0.1:8001/api gunicorn project_conf.asgi -w 2 -b :8002 -k uvicorn.workers.UvicornWorker
+    devel/loadgen.py http://127.0.0.1:8000/ldrbrd/1/ -c 50 -d 20
+    devel/loadgen.py http://127.0.0.1:8002/ldrbrd/1/ -c 50 -d 20
+
+Use a different contest ID (or restart the servers) for each run, so that
+the standings cache doesn't hide upstream latency.
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import time
+import argparse
+import threading
+
+import requests
+
+from typing import List
+
+def run_client(url, deadline, latencies, errors, lock):
+    # type: (str, float, List[float], List[int], threading.Lock) -> None
+    with requests.Session() as session:
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = session.get(url).ok
+            except requests.exceptions.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+def percentile(values, fraction):
+    # type: (List[float], float) -> float
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url')
+    parser.add_argument('-c', '--concurrency', type=int, default=10, help='Number of concurrent clients')
+    parser.add_argument('-d', '--duration', type=float, default=10.0, help='Seconds to run for')
+    args = parser.parse_args()
+
+    latencies = [] # type: List[float]
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.time() + args.duration
+    threads = [threading.Thread(target=run_client, args=(args.url, deadline, latencies, errors, lock))
+        for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    print('requests: {}  errors: {}  throughput: {:.1f} req/s'.format(
+        len(latencies), errors[0], len(latencies) / args.duration))
+    if latencies:
+        print('latency p50 {:.1f} ms  p90 {:.1f} ms  p99 {:.1f} ms'.format(
+            percentile(latencies, 0.5) * 1000, percentile(latencies, 0.9) * 1000,
+            percentile(latencies, 0.99) * 1000))
+
+if __name__ == "__main__":
+    main()
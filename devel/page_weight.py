@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Count the requests and bytes which a browser needs before it can first
+paint our pages: the HTML and the stylesheets and scripts it blocks on.
+Sizes are gzipped, like they are sent. Pages are rendered in-process with a
+stub Codeforces API on localhost; other origins are only counted.
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import re
+import sys
+import gzip
+import argparse
+from os.path import dirname, abspath
+
+BASE_DIR = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project_conf.settings")
+
+import django
+django.setup()
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.test import Client
+
+from devel.stub_cf_api import start_stub_server
+from main import cf_get
+
+from typing import List, Tuple
+
+def blocking_resources(html):
+    # type: (str) -> List[str]
+    urls = re.findall(r'<link[^>]*rel="stylesheet"[^>]*href="([^"]+)"', html)
+    for tag, url in re.findall(r'(<script[^>]*src="([^"]+)"[^>]*>)', html):
+        if ' async' not in tag and ' defer' not in tag:
+            urls.append(url)
+    return urls
+
+def resource_size(url):
+    # type: (str) -> Tuple[bool, int]
+    if not url.startswith(settings.STATIC_URL):
+        return (False, 0)
+    path = finders.find(url[len(settings.STATIC_URL):].split('?')[0])
+    if path is None:
+        return (True, 0)
+    with open(path, 'rb') as f:
+        return (True, len(gzip.compress(f.read())))
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('paths', nargs='*', default=['/', '/ldrbrd/1/'], help='Pages to measure')
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    cf_get.configure(base_url=server.base_url)
+    cf_get.rate_limiter = None
+    client = Client()
+
+    print('{:<16} {:>10} {:>9} {:>12} {:>14}'.format('page', 'html (B)', 'blocking', 'third-party',
+        'total (B)'))
+    for path in args.paths:
+        html = client.get(path).content
+        html_size = len(gzip.compress(html))
+        total = html_size
+        blocking = 0
+        external = 0
+        for url in blocking_resources(html.decode('utf-8')):
+            local, size = resource_size(url)
+            blocking += 1
+            external += not local
+            total += size
+        print('{:<16} {:>10} {:>9} {:>12} {:>14}'.format(path, html_size, blocking, external, total))
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""
+Remove rules which can't match anything on our pages from a stylesheet,
+e.g. to vendor the parts of Bootstrap which are actually used.
+
+A selector is kept if every class, ID and element name in it appears in
+the given templates or scripts (classes and IDs in their class and id
+attributes, elements in their tags). Arguments of :not() and attribute
+selectors are ignored, so the result errs on the side of keeping rules.
+@media and @supports blocks are purged recursively and dropped if empty;
+@keyframes are kept only if a remaining rule uses them. /*! comments
+(license banners) are kept and other comments are dropped.
+
+Example:
+
+    devel/purge_css.py bootstrap.css templates/*.html static/*.js -o static/vendor/bootstrap.css
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import re
+import sys
+import argparse
+
+from typing import List, Optional, Set, Tuple
+
+# Always present, whether or not templates mention them.
+ALWAYS_USED_TAGS = {'html', 'body'}
+
+# A node is (kind, prelude, body): kind is 'comment', 'rule', 'block' (an
+# at-rule with nested rules), 'at' (any other at-rule with a body) or 'statement'.
+Node = Tuple[str, str, object]
+
+def skip_string_or_comment(css, i):
+    # type: (str, int) -> int
+    """If a string or comment starts at i, return the index after it; otherwise return i."""
+    if css.startswith('/*', i):
+        end = css.find('*/', i + 2)
+        return len(css) if end == -1 else end + 2
+    if css[i] in '"\'':
+        quote = css[i]
+        i += 1
+        while i < len(css) and css[i] != quote:
+            i += 2 if css[i] == '\\' else 1
+        return i + 1
+    return i
+
+def matching_brace(css, start):
+    # type: (str, int) -> int
+    depth = 0
+    i = start
+    while i < len(css):
+        j = skip_string_or_comment(css, i)
+        if j != i:
+            i = j
+            continue
+        if css[i] == '{':
+            depth += 1
+        elif css[i] == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    raise ValueError('Unbalanced braces')
+
+def parse(css):
+    # type: (str) -> List[Node]
+    nodes = [] # type: List[Node]
+    i = 0
+    prelude_start = 0
+    while i < len(css):
+        if css.startswith('/*', i):
+            end = skip_string_or_comment(css, i)
+            if css.startswith('/*!', i):
+                nodes.append(('comment', css[i:end], None))
+            i = prelude_start = end
+            continue
+        j = skip_string_or_comment(css, i)
+        if j != i:
+            i = j
+        elif css[i] == ';':
+            nodes.append(('statement', css[prelude_start:i].strip(), None))
+            i = prelude_start = i + 1
+        elif css[i] == '{':
+            end = matching_brace(css, i)
+            prelude = ' '.join(css[prelude_start:i].split())
+            body = css[i + 1:end]
+            if re.match(r'@(media|supports|document)\b', prelude):
+                nodes.append(('block', prelude, parse(body)))
+            elif prelude.startswith('@'):
+                nodes.append(('at', prelude, body))
+            else:
+                nodes.append(('rule', prelude, body))
+            i = prelude_start = end + 1
+        else:
+            i += 1
+    return nodes
+
+def split_selectors(prelude):
+    # type: (str) -> List[str]
+    # Commas inside parentheses, like :is(a, b), don't separate selectors.
+    selectors = []
+    depth = 0
+    current = ''
+    for c in prelude:
+        if c == ',' and depth == 0:
+            selectors.append(current.strip())
+            current = ''
+            continue
+        depth += (c == '(') - (c == ')')
+        current += c
+    selectors.append(current.strip())
+    return [s for s in selectors if s]
+
+def selector_used(selector, classes, ids, tags):
+    # type: (str, Set[str], Set[str], Set[str]) -> bool
+    s = re.sub(r'\[[^\]]*\]', ' ', selector)
+    s = re.sub(r':not\([^)]*\)', '', s)
+    s = re.sub(r'::?[-\w]+(\([^)]*\))?', '', s)
+    for name in re.findall(r'\.(-?[_a-zA-Z][-\w]*)', s):
+        if name not in classes:
+            return False
+    for name in re.findall(r'#(-?[_a-zA-Z][-\w]*)', s):
+        if name not in ids:
+            return False
+    s = re.sub(r'[.#]-?[_a-zA-Z][-\w]*', ' ', s)
+    for name in re.findall(r'(?:^|[\s>+~])([a-zA-Z][-\w]*)', s):
+        if name.lower() not in tags:
+            return False
+    return True
+
+def minify_body(body):
+    # type: (str) -> str
+    body = re.sub(r'/\*.*?\*/', '', body, flags=re.S)
+    body = ' '.join(body.split())
+    body = re.sub(r'\s*([;:{}])\s*', r'\1', body)
+    return body.rstrip(';')
+
+def purge(nodes, classes, ids, tags):
+    # type: (List[Node], Set[str], Set[str], Set[str]) -> List[Node]
+    kept = [] # type: List[Node]
+    for kind, prelude, body in nodes:
+        if kind == 'rule':
+            selectors = [s for s in split_selectors(prelude) if selector_used(s, classes, ids, tags)]
+            if selectors:
+                kept.append((kind, ','.join(' '.join(s.split()) for s in selectors), body))
+        elif kind == 'block':
+            children = purge(body, classes, ids, tags) # type: ignore
+            if children:
+                kept.append((kind, prelude, children))
+        else:
+            kept.append((kind, prelude, body))
+    return kept
+
+def serialize(nodes):
+    # type: (List[Node]) -> str
+    parts = []
+    for kind, prelude, body in nodes:
+        if kind == 'comment':
+            parts.append(prelude + '\n')
+        elif kind == 'statement':
+            parts.append(prelude + ';')
+        elif kind == 'block':
+            parts.append(prelude + '{' + serialize(body) + '}') # type: ignore
+        else:
+            parts.append(prelude + '{' + minify_body(body) + '}') # type: ignore
+    return ''.join(parts)
+
+def drop_unused_keyframes(nodes, css):
+    # type: (List[Node], str) -> List[Node]
+    kept = []
+    for node in nodes:
+        match = re.match(r'@(-\w+-)?keyframes\s+([-\w]+)', node[1])
+        if node[0] == 'at' and match and not re.search(r'animation[-\w]*:[^;}]*\b' +
+                re.escape(match.group(2)) + r'\b', css):
+            continue
+        kept.append(node)
+    return kept
+
+def used_names(sources):
+    # type: (List[str]) -> Tuple[Set[str], Set[str], Set[str]]
+    classes = set() # type: Set[str]
+    ids = set() # type: Set[str]
+    tags = set(ALWAYS_USED_TAGS)
+    for text in sources:
+        # Template variables and tags can't add whole class names; drop them.
+        text = re.sub(r'{{.*?}}|{%.*?%}', ' ', text)
+        # Also className assignments in scripts.
+        for value in re.findall(r'class(?:Name)?\s*=\s*["\']([^"\']*)', text):
+            classes.update(value.split())
+        for value in re.findall(r'\bid\s*=\s*["\']([^"\']*)', text):
+            ids.update(value.split())
+        tags.update(tag.lower() for tag in re.findall(r'<([a-zA-Z][\w-]*)', text))
+    return (classes, ids, tags)
+
+def purge_css(css, sources):
+    # type: (str, List[str]) -> str
+    classes, ids, tags = used_names(sources)
+    nodes = purge(parse(css), classes, ids, tags)
+    return serialize(drop_unused_keyframes(nodes, serialize(nodes))) + '\n'
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description='Remove unused rules from a stylesheet.')
+    parser.add_argument('stylesheet')
+    parser.add_argument('sources', nargs='+', help='Templates and scripts which use the stylesheet')
+    parser.add_argument('-o', '--output', help='Output file (default: standard output)')
+    args = parser.parse_args()
+
+    with open(args.stylesheet, encoding='utf-8') as f:
+        css = f.read()
+    sources = []
+    for path in args.sources:
+        with open(path, encoding='utf-8') as f:
+            sources.append(f.read())
+    result = purge_css(css, sources)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(result)
+    else:
+        sys.stdout.write(result)
+    print('{} -> {} bytes'.format(len(css), len(result)), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
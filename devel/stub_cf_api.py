@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+"""
+A stub of the Codeforces API which serves synthetic data from localhost.
+It is used by the benchmarks in this directory and for offline testing.
+
+Supported methods: contest.list, contest.standings, user.info.
+user.info fails for handles which start with "nosuch", like Codeforces
+does for handles which don't exist.
+
+With --fixtures, it serves responses recorded with CF_API_MODE=record
+instead of synthetic data (see main/cf_get.py), and 404 for calls which
+weren't recorded.
+
+Failures can be injected to exercise retries and rate limiting:
+random 503 responses, random "Call limit exceeded" errors, and real
+"Call limit exceeded" errors when calls arrive faster than allowed.
+"""
+
+from __future__ import print_function
+from __future__ import absolute_import
+
+import json
+import time
+import sys
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit, parse_qs
+from os.path import dirname, abspath
+
+from collections import Counter
+
+from typing import Any, Dict, List, Optional
+
+if __name__ == "__main__":
+    sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from main.cf_get import load_fixture
+
+RANKS = ['newbie', 'pupil', 'specialist', 'expert', 'candidate master', 'master',
+    'international master', 'grandmaster', 'international grandmaster', 'legendary grandmaster']
+
+def _seed(*parts):
+    # type: (*Any) -> int
+    digest = hashlib.md5(':'.join(str(p) for p in parts).encode()).hexdigest()
+    return int(digest[:8], 16)
+
+def make_user_info(handles):
+    # type: (List[str]) -> List[Dict[str, Any]]
+    result = []
+    for handle in handles:
+        seed = _seed('user', handle)
+        result.append({
+            'handle': handle,
+            'firstName': handle.capitalize(),
+            'lastName': 'Stub',
+            'rating': 800 + seed % 2800,
+            'rank': RANKS[seed % len(RANKS)],
+        })
+    return result
+
+# Contests which contest.list returns, as (ID, start relative to when the stub
+# was started, duration) in seconds: one running, one upcoming, one which has
+# just ended, and two old ones. Other contest IDs are old finished contests.
+STUB_STARTED = int(time.time())
+STUB_CONTESTS = [
+    (1000, -3600, 7200),
+    (1001, 2 * 3600, 7200),
+    (1002, -7800, 7200),
+    (999, -30 * 86400, 7200),
+    (998, -60 * 86400, 7200),
+]
+
+def make_contest(contest_id):
+    # type: (int) -> Dict[str, Any]
+    start, duration = 1500000000, 7200
+    for cid, relative_start, cduration in STUB_CONTESTS:
+        if cid == contest_id:
+            start, duration = STUB_STARTED + relative_start, cduration
+    now = time.time()
+    phase = 'BEFORE' if now < start else 'CODING' if now < start + duration else 'FINISHED'
+    return {
+        'id': contest_id,
+        'name': 'Stub Round #{}'.format(contest_id),
+        'type': 'CF',
+        'phase': phase,
+        'frozen': False,
+        'durationSeconds': duration,
+        'startTimeSeconds': start,
+        'relativeTimeSeconds': int(now - start),
+    }
+
+def make_standings(contest_id, handles, n_problems, show_unofficial=True, participation=1.0):
+    # type: (int, List[str], int, bool, float) -> Dict[str, Any]
+    problems = [{'index': chr(ord('A') + i), 'name': 'Problem {}'.format(i + 1),
+        'points': 500.0 * (i + 1)} for i in range(n_problems)]
+    rows = []
+    for handle in handles:
+        if participation < 1 and _seed(contest_id, handle, 'joined') % 1000 >= participation * 1000:
+            continue
+        seed = _seed(contest_id, handle)
+        participant_type = 'CONTESTANT' if seed % 5 or not show_unofficial else 'VIRTUAL'
+        results = []
+        for i, problem in enumerate(problems):
+            pseed = _seed(contest_id, handle, i)
+            solved = pseed % 3 != 0
+            results.append({
+                'points': problem['points'] * (0.5 + (pseed % 50) / 100.0) if solved else 0.0,
+                'rejectedAttemptCount': pseed % 4,
+                'type': 'FINAL',
+                'bestSubmissionTimeSeconds': pseed % 7200 if solved else 0,
+            })
+        if not results or not any(r['points'] for r in results):
+            continue
+        rows.append({
+            'party': {
+                'contestId': contest_id,
+                'members': [{'handle': handle}],
+                'participantType': participant_type,
+                'ghost': False,
+            },
+            'rank': 0,
+            'points': sum(r['points'] for r in results),
+            'penalty': 0,
+            'successfulHackCount': 0,
+            'unsuccessfulHackCount': 0,
+            'problemResults': results,
+        })
+    # Ranks only depend on points, so that they agree between requests
+    # for different handles of the same contest, as they do on Codeforces.
+    max_points = 1.5 * sum(problem['points'] for problem in problems)
+    for row in rows:
+        row['rank'] = 1 + int((max_points - row['points']) / 10)
+    rows.sort(key=lambda row: row['rank'])
+    return {
+        'contest': make_contest(contest_id),
+        'problems': problems,
+        'rows': rows,
+    }
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients can keep connections alive.
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, Nagle's algorithm
+    # and delayed ACKs add ~40ms to every response on a kept-alive connection.
+    disable_nagle_algorithm = True
+    latency = 0.0 # type: float
+    n_problems = 6 # type: int
+    error_rate = 0.0 # type: float
+    limit_rate = 0.0 # type: float
+    min_interval = 0.0 # type: float
+    participation = 1.0 # type: float
+    fixture_dir = None # type: Optional[str]
+
+    def do_GET(self):
+        # type: () -> None
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        method = url.path.rstrip('/').rsplit('/', 1)[-1]
+        handles = [h for h in query.get('handles', '').split(';') if h]
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.server.over_limit(self.min_interval) or random.random() < self.limit_rate: # type: ignore
+            self.send_json(503, {'status': 'FAILED', 'comment': 'Call limit exceeded'})
+        elif random.random() < self.error_rate:
+            self.send_body(503, b'<html><body>Service Unavailable</body></html>', 'text/html')
+        elif self.fixture_dir:
+            fixture = load_fixture(self.fixture_dir, self.path)
+            if fixture is None:
+                self.send_json(404, {'status': 'FAILED', 'comment': 'No recorded response'})
+            else:
+                status_code, content_type, body = fixture
+                self.send_body(status_code, body, content_type)
+        elif method == 'contest.standings':
+            payload = {'status': 'OK', 'result': make_standings(int(query.get('contestId', 1)),
+                handles, self.n_problems, query.get('showUnofficial') == 'true',
+                self.participation)} # type: Dict[str, Any]
+            self.send_json(200, payload)
+        elif method == 'contest.list':
+            self.send_json(200, {'status': 'OK', 'result': [make_contest(cid) for cid, _, _ in STUB_CONTESTS]})
+        elif method == 'user.info':
+            missing = [h for h in handles if h.startswith('nosuch')]
+            if missing:
+                self.send_json(400, {'status': 'FAILED',
+                    'comment': 'handles: User with handle {} not found'.format(missing[0])})
+            else:
+                self.send_json(200, {'status': 'OK', 'result': make_user_info(handles)})
+        else:
+            self.send_json(400, {'status': 'FAILED', 'comment': 'Unknown method: {}'.format(method)})
+
+    def send_json(self, code, payload):
+        # type: (int, Dict[str, Any]) -> None
+        self.send_body(code, json.dumps(payload).encode(), 'application/json;charset=UTF-8')
+
+    def send_body(self, code, body, content_type):
+        # type: (int, bytes, str) -> None
+        self.server.record(code) # type: ignore
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # type: (str, *Any) -> None
+        pass
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        # type: (*Any, **Any) -> None
+        HTTPServer.__init__(self, *args, **kwargs)
+        self.status_counts = Counter() # type: Counter
+        self._last_call = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, code):
+        # type: (int) -> None
+        with self._lock:
+            self.status_counts[code] += 1
+
+    def over_limit(self, min_interval):
+        # type: (float) -> bool
+        # Like Codeforces, calls made too soon after the previous one fail.
+        if not min_interval:
+            return False
+        with self._lock:
+            now = time.time()
+            if now - self._last_call < min_interval:
+                return True
+            self._last_call = now
+            return False
+
+def start_stub_server(port=0, latency=0.0, n_problems=6, error_rate=0.0, limit_rate=0.0, min_interval=0.0,
+        fixture_dir=None, participation=1.0):
+    # type: (int, float, int, float, float, float, Optional[str], float) -> StubServer
+    """
+    Start a stub server on a background thread and return it.
+    The API base URL is available as server.base_url.
+    """
+    handler = type('Handler', (StubHandler,), {'latency': latency, 'n_problems': n_problems,
+        'error_rate': error_rate, 'limit_rate': limit_rate, 'min_interval': min_interval,
+        'fixture_dir': fixture_dir, 'participation': participation})
+    server = StubServer(('127.0.0.1', port), handler)
+    server.base_url = 'http://127.0.0.1:{}/api'.format(server.server_address[1]) # type: ignore
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description='Serve a stub Codeforces API on localhost')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.0,
+        help='Seconds to sleep before answering each request')
+    parser.add_argument('--problems', type=int, default=6,
+        help='Number of problems in every contest')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+        help='Fraction of requests answered with a bare 503')
+    parser.add_argument('--limit-rate', type=float, default=0.0,
+        help='Fraction of requests answered with "Call limit exceeded"')
+    parser.add_argument('--min-interval', type=float, default=0.0,
+        help='Answer "Call limit exceeded" to calls made sooner than this many seconds after the previous one')
+    parser.add_argument('--participation', type=float, default=1.0,
+        help='Fraction of requested handles which took part in each contest')
+    parser.add_argument('--fixtures', metavar='DIR',
+        help='Serve responses recorded in this directory instead of synthetic data')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, args.latency, args.problems,
+        args.error_rate, args.limit_rate, args.min_interval, args.fixtures, args.participation)
+    print('Serving stub Codeforces API at', server.base_url) # type: ignore
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
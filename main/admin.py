@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import HandleGroup, Season, SeasonContest
+
+class SeasonContestInline(admin.TabularInline):
+    model = SeasonContest
+    extra = 5
+
+@admin.register(Season)
+class SeasonAdmin(admin.ModelAdmin):
+    list_display = ('slug', 'name')
+    prepopulated_fields = {'slug': ('name',)}
+    inlines = [SeasonContestInline]
+
+@admin.register(HandleGroup)
+class HandleGroupAdmin(admin.ModelAdmin):
+    list_display = ('slug', 'name')
+    prepopulated_fields = {'slug': ('name',)}
+    filter_horizontal = ('members',)
@@ -0,0 +1,117 @@
+"""
+Compact JSON encoding of leaderboards, for clients which poll them.
+
+Standings are encoded column by column, so field names appear once per
+board instead of once per participant. Attempts are lists with one item
+per problem, in the order of "problems". Times are in seconds.
+
+Encoded bodies are compressed with brotli (if the brotli package is
+installed) or gzip, whichever the client accepts, and kept in the cache
+under the board's ETag, so unchanged boards are encoded only once.
+"""
+
+import gzip
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cf_get import Contest, Problem, Participant
+from .timing import cache_lookup
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bump when the encoding changes, so that clients don't keep old ETags.
+ENCODING_VERSION = '2'
+
+# Smaller bodies aren't worth compressing.
+MIN_COMPRESS_SIZE = 200
+
+def num(x):
+    # type: (float) -> Any
+    # 500.0 is sent as 500.
+    return int(x) if x == int(x) else x
+
+def encode_standings(contest_id, contest, problems, participants):
+    # type: (int, Contest, List[Problem], List[Participant]) -> Dict[str, Any]
+    return {
+        'contest': {
+            'id': contest_id,
+            'name': contest.name,
+            'phase': contest.phase,
+            'type': contest.type,
+        },
+        'problems': {
+            'index': [p.index for p in problems],
+            'name': [p.name for p in problems],
+            'points': [num(p.points) for p in problems],
+        },
+        'participants': {
+            'username': [p.username for p in participants],
+            'type': [p.type for p in participants],
+            'rank': [p.rank for p in participants],
+            'intra_rank': [p.intra_rank for p in participants],
+            'points': [num(p.points) for p in participants],
+            'is_team': [int(p.is_team) for p in participants],
+            'color': [p.color for p in participants],
+            'attempts': {
+                'points': [[num(a.points) for a in p.attempts] for p in participants],
+                'rejects': [[a.rejects for a in p.attempts] for p in participants],
+                'time': [[int(a.time.total_seconds()) for a in p.attempts] for p in participants],
+            },
+        },
+    }
+
+def dumps(data):
+    # type: (Any) -> bytes
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def accepted_encodings(accept_encoding):
+    # type: (str) -> List[str]
+    encodings = []
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            encodings.append(coding.lower())
+    return encodings
+
+def choose_encoding(accept_encoding):
+    # type: (str) -> Optional[str]
+    encodings = accepted_encodings(accept_encoding)
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings:
+        return 'gzip'
+    return None
+
+def compress(body, encoding):
+    # type: (bytes, Optional[str]) -> bytes
+    if encoding == 'br':
+        return brotli.compress(body)
+    elif encoding == 'gzip':
+        return gzip.compress(body)
+    return body
+
+def encoded_body(etag, accept_encoding, encode):
+    # type: (str, str, Any) -> Tuple[bytes, Optional[str]]
+    """
+    Return the body for etag, compressed as accept_encoding allows, and the
+    encoding used. encode() is called to build the body if it isn't cached.
+    """
+    encoding = choose_encoding(accept_encoding)
+    key = 'ldrbrd_api:{}:{}'.format(etag.strip('"'), encoding or 'identity')
+    cached = cache.get(key)
+    cache_lookup('api_body', 'hit' if cached is not None else 'miss')
+    if cached is not None:
+        return cached
+    body = dumps(encode())
+    if len(body) < MIN_COMPRESS_SIZE:
+        encoding = None
+    result = (compress(body, encoding), encoding)
+    cache.set(key, result, settings.LDRBRD_RENDER_CACHE_TTL)
+    return result
@@ -0,0 +1,55 @@
+import os
+import logging
+
+from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class MainConfig(AppConfig):
+    name = 'main'
+
+    def ready(self):
+        logger.debug('Using %s settings', settings.SETTINGS_FLAVOR)
+        from django.contrib import admin
+        admin.site.site_header = settings.PROJECT_TITLE
+        admin.site.site_title = settings.PROJECT_TITLE
+
+        from django.contrib.auth.models import User
+        from django.db.models.signals import m2m_changed, post_delete, post_save
+        from .handles import group_changed, user_changed
+        from .models import HandleGroup, SeasonContest
+        from .seasons import season_contests_changed
+        post_save.connect(user_changed, sender=User)
+        post_delete.connect(user_changed, sender=User)
+        post_save.connect(group_changed, sender=HandleGroup)
+        post_delete.connect(group_changed, sender=HandleGroup)
+        m2m_changed.connect(group_changed, sender=HandleGroup.members.through)
+        post_save.connect(season_contests_changed, sender=SeasonContest)
+        post_delete.connect(season_contests_changed, sender=SeasonContest)
+
+        import django
+        if django.VERSION < (4, 1):
+            from django.core.signals import request_started
+            from .db import close_unusable
+            request_started.connect(close_unusable)
+
+        from . import cf_get
+        from .ratelimit import RateLimiter
+        state_file = None
+        if settings.CF_LOCK_DIR:
+            state_file = os.path.join(settings.CF_LOCK_DIR, 'ratelimit.state')
+        cf_get.configure(
+            base_url=settings.CF_API_BASE_URL,
+            mode=settings.CF_API_MODE,
+            fixture_dir=settings.CF_API_FIXTURE_DIR,
+            pool_connections=settings.CF_API_POOL_CONNECTIONS,
+            pool_maxsize=settings.CF_API_POOL_MAXSIZE,
+            timeout=settings.CF_API_TIMEOUT,
+            max_retries=settings.CF_API_MAX_RETRIES,
+            limiter=RateLimiter(settings.CF_API_RATE_LIMIT, settings.CF_API_BURST, state_file),
+            handles_per_request=settings.CF_API_HANDLES_PER_REQUEST,
+            max_parallel=settings.CF_API_MAX_PARALLEL,
+        )
+        from .timing import record_api_call
+        cf_get.request_hooks.append(record_api_call)
@@ -0,0 +1,146 @@
+"""
+A TTL cache with stale-while-revalidate in front of contest standings,
+which come from main.store (and through it from cf_get.get_contest_info).
+
+Entries are stored in Django's default cache, keyed on contest ID, a hash of
+the handle set and show_unofficial. How long an entry stays fresh depends on
+the contest phase. A stale entry is still served while a single background
+thread refreshes it, so a popular contest costs at most one upstream call
+per TTL window.
+
+Fetches for the same key are coalesced: concurrent callers in this process
+wait for one in-flight request, and callers in other processes wait on a
+file lock and then pick up the result from the shared cache.
+
+A coalesced fetch keeps the priority of the caller which made it. A page
+view which misses the cache while a background fetch of the same key waits
+for the rate limiter waits with it, behind every queued interactive call.
+Stale entries are served without waiting for their refresh, so that only
+happens on a miss while the refresh worker fetches the same standings, or
+when an entry expired altogether (CF_STANDINGS_STALE_TTL after going
+stale) during its refresh.
+"""
+
+import time
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .cf_get import Contest, Problem, Participant
+from .cf_get import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from .singleflight import SingleFlight
+from .store import get_standings, handles_hash
+from .timing import Callback, cache_lookup
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Standings = Tuple[Contest, List[Problem], List[Participant]]
+
+standings_flights = SingleFlight(settings.CF_LOCK_DIR)
+
+Callback('ldrbrd_standings_fetches_total',
+    'Standings fetches, by whether they were made or waited for one in flight.', 'counter', ['result'],
+    lambda: [((result,), n) for result, n in standings_flights.stats().items() if result != 'in_flight'])
+Callback('ldrbrd_standings_fetches_in_flight', 'Standings fetches being made now.', 'gauge', [],
+    lambda: [((), standings_flights.stats()['in_flight'])])
+
+def standings_key(contest_id, handles_digest, show_unofficial):
+    # type: (int, str, bool) -> str
+    return 'standings:{}:{}:{}'.format(contest_id, handles_digest, int(show_unofficial))
+
+def ttl_for_phase(phase):
+    # type: (str) -> int
+    return settings.CF_STANDINGS_TTL.get(phase, settings.CF_STANDINGS_TTL_DEFAULT)
+
+def standings_digest(standings):
+    # type: (Standings) -> str
+    """Hash of everything in standings which shows up on a leaderboard."""
+    contest, problems, participants = standings
+    h = hashlib.sha1()
+    h.update(repr((contest.name, contest.phase,
+        [(p.index, p.name, p.points) for p in problems])).encode('utf-8'))
+    for p in participants:
+        h.update(repr((p.username, p.type, p.rank, p.points, p.is_team,
+            [(a.points, a.rejects, a.time.total_seconds()) for a in p.attempts])).encode('utf-8'))
+    return h.hexdigest()
+
+def _fetch_and_store(key, contest_id, usernames, show_unofficial, priority, handles_digest):
+    # type: (str, int, List[str], bool, int, str) -> Dict[str, Any]
+    standings = get_standings(contest_id, usernames, show_unofficial, priority, handles_digest)
+    now = time.time()
+    ttl = ttl_for_phase(standings[0].phase)
+    entry = {
+        'value': standings,
+        'digest': standings_digest(standings),
+        'fetched_at': now,
+        'fresh_until': now + ttl,
+    }
+    cache.set(key, entry, ttl + settings.CF_STANDINGS_STALE_TTL)
+    return entry
+
+def _fresh_entry(key):
+    # type: (str) -> Optional[Dict[str, Any]]
+    entry = cache.get(key)
+    if entry is not None and entry['fresh_until'] > time.time():
+        return entry
+    return None
+
+def _load(key, contest_id, usernames, show_unofficial, handles_digest, priority=PRIORITY_INTERACTIVE):
+    # type: (str, int, List[str], bool, str, int) -> Dict[str, Any]
+    return standings_flights.do(key,
+        lambda: _fetch_and_store(key, contest_id, usernames, show_unofficial, priority, handles_digest),
+        recheck=lambda: _fresh_entry(key))
+
+def _refresh_in_background(key, contest_id, usernames, show_unofficial, handles_digest):
+    # type: (str, int, List[str], bool, str) -> None
+    lock_key = key + ':refreshing'
+    # cache.add is atomic, so only one caller starts a refresh.
+    if not cache.add(lock_key, 1, settings.CF_STANDINGS_REFRESH_TIMEOUT):
+        return
+
+    def refresh():
+        # type: () -> None
+        try:
+            _load(key, contest_id, usernames, show_unofficial, handles_digest, PRIORITY_BACKGROUND)
+        except Exception:
+            # Network errors and bugs too; nothing else would see them on this thread.
+            logger.warning('Background refresh of contest %d failed', contest_id, exc_info=True)
+        finally:
+            cache.delete(lock_key)
+            connection.close()
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+def get_standings_entry(contest_id, usernames, show_unofficial, handles_digest=None):
+    # type: (int, Iterable[str], bool, Optional[str]) -> Dict[str, Any]
+    """
+    Return the cache entry of standings, with their digest and fetch time.
+    A stale entry is returned right away and refreshed in the background.
+    """
+    usernames = list(usernames)
+    handles_digest = handles_digest or handles_hash(usernames)
+    key = standings_key(contest_id, handles_digest, show_unofficial)
+    entry = cache.get(key)
+    if entry is None:
+        cache_lookup('standings', 'miss')
+        entry = _load(key, contest_id, usernames, show_unofficial, handles_digest)
+    elif entry['fresh_until'] <= time.time():
+        cache_lookup('standings', 'stale')
+        _refresh_in_background(key, contest_id, usernames, show_unofficial, handles_digest)
+    else:
+        cache_lookup('standings', 'hit')
+    return entry
+
+def get_fresh_standings_entry(contest_id, usernames, show_unofficial, priority=PRIORITY_INTERACTIVE,
+        handles_digest=None):
+    # type: (int, Iterable[str], bool, int, Optional[str]) -> Dict[str, Any]
+    """Like get_standings_entry, but wait for a refresh instead of returning a stale entry."""
+    usernames = list(usernames)
+    handles_digest = handles_digest or handles_hash(usernames)
+    key = standings_key(contest_id, handles_digest, show_unofficial)
+    return _fresh_entry(key) or _load(key, contest_id, usernames, show_unofficial, handles_digest, priority)
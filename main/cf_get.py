@@ -1,22 +1,109 @@
 #!/usr/bin/env python
 
+import io
+import os
 import json
-import requests
-from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+import asyncio
+import logging
+import contextvars
+import time
+import random
+import heapq
+import hashlib
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, TypeVar
+from typing import TYPE_CHECKING
 from datetime import timedelta
+from urllib.parse import urlsplit, parse_qsl
+
+# requests (with urllib3) and ijson take longer to import than the rest of
+# the app together, so they are imported on first use rather than when
+# processes start, many of which never make an API call. Code which runs
+# uses _requests(); the import below is only for type comments.
+if TYPE_CHECKING:
+    import requests
+
+# The requests module once imported; see _requests().
+_requests_module = None # type: Any
+
+# Optional: parse large standings incrementally while they are downloaded.
+# The ijson module once imported, or None if it isn't installed; see _ijson().
+ijson = False # type: Any
 
 BASE_URL = 'http://codeforces.com/api'
 
+# All API calls share one pooled, keep-alive session per process.
+# Use configure() to change these; it discards the current session.
+POOL_CONNECTIONS = 2 # type: int
+POOL_MAXSIZE = 10 # type: int
+TIMEOUT = (3.05, 20.0) # type: Tuple[float, float]
+
+# Retries of transient failures use exponential backoff with full jitter.
+MAX_RETRIES = 3 # type: int
+BACKOFF_BASE = 1.0 # type: float
+BACKOFF_MAX = 16.0 # type: float
+RETRYABLE_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+# Most bytes read from the body of an error response, for its comment.
+ERROR_BODY_LIMIT = 64 * 1024
+
+# Long handle lists are split into chunks of at most HANDLES_PER_REQUEST
+# handles, which are fetched concurrently on up to MAX_PARALLEL threads.
+HANDLES_PER_REQUEST = 300 # type: int
+MAX_PARALLEL = 4 # type: int
+
+# Lower values are served first by the rate limiter.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# 'live' calls the API. 'record' calls it too, and saves every response
+# in FIXTURE_DIR. 'replay' answers calls from FIXTURE_DIR without network access.
+MODE = 'live' # type: str
+FIXTURE_DIR = 'cf_fixtures' # type: str
+
+# An object with an acquire(priority) method, e.g. main.ratelimit.RateLimiter.
+# API calls are not throttled when this is None.
+rate_limiter = None # type: Any
+
+# Functions called as hook(method, status_code, seconds) after every API call,
+# with the time taken by the whole call, including waiting for the rate limiter,
+# retries and reading the body. status_code is None if no response was received.
+request_hooks = [] # type: List[Callable[[str, Optional[int], float], None]]
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_session = None # type: Optional[requests.Session]
+_session_pid = None # type: Optional[int]
+_session_lock = threading.Lock()
+
 class Contest:
+    id = 0 # type: int
     name = '' # type: str
     phase = '' # type: str
     type = '' # type: str
+    # Unix times in seconds; Codeforces leaves them out for some contests.
+    start_time = None # type: Optional[int]
+    duration = None # type: Optional[int]
 
     def __init__(self, contest):
         # type: (Mapping[str, Any]) -> None
+        self.id = contest.get("id", 0)
         self.name = contest["name"]
         self.phase = contest["phase"]
         self.type = contest["type"]
+        self.start_time = contest.get("startTimeSeconds")
+        self.duration = contest.get("durationSeconds")
+
+    @property
+    def end_time(self):
+        # type: () -> Optional[int]
+        if self.start_time is None or self.duration is None:
+            return None
+        return self.start_time + self.duration
 
     def __str__(self) -> str:
         return "Contest({}, {})".format(repr(self.name), self.phase)
@@ -40,16 +127,15 @@ class Problem:
         return str(self)
 
 class Attempt:
-    # An attempt is a set of submissions to a particular problem by a particular user
-    points = 0.0 # type: float
-    rejects = 0 # type: int
-    time = timedelta(0) # type: timedelta
+    # An attempt is a set of submissions to a particular problem by a particular user.
+    # Big contests have hundreds of thousands of these, so they have no per-instance dict.
+    __slots__ = ('points', 'rejects', 'time')
 
     def __init__(self, problem_result):
         # type: (Mapping[str, Any]) -> None
-        self.points = problem_result["points"]
-        self.rejects = problem_result["rejectedAttemptCount"]
-        self.time = timedelta(seconds=problem_result.get("bestSubmissionTimeSeconds", 0))
+        self.points = problem_result["points"] # type: float
+        self.rejects = problem_result["rejectedAttemptCount"] # type: int
+        self.time = timedelta(seconds=problem_result.get("bestSubmissionTimeSeconds", 0)) # type: timedelta
 
     def __str__(self) -> str:
         return 'Attempt({}, {})'.format(self.points, self.rejects)
@@ -57,22 +143,19 @@ class Attempt:
         return str(self)
 
 class Participant:
-    username = '' # type: str
-    type = '' # type: str
-    rank = 0 # type: int
-    points = 0.0 # type: float
-    attempts = [] # type: List[Attempt]
-    color = '' # type: str
-    is_team = False # type: bool
+    __slots__ = ('username', 'type', 'rank', 'points', 'attempts', 'color', 'is_team', 'intra_rank')
 
     def __init__(self, ranklist_row):
         # type: (Mapping[str, Any]) -> None
-        self.type = ranklist_row["party"]["participantType"]
-        self.rank = ranklist_row["rank"]
-        self.points = ranklist_row["points"]
-        self.attempts = [Attempt(att) for att in ranklist_row["problemResults"]]
-        self.username = ranklist_row["party"].get("teamName") or ranklist_row["party"]["members"][0]["handle"]
-        self.is_team = "teamName" in ranklist_row["party"]
+        self.type = ranklist_row["party"]["participantType"] # type: str
+        self.rank = ranklist_row["rank"] # type: int
+        self.points = ranklist_row["points"] # type: float
+        self.attempts = [Attempt(att) for att in ranklist_row["problemResults"]] # type: List[Attempt]
+        self.username = ranklist_row["party"].get("teamName") or ranklist_row["party"]["members"][0]["handle"] # type: str
+        self.is_team = "teamName" in ranklist_row["party"] # type: bool
+        self.color = '' # type: str
+        # Rank among the participants of a leaderboard, see main.groups.
+        self.intra_rank = 0 # type: int
 
     def __str__(self) -> str:
         return 'Participant({}, {})'.format(self.username, self.type)
@@ -84,6 +167,7 @@ class CfUser:
     first_name = '' # type: str
     last_name = '' # type: str
     rating = 0 # type: int
+    rank = '' # type: str
     color = '' # type: str
 
     rank_to_color = {
@@ -105,7 +189,8 @@ class CfUser:
         self.first_name = userinfo.get('firstName', '')
         self.last_name = userinfo.get('lastName', '')
         self.rating = userinfo.get('rating', 0)
-        self.color = self.rank_to_color.get(userinfo.get('rank', ''), '')
+        self.rank = userinfo.get('rank', '')
+        self.color = self.rank_to_color.get(self.rank, '')
 
     def __str__(self) -> str:
         return 'CfUser({})'.format(self.username)
@@ -115,54 +200,430 @@ class CfUser:
 class CfApiError(Exception):
     response = None # type: Optional[requests.Response]
     http_error = None # type: Optional[requests.exceptions.HTTPError]
+    payload = None # type: Optional[Mapping[str, Any]]
 
-    def __init__(self, response, http_error=None):
-        # type: (requests.Response, Optional[requests.exceptions.HTTPError]) -> None
+    def __init__(self, response, http_error=None, payload=None):
+        # type: (requests.Response, Optional[requests.exceptions.HTTPError], Optional[Mapping[str, Any]]) -> None
         self.response = response
         self.http_error = http_error
-
-def log_and_request(**kwargs):
-    # type: (**Any) -> requests.Response
-    prequest = requests.Request('GET', **kwargs).prepare()
-    print('GET', prequest.url)
-    with requests.Session() as session:
-        response = session.send(prequest)
-
+        self.payload = payload
+
+    @property
+    def comment(self):
+        # type: () -> str
+        # Error responses which aren't from the API itself (like a bare 503) aren't JSON.
+        # The comment is shown to users, so it never includes the URL, which lists handles.
+        if self.payload is not None and isinstance(self.payload.get('comment'), str):
+            return self.payload['comment']
+        return 'Codeforces API error: {} {}'.format(self.response.status_code, self.response.reason or '').strip()
+
+def configure(pool_connections=None, pool_maxsize=None, timeout=None, max_retries=None, limiter=None,
+        handles_per_request=None, max_parallel=None, base_url=None, mode=None, fixture_dir=None):
+    # type: (Optional[int], Optional[int], Optional[Tuple[float, float]], Optional[int], Any, Optional[int], Optional[int], Optional[str], Optional[str], Optional[str]) -> None
+    global POOL_CONNECTIONS, POOL_MAXSIZE, TIMEOUT, MAX_RETRIES, rate_limiter
+    global HANDLES_PER_REQUEST, MAX_PARALLEL, BASE_URL, MODE, FIXTURE_DIR
+    if base_url is not None:
+        BASE_URL = base_url.rstrip('/')
+    if mode is not None:
+        if mode not in ('live', 'record', 'replay'):
+            raise ValueError('Unknown API mode: {}'.format(mode))
+        MODE = mode
+    if fixture_dir is not None:
+        FIXTURE_DIR = fixture_dir
+    if handles_per_request is not None:
+        HANDLES_PER_REQUEST = handles_per_request
+    if max_parallel is not None:
+        MAX_PARALLEL = max_parallel
+    if max_retries is not None:
+        MAX_RETRIES = max_retries
+    if limiter is not None:
+        rate_limiter = limiter
+    if pool_connections is not None:
+        POOL_CONNECTIONS = pool_connections
+    if pool_maxsize is not None:
+        POOL_MAXSIZE = pool_maxsize
+    if timeout is not None:
+        TIMEOUT = tuple(timeout) # type: ignore
+    close_session()
+
+def _ijson():
+    # type: () -> Any
+    global ijson
+    if ijson is False:
+        try:
+            import ijson as module
+        except ImportError:
+            module = None
+        ijson = module
+    return ijson
+
+def _requests():
+    # type: () -> Any
+    global _requests_module
+    if _requests_module is None:
+        importlib.import_module('requests.adapters')
+        _requests_module = importlib.import_module('requests')
+    return _requests_module
+
+def get_session():
+    # type: () -> requests.Session
+    """
+    Return the process-wide session, creating it if needed.
+    A session inherited across fork() is never reused, since its sockets
+    are shared with the parent process.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = _requests().Session()
+            # pool_block bounds the number of open connections per host;
+            # extra threads wait for a connection instead of opening new ones.
+            adapter = _requests().adapters.HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE, pool_block=True)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+            _session_pid = os.getpid()
+        return _session
+
+def reset_session():
+    # type: () -> None
+    # Forget the current session without closing its connections.
+    # This is meant to be called in a freshly forked child process.
+    global _session, _session_pid
+    with _session_lock:
+        _session = None
+        _session_pid = None
+
+def close_session():
+    # type: () -> None
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None and _session_pid == os.getpid():
+            _session.close()
+        _session = None
+        _session_pid = None
+
+def network_errors():
+    # type: () -> Tuple[type, ...]
+    """Errors of API calls which got no response, even after retries."""
+    exceptions = _requests().exceptions
+    return (exceptions.ConnectionError, exceptions.Timeout)
+
+def is_retryable(response):
+    # type: (requests.Response) -> bool
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        return True
     try:
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as http_error:
-        raise CfApiError(response, http_error)
-    if response.json()["status"] != 'OK':
-        raise CfApiError(response)
-
+        comment = response.json().get("comment", "")
+    except ValueError:
+        return False
+    return comment.startswith("Call limit exceeded")
+
+def backoff_delay(attempt):
+    # type: (int) -> float
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+# Recorded responses. Each one is stored as two files named after the API
+# method and a hash of its query: a .json file with the status code and
+# content type, and a .body file with the body.
+
+def fixture_name(url):
+    # type: (str) -> str
+    parts = urlsplit(url)
+    method = parts.path.rstrip('/').rsplit('/', 1)[-1]
+    query = []
+    for key, value in sorted(parse_qsl(parts.query)):
+        if key == 'handles':
+            # Chunks can list the same handles in any order.
+            value = ';'.join(sorted(value.split(';')))
+        query.append((key, value))
+    digest = hashlib.sha1(json.dumps(query).encode('utf-8')).hexdigest()[:20]
+    return '{}-{}'.format(method, digest)
+
+def save_fixture(directory, url, status_code, content_type, body):
+    # type: (str, str, int, str, bytes) -> None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, fixture_name(url))
+    # Write the body first, so a fixture is never found without one.
+    with open(path + '.body', 'wb') as f:
+        f.write(body)
+    with open(path + '.json', 'w') as f:
+        json.dump({'url': url, 'status': status_code, 'content_type': content_type}, f)
+
+def load_fixture(directory, url):
+    # type: (str, str) -> Optional[Tuple[int, str, bytes]]
+    path = os.path.join(directory, fixture_name(url))
+    try:
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        with open(path + '.body', 'rb') as f:
+            body = f.read()
+    except FileNotFoundError:
+        return None
+    return (meta['status'], meta['content_type'], body)
+
+def replay_response(url):
+    # type: (str) -> requests.Response
+    fixture = load_fixture(FIXTURE_DIR, url)
+    if fixture is None:
+        fixture = (404, 'application/json', json.dumps({'status': 'FAILED',
+            'comment': 'No recorded response for {}'.format(url)}).encode('utf-8'))
+    status_code, content_type, body = fixture
+    response = _requests().Response()
+    response.url = url
+    response.status_code = status_code
+    response.headers['Content-Type'] = content_type
+    response._content = body
+    response.raw = io.BytesIO(body)
     return response
 
-def get_user_info(usernames):
-    # type: (Iterable[str]) -> List[CfUser]
-    query = {'handles': ';'.join(usernames)}
-    response = log_and_request(url = BASE_URL + '/user.info', params=query)
-    result = response.json()["result"]
-
-    return [CfUser(userinfo) for userinfo in result]
-
-def get_contest_info(contest_id, usernames, show_unofficial):
-    # type: (int, Iterable[str], bool) -> Tuple[Contest, List[Problem], List[Participant]]
-
-    query = {
-        'contestId': contest_id,
-        'handles': ';'.join(usernames),
-        'showUnofficial': 'true' if show_unofficial else 'false',
-    } # type: Dict[str, Any]
-
-    response = log_and_request(url = BASE_URL + '/contest.standings', params=query)
-
-    result = response.json()['result']
-    contest = Contest(result["contest"])
-    problems = [Problem(prob) for prob in result["problems"]]
-    participants = [Participant(row) for row in result["rows"]]
+def read_result(response):
+    # type: (requests.Response) -> Any
+    """Decode the body of an API response and return its result."""
+    payload = json.loads(response.content.decode('utf-8'))
+    if payload.get("status") != 'OK':
+        raise CfApiError(response, payload=payload)
+    return payload["result"]
+
+def log_and_request(priority=PRIORITY_INTERACTIVE, reader=read_result, stream=False, **kwargs):
+    # type: (int, Callable[[requests.Response], T], bool, **Any) -> T
+    """
+    Make an API call and return reader(response). The body is parsed exactly once, by reader.
+    If stream is True, reader gets the response before its body has been downloaded.
+    """
+    exceptions = _requests().exceptions
+    session = get_session()
+    prequest = session.prepare_request(_requests().Request('GET', **kwargs))
+    if MODE == 'replay':
+        return _read_response(replay_response(prequest.url), reader)
+    elif MODE == 'record':
+        # The whole body is needed to save it.
+        stream = False
+
+    method = urlsplit(prequest.url).path.rstrip('/').rsplit('/', 1)[-1]
+    status_code = None # type: Optional[int]
+    start = time.perf_counter()
+    attempt = 0
+    try:
+        while True:
+            if rate_limiter is not None:
+                rate_limiter.acquire(priority)
+            logger.debug('GET %s', prequest.url)
+            try:
+                response = session.send(prequest, timeout=TIMEOUT, stream=stream)
+            except (exceptions.ConnectionError, exceptions.Timeout):
+                if attempt >= MAX_RETRIES:
+                    raise
+            else:
+                if attempt >= MAX_RETRIES or response.ok or not is_retryable(response):
+                    break
+                response.close()
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+        status_code = response.status_code
+
+        if MODE == 'record' and (response.ok or not is_retryable(response)):
+            save_fixture(FIXTURE_DIR, prequest.url, response.status_code,
+                response.headers.get('Content-Type', ''), response.content)
+            # Readers which stream the body read it from raw.
+            response.raw = io.BytesIO(response.content)
+        return _read_response(response, reader)
+    finally:
+        elapsed = time.perf_counter() - start
+        logger.debug('%s returned %s in %.3f s after %d retries', method, status_code, elapsed, attempt)
+        for hook in request_hooks:
+            hook(method, status_code, elapsed)
+
+def _error_payload(response):
+    # type: (requests.Response) -> Optional[Mapping[str, Any]]
+    """The JSON body of an error response, if it is one; at most ERROR_BODY_LIMIT bytes are read."""
+    exceptions = _requests().exceptions
+    try:
+        body = next(response.iter_content(ERROR_BODY_LIMIT), b'')
+        payload = json.loads(body.decode('utf-8'))
+    except (exceptions.RequestException, ValueError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+def _read_response(response, reader):
+    # type: (requests.Response, Callable[[requests.Response], T]) -> T
+    try:
+        try:
+            response.raise_for_status()
+        except _requests().exceptions.HTTPError as http_error:
+            # A streamed body can't be read once the response is closed.
+            raise CfApiError(response, http_error, _error_payload(response))
+        return reader(response)
+    finally:
+        response.close()
+
+def read_standings(response):
+    # type: (requests.Response) -> Tuple[Contest, List[Problem], List[Participant]]
+    result = read_result(response)
+    return (Contest(result["contest"]), [Problem(prob) for prob in result["problems"]],
+        [Participant(row) for row in result["rows"]])
+
+class UnexpectedLayout(Exception):
+    pass
+
+class _HeadRecorder:
+    # A file-like wrapper which keeps a copy of what is read until recording is turned off.
+    def __init__(self, f):
+        # type: (Any) -> None
+        self.f = f
+        self.recording = True
+        self.chunks = [] # type: List[bytes]
+
+    def read(self, size=-1):
+        # type: (int) -> bytes
+        data = self.f.read(size)
+        if self.recording:
+            self.chunks.append(data)
+        return data
+
+def read_standings_stream(response):
+    # type: (requests.Response) -> Tuple[Contest, List[Problem], List[Participant]]
+    """
+    Like read_standings, but ranklist rows are parsed while the body is downloaded,
+    and each one is turned into a Participant as soon as it has been parsed.
+    Codeforces sends status, contest and problems before rows; those are parsed
+    from a copy of the first part of the body.
+    """
+    ijson = _ijson()
+    response.raw.decode_content = True
+    recorder = _HeadRecorder(response.raw)
+    participants = []
+    for row in ijson.items(recorder, 'result.rows.item', use_float=True):
+        recorder.recording = False
+        participants.append(Participant(row))
+    head = b''.join(recorder.chunks)
+
+    if recorder.recording:
+        # There were no rows, so the whole body has been recorded.
+        payload = json.loads(head.decode('utf-8'))
+        if payload.get("status") != 'OK':
+            raise CfApiError(response, payload=payload)
+        result = payload["result"]
+        return (Contest(result["contest"]), [Problem(prob) for prob in result["problems"]], [])
+
+    payload = {}
+    contest = None # type: Optional[Contest]
+    problems = [] # type: List[Problem]
+    builder = None
+    section = ''
+    for prefix, event, value in ijson.parse(io.BytesIO(head), use_float=True):
+        if prefix == 'result.rows':
+            break
+        if builder is None:
+            if event == 'start_map' and prefix in ('result.contest', 'result.problems.item'):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                section = prefix
+            elif prefix in ('status', 'comment'):
+                payload[prefix] = value
+            continue
+        builder.event(event, value)
+        if event == 'end_map' and prefix == section:
+            if section == 'result.contest':
+                contest = Contest(builder.value)
+            else:
+                problems.append(Problem(builder.value))
+            builder = None
+
+    if payload.get("status") != 'OK' or contest is None:
+        raise UnexpectedLayout()
+    return (contest, problems, participants)
 
+def chunked(items, size):
+    # type: (List[str], int) -> Iterator[List[str]]
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def handle_chunks(usernames):
+    # type: (Iterable[str]) -> List[List[str]]
+    # An empty handle list is still one request: it asks for the whole standings.
+    usernames = list(usernames)
+    return list(chunked(usernames, HANDLES_PER_REQUEST)) or [[]]
+
+def map_parallel(func, chunks):
+    # type: (Callable[[List[str]], T], List[List[str]]) -> List[T]
+    if len(chunks) == 1:
+        return [func(chunks[0])]
+    with ThreadPoolExecutor(min(MAX_PARALLEL, len(chunks))) as executor:
+        # Each call runs in a copy of the caller's context, so that context
+        # variables (like the timings of a request) are seen by request_hooks.
+        futures = [executor.submit(contextvars.copy_context().run, func, chunk) for chunk in chunks]
+        return [future.result() for future in futures]
+
+def get_user_info(usernames, priority=PRIORITY_INTERACTIVE):
+    # type: (Iterable[str], int) -> List[CfUser]
+    def fetch(chunk):
+        # type: (List[str]) -> List[CfUser]
+        query = {'handles': ';'.join(chunk)}
+        result = log_and_request(priority, url = BASE_URL + '/user.info', params=query)
+        return [CfUser(userinfo) for userinfo in result]
+
+    results = map_parallel(fetch, handle_chunks(usernames))
+    return [user for users in results for user in users]
+
+def get_contest_list(priority=PRIORITY_INTERACTIVE, gym=False):
+    # type: (int, bool) -> List[Contest]
+    result = log_and_request(priority, url = BASE_URL + '/contest.list',
+        params={'gym': 'true' if gym else 'false'})
+    return [Contest(contest) for contest in result]
+
+def standings_order(participant):
+    # type: (Participant) -> Tuple[bool, int]
+    # Codeforces lists rows by rank, with unranked rows (rank 0) at the end.
+    return (participant.rank == 0, participant.rank)
+
+def merge_participants(chunk_rows):
+    # type: (List[List[Participant]]) -> List[Participant]
+    """
+    Merge standings fetched for different handle chunks into one list.
+    A team whose members are in different chunks is returned by each of
+    them, so duplicate rows are dropped.
+    """
+    if len(chunk_rows) == 1:
+        return chunk_rows[0]
+    seen = set()
+    merged = []
+    for p in heapq.merge(*chunk_rows, key=standings_order):
+        key = (p.username, p.type, p.rank, p.points)
+        if key not in seen:
+            seen.add(key)
+            merged.append(p)
+    return merged
+
+def get_contest_info(contest_id, usernames, show_unofficial, priority=PRIORITY_INTERACTIVE, fetch_colors=True):
+    # type: (int, Iterable[str], bool, int, bool) -> Tuple[Contest, List[Problem], List[Participant]]
+    usernames = list(usernames)
+
+    def fetch(chunk):
+        # type: (List[str]) -> Tuple[Contest, List[Problem], List[Participant]]
+        query = {
+            'contestId': contest_id,
+            'handles': ';'.join(chunk),
+            'showUnofficial': 'true' if show_unofficial else 'false',
+        } # type: Dict[str, Any]
+
+        if _ijson() is not None:
+            try:
+                return log_and_request(priority, read_standings_stream, True,
+                    url = BASE_URL + '/contest.standings', params=query)
+            except UnexpectedLayout:
+                pass
+        return log_and_request(priority, read_standings, url = BASE_URL + '/contest.standings', params=query)
+
+    results = map_parallel(fetch, handle_chunks(usernames))
+    contest, problems = results[0][:2]
+    participants = merge_participants([rows for _, _, rows in results])
+
+    if not fetch_colors:
+        return (contest, problems, participants)
     try:
-        userlist = get_user_info(usernames)
+        userlist = get_user_info(usernames, priority)
         colormap = {user.username: user.color for user in userlist}
         for p in participants:
             p.color = colormap.get(p.username, '')
@@ -171,6 +632,41 @@ def get_contest_info(contest_id, usernames, show_unofficial):
 
     return (contest, problems, participants)
 
+# Async variants, for use from async code. The blocking calls run on the
+# event loop's default executor (in a copy of the caller's context), so they
+# share the pooled session, the rate limiter and retries with the synchronous
+# functions above.
+
+async def get_user_info_async(usernames, priority=PRIORITY_INTERACTIVE):
+    # type: (Iterable[str], int) -> List[CfUser]
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, contextvars.copy_context().run,
+        get_user_info, list(usernames), priority)
+
+async def get_contest_info_async(contest_id, usernames, show_unofficial, priority=PRIORITY_INTERACTIVE, fetch_colors=True):
+    # type: (int, Iterable[str], bool, int, bool) -> Tuple[Contest, List[Problem], List[Participant]]
+    """Like get_contest_info, but contest.standings and user.info are requested concurrently."""
+    usernames = list(usernames)
+    loop = asyncio.get_running_loop()
+    standings = loop.run_in_executor(None, contextvars.copy_context().run,
+        lambda: get_contest_info(contest_id, usernames, show_unofficial, priority, fetch_colors=False))
+    if not fetch_colors:
+        return await standings
+
+    standings_result, users_result = await asyncio.gather(standings,
+        get_user_info_async(usernames, priority), return_exceptions=True)
+    if isinstance(standings_result, BaseException):
+        raise standings_result
+    contest, problems, participants = standings_result
+    if isinstance(users_result, CfApiError):
+        return (contest, problems, participants)
+    elif isinstance(users_result, BaseException):
+        raise users_result
+    colormap = {user.username: user.color for user in users_result}
+    for p in participants:
+        p.color = colormap.get(p.username, '')
+    return (contest, problems, participants)
+
 def main():
     # type: () -> None
     contest_id = int(input("Enter contest ID: "))
@@ -0,0 +1,19 @@
+"""
+Health checks of persistent database connections.
+
+With CONN_MAX_AGE, a worker keeps its connection between requests. If the
+database closes it meanwhile (a restart or failover, or an idle timeout),
+the next request on it fails. Django 4.1+ checks connections before reusing
+them when CONN_HEALTH_CHECKS is set; on older versions, close_unusable does
+the same at the start of each request, so that Django opens a new one.
+"""
+
+from django.db import connections
+
+def close_unusable(**kwargs):
+    for conn in connections.all():
+        if not conn.settings_dict.get('CONN_HEALTH_CHECKS') or conn.connection is None:
+            continue
+        if conn.in_atomic_block or conn.is_usable():
+            continue
+        conn.close()
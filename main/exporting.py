@@ -0,0 +1,280 @@
+"""
+Exporting standings of many contests to files, for reporting.
+
+Contests are fetched on a few threads at once. Every API call still goes
+through cf_get's rate limiter, which all processes on a machine share, so
+the export doesn't starve web processes beyond its priority. Rows of each
+contest are written as soon as it has been fetched, and only the contests
+being fetched are held in memory.
+
+There is one row per participant and problem (see FIELDS), so the columns
+are the same for every contest. CSV and JSON Lines go to one file. Parquet
+(which needs pyarrow) goes to a directory with a file per contest.
+
+A checkpoint file lists the contests which have been written (or failed)
+and the size of the output after the last of them. An interrupted export
+which is run again truncates the output to that size, dropping a partly
+written contest, and skips the contests in the checkpoint.
+"""
+
+import abc
+import csv
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.db import connection
+
+from . import cf_get
+from . import store
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+Standings = Tuple[cf_get.Contest, List[cf_get.Problem], List[cf_get.Participant]]
+Row = Tuple[Any, ...]
+
+FIELDS = ['contest_id', 'contest_name', 'username', 'participant_type', 'is_team', 'rank', 'points',
+    'problem', 'problem_max_points', 'problem_points', 'rejects', 'time']
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+def parse_ranges(specs):
+    # type: (Iterable[str]) -> List[int]
+    """Contest IDs from specs like "1500", "1500-1510" or "1500,1502", sorted and without duplicates."""
+    contest_ids = set() # type: Set[int]
+    for spec in specs:
+        for part in re.split(r'[,\s]+', spec.strip()):
+            if not part:
+                continue
+            match = re.match(r'^(\d+)(?:-(\d+))?$', part)
+            if match is None:
+                raise ValueError('Invalid contest range: {}'.format(part))
+            first = int(match.group(1))
+            last = int(match.group(2) or first)
+            if last < first:
+                raise ValueError('Invalid contest range: {}'.format(part))
+            contest_ids.update(range(first, last + 1))
+    return sorted(contest_ids)
+
+def standings_rows(contest_id, standings):
+    # type: (int, Standings) -> Iterable[Row]
+    contest, problems, participants = standings
+    for p in participants:
+        for problem, attempt in zip(problems, p.attempts):
+            yield (contest_id, contest.name, p.username, p.type, p.is_team, p.rank, p.points,
+                problem.index, problem.points, attempt.points, attempt.rejects,
+                int(attempt.time.total_seconds()))
+
+def format_for(path):
+    # type: (str) -> str
+    """Guess the format from the extension of path."""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('json', 'ndjson'):
+        return 'jsonl'
+    return extension if extension in FORMATS else 'csv'
+
+class FileWriter(abc.ABC):
+    """Appends rows to one file, which is truncated to size when it is opened."""
+
+    def __init__(self, path, size):
+        # type: (str, int) -> None
+        self.path = path
+        if not os.path.exists(path):
+            open(path, 'w').close()
+        self.file = open(path, 'r+', encoding='utf-8', newline='')
+        self.file.truncate(size)
+        self.file.seek(size)
+        if size == 0:
+            self.write_header()
+
+    def write_header(self):
+        # type: () -> None
+        pass
+
+    @abc.abstractmethod
+    def write(self, contest_id, rows):
+        # type: (int, Iterable[Row]) -> None
+        pass
+
+    def size(self):
+        # type: () -> int
+        # Rows are only appended, so the size of the file is where the next contest starts.
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return os.fstat(self.file.fileno()).st_size
+
+    def close(self):
+        # type: () -> None
+        self.file.close()
+
+class CsvWriter(FileWriter):
+    def write_header(self):
+        # type: () -> None
+        csv.writer(self.file).writerow(FIELDS)
+
+    def write(self, contest_id, rows):
+        # type: (int, Iterable[Row]) -> None
+        csv.writer(self.file).writerows(rows)
+
+class JsonlWriter(FileWriter):
+    def write(self, contest_id, rows):
+        # type: (int, Iterable[Row]) -> None
+        for row in rows:
+            self.file.write(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False))
+            self.file.write('\n')
+
+class ParquetWriter:
+    """Writes the rows of each contest to <path>/<contest_id>.parquet."""
+
+    def __init__(self, path, size):
+        # type: (str, int) -> None
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError('Parquet output needs the pyarrow package.')
+        self.pyarrow = pyarrow
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.schema = pyarrow.schema([
+            ('contest_id', pyarrow.int32()),
+            ('contest_name', pyarrow.string()),
+            ('username', pyarrow.string()),
+            ('participant_type', pyarrow.string()),
+            ('is_team', pyarrow.bool_()),
+            ('rank', pyarrow.int32()),
+            ('points', pyarrow.float64()),
+            ('problem', pyarrow.string()),
+            ('problem_max_points', pyarrow.float64()),
+            ('problem_points', pyarrow.float64()),
+            ('rejects', pyarrow.int32()),
+            ('time', pyarrow.int32()),
+        ])
+
+    def write(self, contest_id, rows):
+        # type: (int, Iterable[Row]) -> None
+        columns = list(zip(*rows)) or [()] * len(FIELDS)
+        table = self.pyarrow.Table.from_arrays([self.pyarrow.array(column, type=field.type)
+            for column, field in zip(columns, self.schema)], schema=self.schema)
+        # Written under another name first, so that a file is either complete or absent.
+        final_path = os.path.join(self.path, '{}.parquet'.format(contest_id))
+        self.pyarrow.parquet.write_table(table, final_path + '.tmp')
+        os.replace(final_path + '.tmp', final_path)
+
+    def size(self):
+        # type: () -> int
+        return 0
+
+    def close(self):
+        # type: () -> None
+        pass
+
+WRITERS = {'csv': CsvWriter, 'jsonl': JsonlWriter, 'parquet': ParquetWriter} # type: Dict[str, Any]
+
+class Checkpoint:
+    def __init__(self, path):
+        # type: (str) -> None
+        self.path = path
+        self.done = [] # type: List[int]
+        self.failed = {} # type: Dict[int, str]
+        self.size = 0
+        self.format = None # type: Optional[str]
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.done = data['done']
+            self.failed = {int(contest_id): comment for contest_id, comment in data['failed'].items()}
+            self.size = data['size']
+            self.format = data['format']
+
+    def save(self):
+        # type: () -> None
+        data = {'format': self.format, 'size': self.size, 'done': self.done,
+            'failed': {str(contest_id): comment for contest_id, comment in self.failed.items()}}
+        # Replaced atomically, so that an interruption leaves the old or the new checkpoint.
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(self.path + '.tmp', self.path)
+
+def fetcher(usernames, show_unofficial, use_store):
+    # type: (List[str], bool, bool) -> Callable[[int], Standings]
+    digest = store.handles_hash(usernames)
+
+    def fetch(contest_id):
+        # type: (int) -> Standings
+        try:
+            if use_store:
+                # Stored standings are used, and fetched ones are stored, like backfill_standings does.
+                return store.get_standings(contest_id, usernames, show_unofficial,
+                    cf_get.PRIORITY_BACKGROUND, digest)
+            return cf_get.get_contest_info(contest_id, usernames, show_unofficial,
+                cf_get.PRIORITY_BACKGROUND, fetch_colors=False)
+        finally:
+            connection.close()
+    return fetch
+
+def export(contest_ids, fetch, output, output_format, checkpoint_path, parallel=4, retry_failed=False,
+        report=None):
+    # type: (List[int], Callable[[int], Standings], str, str, str, int, bool, Optional[Callable[[int, str], None]]) -> Checkpoint
+    """
+    Write standings of contest_ids, fetched with fetch(contest_id), to output,
+    resuming from the checkpoint if there is one. report(contest_id, message)
+    is called after each contest.
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    if checkpoint.format is not None and checkpoint.format != output_format:
+        raise ValueError('The checkpoint is of a {} export.'.format(checkpoint.format))
+    checkpoint.format = output_format
+    skip = set(checkpoint.done)
+    if retry_failed:
+        checkpoint.failed = {}
+    skip.update(checkpoint.failed)
+    pending = [contest_id for contest_id in contest_ids if contest_id not in skip]
+
+    writer = WRITERS[output_format](output, checkpoint.size)
+    stop = threading.Event()
+
+    def fetch_unless_stopped(contest_id):
+        # type: (int) -> Standings
+        if stop.is_set():
+            raise KeyboardInterrupt
+        return fetch(contest_id)
+
+    executor = ThreadPoolExecutor(max_workers=parallel)
+    try:
+        futures = {} # type: Dict[Any, int]
+        queue = iter(pending)
+        while True:
+            # Only a few contests are submitted ahead, so that finished ones don't pile up.
+            for contest_id in queue:
+                futures[executor.submit(fetch_unless_stopped, contest_id)] = contest_id
+                if len(futures) >= parallel:
+                    break
+            if not futures:
+                break
+            finished, unfinished = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                contest_id = futures.pop(future)
+                try:
+                    standings = future.result()
+                except cf_get.CfApiError as e:
+                    checkpoint.failed[contest_id] = e.comment
+                    message = 'failed: {}'.format(e.comment)
+                except cf_get.network_errors() as e:
+                    # Like API errors, these are tried again with --retry-failed.
+                    checkpoint.failed[contest_id] = 'Could not reach Codeforces ({})'.format(type(e).__name__)
+                    message = 'failed: {}'.format(checkpoint.failed[contest_id])
+                else:
+                    writer.write(contest_id, standings_rows(contest_id, standings))
+                    checkpoint.size = writer.size()
+                    checkpoint.done.append(contest_id)
+                    message = '{} participants, {}'.format(len(standings[2]), standings[0].phase)
+                checkpoint.save()
+                if report is not None:
+                    report(contest_id, message)
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+        writer.close()
+    return checkpoint
@@ -0,0 +1,34 @@
+"""
+Leaderboards of handle groups.
+
+Standings are fetched (and cached and stored) for all registered handles
+only, so a contest costs the same API calls however many groups there
+are. The leaderboard of a group is filtered from them in memory, and its
+participants are ranked among themselves. Teams are only in a group if
+their name is, since standings don't keep the members of teams.
+"""
+
+import copy
+
+from .cf_get import Participant
+from typing import AbstractSet, List, Optional
+
+def set_intra_ranks(participants):
+    # type: (List[Participant]) -> None
+    """
+    Rank participants among themselves, in the order of their Codeforces
+    ranks. Ties share a rank, and unranked participants (rank 0) get 0.
+    """
+    intra_rank = 0
+    previous = None # type: Optional[int]
+    for i, p in enumerate(participants):
+        if p.rank != previous:
+            intra_rank = i + 1
+            previous = p.rank
+        p.intra_rank = intra_rank if p.rank else 0
+
+def group_participants(participants, usernames):
+    # type: (List[Participant], AbstractSet[str]) -> List[Participant]
+    # Copies, since set_intra_ranks would otherwise change the ranks of
+    # standings shared with other boards.
+    return [copy.copy(p) for p in participants if p.username in usernames]
@@ -0,0 +1,113 @@
+"""
+The set of registered handles (usernames of User objects), kept in memory
+by each process so that leaderboard requests don't scan the auth table.
+
+The snapshot includes the members of each handle group (see main.groups).
+
+A version token in the shared cache changes whenever users or groups are
+saved or deleted, or group members change: the signals are connected in
+MainConfig.ready, and bulk writes, which don't send signals, call
+bump_version themselves. A process reloads its snapshot when the token
+differs from the one it loaded, or when the snapshot is older than
+HANDLE_SET_MAX_AGE (in case the cache isn't shared between processes).
+
+A snapshot's digest identifies the handle set in cache keys.
+"""
+
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import HandleGroup
+from .store import handles_hash
+from .timing import cache_lookup
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+VERSION_KEY = 'handles:version'
+
+class Group:
+    def __init__(self, slug, name, usernames):
+        # type: (str, str, FrozenSet[str]) -> None
+        self.slug = slug
+        self.name = name
+        self.usernames = usernames
+        self.digest = handles_hash(usernames)
+
+class HandleSet:
+    def __init__(self, version, usernames, groups=None):
+        # type: (str, Tuple[str, ...], Optional[Dict[str, Group]]) -> None
+        self.version = version
+        self.usernames = usernames
+        self.digest = handles_hash(usernames)
+        # Handle groups by slug.
+        self.groups = groups or {} # type: Dict[str, Group]
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.usernames)
+
+    def __iter__(self):
+        # type: () -> Any
+        return iter(self.usernames)
+
+_snapshot = None # type: Optional[HandleSet]
+_lock = threading.Lock()
+
+def current_version():
+    # type: () -> str
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Evicted or never set; any new token makes every process reload.
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+def bump_version():
+    # type: () -> None
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+def get_handle_set():
+    # type: () -> HandleSet
+    global _snapshot
+    version = current_version()
+    snapshot = _snapshot
+    if (snapshot is not None and snapshot.version == version
+            and time.time() - snapshot.loaded_at < settings.HANDLE_SET_MAX_AGE):
+        cache_lookup('handle_set', 'hit')
+        return snapshot
+    cache_lookup('handle_set', 'miss')
+    with _lock:
+        if _snapshot is not snapshot:
+            # Another thread has just reloaded it.
+            return _snapshot
+        usernames = tuple(sorted(User.objects.values_list('username', flat=True)))
+        _snapshot = HandleSet(version, usernames, load_groups())
+        return _snapshot
+
+def load_groups():
+    # type: () -> Dict[str, Group]
+    members = {} # type: Dict[int, set]
+    for group_id, username in HandleGroup.members.through.objects.values_list('handlegroup_id', 'user__username'):
+        members.setdefault(group_id, set()).add(username)
+    return {slug: Group(slug, name, frozenset(members.get(group_id, ()))) for group_id, slug, name
+        in HandleGroup.objects.values_list('id', 'slug', 'name')}
+
+def user_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    # type: (type, User, bool, Any, **Any) -> None
+    # Logins save last_login only; they don't change the handle set.
+    if created or update_fields is None or 'username' in update_fields:
+        # After commit, so that other processes can't reload the old set under the new version.
+        transaction.on_commit(bump_version)
+
+def group_changed(sender, **kwargs):
+    # type: (type, **Any) -> None
+    # Handles post_save and post_delete of HandleGroup, and m2m_changed of its members.
+    if kwargs.get('action', '').startswith('pre_'):
+        return
+    transaction.on_commit(bump_version)
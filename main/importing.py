@@ -0,0 +1,105 @@
+"""
+Registering many Codeforces handles at once.
+
+Handles are checked against user.info a chunk at a time. Users of each
+chunk are created and updated with one bulk_create and one bulk_update in
+a transaction, and the profile data which user.info returned is stored in
+the Handle table too, so new users' colors are known right away.
+"""
+
+import csv
+import io
+import re
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import cf_get
+from . import userinfo
+from .handles import bump_version
+from typing import Dict, Iterable, List, Optional
+
+CREATED = 'created'
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not found'
+FAILED = 'failed'
+UNCHECKED = 'unchecked'
+
+def parse_handles(text):
+    # type: (str) -> List[str]
+    """Split text on semicolons, commas and whitespace, dropping duplicates."""
+    handles = [] # type: List[str]
+    seen = set()
+    for handle in re.split(r'[;,\s]+', text):
+        if handle and handle.lower() not in seen:
+            seen.add(handle.lower())
+            handles.append(handle)
+    return handles
+
+def parse_csv(text):
+    # type: (str) -> List[str]
+    """Read handles from the first column of CSV text, skipping a header row."""
+    rows = [row[0].strip() for row in csv.reader(io.StringIO(text)) if row and row[0].strip()]
+    if rows and rows[0].lower() in ('handle', 'username'):
+        rows = rows[1:]
+    return parse_handles(' '.join(rows))
+
+def save_users(cf_users):
+    # type: (List[cf_get.CfUser]) -> Dict[str, str]
+    outcomes = {} # type: Dict[str, str]
+    existing = User.objects.filter(username__in=[u.username for u in cf_users])
+    existing_by_name = {user.username: user for user in existing}
+    new_users = [] # type: List[User]
+    changed_users = [] # type: List[User]
+    for cf_user in cf_users:
+        user = existing_by_name.get(cf_user.username)
+        if user is None:
+            # Like create_user without a password, which is what the add users form did.
+            new_users.append(User(username=cf_user.username, first_name=cf_user.first_name,
+                last_name=cf_user.last_name, password=make_password(None)))
+            outcomes[cf_user.username] = CREATED
+        elif (user.first_name, user.last_name) != (cf_user.first_name, cf_user.last_name):
+            user.first_name = cf_user.first_name
+            user.last_name = cf_user.last_name
+            changed_users.append(user)
+            outcomes[cf_user.username] = UPDATED
+        else:
+            outcomes[cf_user.username] = UNCHANGED
+    User.objects.bulk_create(new_users)
+    User.objects.bulk_update(changed_users, ['first_name', 'last_name'])
+    return outcomes
+
+def import_handles(handles, priority=cf_get.PRIORITY_INTERACTIVE, max_calls=None):
+    # type: (Iterable[str], int, Optional[int]) -> Dict[str, str]
+    """
+    Register handles as users. Returns the outcome for each handle, keyed on
+    the handle as Codeforces spells it if it was found. With max_calls, at most
+    that many API calls are made, and the handles left are UNCHECKED.
+    """
+    outcomes = {} # type: Dict[str, str]
+    calls_left = max_calls
+    for chunk in cf_get.chunked(list(handles), settings.CF_API_HANDLES_PER_REQUEST):
+        if calls_left is not None and calls_left <= 0:
+            outcomes.update((handle, UNCHECKED) for handle in chunk)
+            continue
+        try:
+            cf_users, invalid, unchecked = userinfo.fetch_user_info(chunk, priority, calls_left)
+        except (cf_get.CfApiError,) + cf_get.network_errors():
+            outcomes.update((handle, FAILED) for handle in chunk)
+            if calls_left is not None:
+                calls_left -= 1
+            continue
+        if calls_left is not None:
+            # One call failed for each handle which doesn't exist, and one succeeded unless the calls ran out.
+            calls_left -= len(invalid) + (0 if unchecked else 1)
+        with transaction.atomic():
+            outcomes.update(save_users(cf_users))
+            userinfo.save_user_info(cf_users)
+            # Bulk writes don't send the signals which keep handle sets up to date.
+            transaction.on_commit(bump_version)
+        outcomes.update((handle, NOT_FOUND) for handle in invalid)
+        outcomes.update((handle, UNCHECKED) for handle in unchecked)
+    return outcomes
@@ -0,0 +1,420 @@
+"""
+Live leaderboards over Server-Sent Events.
+
+Each process runs at most one poller thread per leaderboard which has
+viewers. A poller refreshes standings as often as the cache TTL of the
+contest's phase allows, compares them with its last snapshot and sends
+only the changes to its subscribers. So upstream load depends on the
+number of watched contests, not on the number of viewers. Pollers in
+different processes share the standings cache, and their fetches are
+coalesced like any others.
+
+Leaderboards of groups have pollers of their own, but they refresh the
+standings of all registered handles, like the pages of groups do.
+
+A new subscriber first gets a "snapshot" event (the board in the encoding
+of main.api), then "diff" events:
+
+    {"contest": {...},            # only if the contest's name or phase changed
+     "rows": [...],               # new participants and participants which changed
+     "removed": [[username, type], ...],
+     "order": [[username, type], ...]}   # only if the order of rows changed
+
+Each item in "rows" has "key" ([username, type]) and the fields which
+changed among rank, points, is_team and color. Its "attempts" maps
+problem positions to [points, rejects, time] of the attempts which changed.
+
+If standings can't be fetched (e.g. the contest doesn't exist), subscribers
+get an "error" event, {"comment": ...}, and their streams end.
+
+Under WSGI, each stream holds a server thread for as long as it is open, so
+at most LIVE_MAX_STREAMS streams are served per process; further viewers
+get a 204, which tells EventSource not to reconnect, and poll the JSON API
+instead (see static/live.js). Under ASGI, project_conf/asgi.py serves
+streams with asgi_app, as coroutines which wait on an asyncio queue, so
+they hold no thread.
+"""
+
+import json
+import queue
+import asyncio
+import logging
+import threading
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import Http404
+from django.urls import Resolver404, resolve
+
+from . import api
+from .caching import get_fresh_standings_entry, ttl_for_phase
+from .cf_get import CfApiError, Participant
+from .groups import group_participants, set_intra_ranks
+from .handles import get_handle_set
+from .userinfo import apply_colors
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str]
+Row = Dict[str, Any]
+
+def participant_row(p):
+    # type: (Participant) -> Row
+    return {
+        'rank': p.rank,
+        'points': api.num(p.points),
+        'is_team': int(p.is_team),
+        'color': p.color,
+        'attempts': [[api.num(a.points), a.rejects, int(a.time.total_seconds())] for a in p.attempts],
+    }
+
+def diff_rows(old, new):
+    # type: (Optional[Row], Row) -> Optional[Row]
+    if old == new:
+        return None
+    changed = {k: v for k, v in new.items() if k != 'attempts' and (old is None or old[k] != v)}
+    old_attempts = old['attempts'] if old is not None else []
+    attempts = {}
+    for i, attempt in enumerate(new['attempts']):
+        if i >= len(old_attempts) or old_attempts[i] != attempt:
+            attempts[str(i)] = attempt
+    if attempts:
+        changed['attempts'] = attempts
+    return changed
+
+class Snapshot:
+    def __init__(self, contest_id, contest, problems, participants):
+        # type: (int, Any, List[Any], List[Participant]) -> None
+        self.board = api.encode_standings(contest_id, contest, problems, participants)
+        self.contest = self.board['contest']
+        self.order = [(p.username, p.type) for p in participants] # type: List[Key]
+        self.rows = {(p.username, p.type): participant_row(p) for p in participants} # type: Dict[Key, Row]
+
+    def diff(self, old):
+        # type: (Snapshot) -> Dict[str, Any]
+        result = {} # type: Dict[str, Any]
+        if self.contest != old.contest:
+            result['contest'] = self.contest
+        rows = []
+        for key in self.order:
+            changed = diff_rows(old.rows.get(key), self.rows[key])
+            if changed:
+                changed['key'] = list(key)
+                rows.append(changed)
+        if rows:
+            result['rows'] = rows
+        removed = [list(key) for key in old.order if key not in self.rows]
+        if removed:
+            result['removed'] = removed
+        if self.order != old.order:
+            result['order'] = [list(key) for key in self.order]
+        return result
+
+def event(name, seq, data):
+    # type: (str, int, Any) -> bytes
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(seq, name, json.dumps(data,
+        separators=(',', ':'), ensure_ascii=False)).encode('utf-8')
+
+class Subscription:
+    def __init__(self):
+        # type: () -> None
+        self.queue = queue.Queue(settings.LIVE_QUEUE_SIZE) # type: queue.Queue
+        # Set when the subscriber is dropped for falling behind, or after an error.
+        self.closed = False
+
+    def offer(self, message):
+        # type: (bytes) -> bool
+        """Queue a message without blocking. Returns False if the queue is full."""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self):
+        # type: () -> None
+        self.closed = True
+
+class AsyncSubscription(Subscription):
+    """A subscription read by a coroutine on loop; pollers offer messages from their threads."""
+
+    def __init__(self, loop):
+        # type: (asyncio.AbstractEventLoop) -> None
+        self.loop = loop
+        self.queue = asyncio.Queue(settings.LIVE_QUEUE_SIZE) # type: asyncio.Queue
+        self.closed = False
+
+    def offer(self, message):
+        # type: (bytes) -> bool
+        # qsize() is only approximate from another thread; _put checks again.
+        if self.queue.qsize() >= settings.LIVE_QUEUE_SIZE:
+            return False
+        self.loop.call_soon_threadsafe(self._put, message)
+        return True
+
+    def _put(self, message):
+        # type: (Optional[bytes]) -> None
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.closed = True
+
+    def close(self):
+        # type: () -> None
+        self.closed = True
+        # Wakes up the reader, which then sees that it is closed.
+        self.loop.call_soon_threadsafe(self._put, None)
+
+PollerKey = Tuple[int, bool, Optional[str]]
+
+class Poller:
+    def __init__(self, contest_id, show_unofficial, group=None):
+        # type: (int, bool, Optional[str]) -> None
+        self.contest_id = contest_id
+        self.show_unofficial = show_unofficial
+        self.group = group
+        self.lock = threading.Lock()
+        self.subscriptions = set() # type: Set[Subscription]
+        self.snapshot = None # type: Optional[Snapshot]
+        self.seq = 0
+        self.idle_since = time.time()
+
+    def subscribe(self, sub):
+        # type: (Subscription) -> None
+        with self.lock:
+            self.subscriptions.add(sub)
+            if self.snapshot is not None:
+                sub.offer(event('snapshot', self.seq, self.snapshot.board))
+
+    def unsubscribe(self, sub):
+        # type: (Subscription) -> None
+        with self.lock:
+            self.subscriptions.discard(sub)
+            if not self.subscriptions:
+                self.idle_since = time.time()
+
+    def publish(self, snapshot):
+        # type: (Snapshot) -> None
+        with self.lock:
+            old, self.snapshot = self.snapshot, snapshot
+            changes = snapshot.diff(old) if old is not None else None
+            if changes == {}:
+                return
+            self.seq += 1
+            if changes is None:
+                message = event('snapshot', self.seq, snapshot.board)
+            else:
+                message = event('diff', self.seq, changes)
+            for sub in list(self.subscriptions):
+                if not sub.offer(message):
+                    # It will reconnect and start again from a snapshot.
+                    sub.close()
+                    self.subscriptions.discard(sub)
+
+    def fail(self, comment):
+        # type: (str) -> None
+        """Send an error event to every subscriber and end their streams."""
+        with self.lock:
+            self.seq += 1
+            # Whoever subscribes next starts from a fresh snapshot.
+            self.snapshot = None
+            message = event('error', self.seq, {'comment': comment})
+            for sub in self.subscriptions:
+                sub.offer(message)
+                sub.close()
+            self.subscriptions.clear()
+            self.idle_since = time.time()
+
+    def poll(self):
+        # type: () -> int
+        """Refresh standings and publish changes. Returns seconds until the next poll."""
+        handle_set = get_handle_set()
+        entry = get_fresh_standings_entry(self.contest_id, handle_set.usernames, self.show_unofficial,
+            handles_digest=handle_set.digest)
+        contest, problems, participants = entry['value']
+        if self.group is not None:
+            group = handle_set.groups.get(self.group)
+            # A deleted group has an empty board.
+            participants = group_participants(participants, group.usernames if group else frozenset())
+        set_intra_ranks(participants)
+        apply_colors(participants)
+        self.publish(Snapshot(self.contest_id, contest, problems, participants))
+        return ttl_for_phase(contest.phase)
+
+    def idle(self):
+        # type: () -> bool
+        with self.lock:
+            return not self.subscriptions and time.time() - self.idle_since > settings.LIVE_IDLE_TIMEOUT
+
+    def run(self):
+        # type: () -> None
+        while True:
+            with _pollers_lock:
+                if self.idle():
+                    del _pollers[(self.contest_id, self.show_unofficial, self.group)]
+                    return
+            try:
+                interval = self.poll()
+            except Exception as e:
+                logger.warning('Live poll of contest %d failed', self.contest_id, exc_info=True)
+                self.fail(e.comment if isinstance(e, CfApiError) else 'Could not refresh the standings')
+                interval = settings.CF_STANDINGS_TTL_DEFAULT
+            finally:
+                connection.close()
+            # Wake up at least every LIVE_IDLE_TIMEOUT to see if anyone is still watching.
+            time.sleep(min(interval, settings.LIVE_IDLE_TIMEOUT))
+
+_pollers = {} # type: Dict[PollerKey, Poller]
+_pollers_lock = threading.Lock()
+
+_streams = 0
+_streams_lock = threading.Lock()
+
+def subscribe(contest_id, show_unofficial, group, sub):
+    # type: (int, bool, Optional[str], Subscription) -> Poller
+    key = (contest_id, show_unofficial, group)
+    with _pollers_lock:
+        poller = _pollers.get(key)
+        if poller is None:
+            poller = _pollers[key] = Poller(contest_id, show_unofficial, group)
+            threading.Thread(target=poller.run, daemon=True).start()
+        poller.subscribe(sub)
+        return poller
+
+def acquire_stream():
+    # type: () -> bool
+    """Reserve a thread for a stream; False if LIVE_MAX_STREAMS are open. See ThreadedStream."""
+    global _streams
+    with _streams_lock:
+        if _streams >= settings.LIVE_MAX_STREAMS:
+            return False
+        _streams += 1
+        return True
+
+def release_stream():
+    # type: () -> None
+    global _streams
+    with _streams_lock:
+        _streams -= 1
+
+def retry_field():
+    # type: () -> bytes
+    # Tells EventSource how long to wait before reconnecting, in milliseconds.
+    return 'retry: {}\n\n'.format(settings.LIVE_RETRY * 1000).encode('utf-8')
+
+def stream(contest_id, show_unofficial, group=None):
+    # type: (int, bool, Optional[str]) -> Iterator[bytes]
+    """Yield Server-Sent Events of a leaderboard until the client goes away."""
+    sub = Subscription()
+    poller = subscribe(contest_id, show_unofficial, group, sub)
+    try:
+        yield retry_field()
+        while not sub.closed or not sub.queue.empty():
+            try:
+                yield sub.queue.get(timeout=settings.LIVE_HEARTBEAT)
+            except queue.Empty:
+                # Comments keep proxies from timing out the connection,
+                # and let the server find out when the client has left.
+                yield b': ping\n\n'
+    finally:
+        poller.unsubscribe(sub)
+
+class ThreadedStream:
+    """
+    The events of stream(), for a streaming response. It holds a slot taken
+    with acquire_stream() until the response is closed, which WSGI servers
+    do even if the stream was never started.
+    """
+
+    def __init__(self, contest_id, show_unofficial, group=None):
+        # type: (int, bool, Optional[str]) -> None
+        self.events = stream(contest_id, show_unofficial, group)
+        self.released = False
+
+    def __iter__(self):
+        # type: () -> Iterator[bytes]
+        return self.events
+
+    def close(self):
+        # type: () -> None
+        self.events.close()
+        if not self.released:
+            self.released = True
+            release_stream()
+
+async def stream_async(sub):
+    # type: (AsyncSubscription) -> AsyncIterator[bytes]
+    """Like stream(), for ASGI servers; waiting for events holds no thread. Ends when sub is closed."""
+    yield retry_field()
+    while not (sub.closed and sub.queue.empty()):
+        try:
+            message = await asyncio.wait_for(sub.queue.get(), settings.LIVE_HEARTBEAT)
+        except asyncio.TimeoutError:
+            message = b': ping\n\n'
+        if message is None:
+            return
+        yield message
+
+STREAM_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    # Stops nginx-like proxies from buffering events.
+    (b'x-accel-buffering', b'no'),
+]
+
+def asgi_app(application):
+    # type: (Callable) -> Callable
+    """
+    Wrap a Django ASGI application so that live streams are served by
+    stream_async. Django 3.2 can only stream responses from synchronous
+    iterators, which would block the event loop.
+    """
+    from . import views
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'http':
+            try:
+                match = resolve(scope['path'])
+            except Resolver404:
+                match = None
+            if match is not None and match.func is views.ldrbrd_live:
+                return await serve_stream(scope, receive, send, match.kwargs)
+        return await application(scope, receive, send)
+    return app
+
+async def serve_stream(scope, receive, send, kwargs):
+    # type: (Dict[str, Any], Callable, Callable, Dict[str, Any]) -> None
+    from .views import parse_ldrbrd_args
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    try:
+        contest_id, show_unofficial, group = parse_ldrbrd_args(
+            {key: values[-1] for key, values in query.items()}, kwargs['contest_id'], kwargs.get('group'))
+        if group is not None and group not in (await sync_to_async(get_handle_set)()).groups:
+            raise Http404('No such group')
+    except Http404 as e:
+        await send({'type': 'http.response.start', 'status': 404,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': str(e).encode('utf-8')})
+        return
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': STREAM_HEADERS})
+    sub = AsyncSubscription(asyncio.get_running_loop())
+    poller = subscribe(contest_id, show_unofficial, group, sub)
+    disconnected = asyncio.ensure_future(_close_on_disconnect(receive, sub))
+    try:
+        async for body in stream_async(sub):
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        poller.unsubscribe(sub)
+
+async def _close_on_disconnect(receive, sub):
+    # type: (Callable, AsyncSubscription) -> None
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    sub.close()
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from main import cf_get
+from main import store
+from main.handles import get_handle_set
+
+class Command(BaseCommand):
+    help = 'Fetch and store standings of a range of contests for all registered users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('first', type=int, help='First contest ID')
+        parser.add_argument('last', type=int, help='Last contest ID (inclusive)')
+        parser.add_argument('--show-unofficial', action='store_true',
+            help='Store standings including unofficial participants')
+
+    def handle(self, *args, **options):
+        handle_set = get_handle_set()
+        usernames = handle_set.usernames
+        digest = handle_set.digest
+        show_unofficial = options['show_unofficial']
+
+        for contest_id in range(options['first'], options['last'] + 1):
+            if store.get_stored(contest_id, show_unofficial, digest) is not None:
+                self.stdout.write('{}: already stored'.format(contest_id))
+                continue
+            try:
+                standings = cf_get.get_contest_info(contest_id, usernames, show_unofficial,
+                    cf_get.PRIORITY_BACKGROUND, fetch_colors=False)
+            except cf_get.CfApiError as e:
+                self.stderr.write('{}: {}'.format(contest_id, e.comment))
+                continue
+            counts = store.save_standings(contest_id, show_unofficial, digest, standings)
+            self.stdout.write('{}: {} ({created} created, {updated} updated, {deleted} deleted)'.format(
+                contest_id, standings[0].phase, **counts))
@@ -0,0 +1,16 @@
+import argparse
+
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = ('Benchmark the leaderboard request path against synthetic standings from a local stub '
+        'API, on a throwaway test database. The same as devel/bench_ldrbrd.py.')
+
+    def add_arguments(self, parser):
+        # devel isn't needed to serve requests, so it is only imported by this command.
+        from devel import bench_ldrbrd
+        bench_ldrbrd.add_arguments(parser)
+
+    def handle(self, *args, **options):
+        from devel.bench_ldrbrd import Bench
+        Bench(argparse.Namespace(**options)).run()
@@ -0,0 +1,75 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import exporting
+from main import importing
+from main.handles import get_handle_set
+
+class Command(BaseCommand):
+    help = ('Export standings of many contests to CSV, JSON Lines or Parquet, one row per participant '
+        'and problem. Contests are fetched in parallel under the shared API rate limit, and an '
+        'interrupted export resumes from its checkpoint file when run again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('contests', nargs='+',
+            help='Contest IDs and ranges, like 1500 1510-1520 or 1500,1502')
+        parser.add_argument('-o', '--output', required=True,
+            help='Output file, or directory for Parquet')
+        parser.add_argument('--format', choices=exporting.FORMATS,
+            help='Output format (default: from the extension of the output file, else CSV)')
+        parser.add_argument('--handles-file', action='append', default=[],
+            help='File with handles separated by whitespace, commas or semicolons, or a CSV file '
+                '(*.csv) with a handle in the first column; "-" reads standard input. '
+                'Can be repeated. Default: all registered users.')
+        parser.add_argument('--show-unofficial', action='store_true',
+            help='Include unofficial participants')
+        parser.add_argument('--parallel', type=int, default=4, help='Contests fetched at once')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: the output path + .checkpoint)')
+        parser.add_argument('--retry-failed', action='store_true',
+            help='Fetch contests which failed in an earlier run again')
+
+    def handle(self, *args, **options):
+        try:
+            contest_ids = exporting.parse_ranges(options['contests'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['parallel'] < 1:
+            raise CommandError('--parallel must be at least 1.')
+        output = options['output']
+        output_format = options['format'] or exporting.format_for(output)
+        checkpoint = options['checkpoint'] or output.rstrip('/') + '.checkpoint'
+
+        if options['handles_file']:
+            usernames = []
+            for path in options['handles_file']:
+                try:
+                    if path == '-':
+                        text = sys.stdin.read()
+                    else:
+                        with open(path, encoding='utf-8-sig') as f:
+                            text = f.read()
+                except OSError as e:
+                    raise CommandError(str(e))
+                usernames.extend(importing.parse_csv(text) if path.endswith('.csv')
+                    else importing.parse_handles(text))
+            usernames = importing.parse_handles(' '.join(usernames))
+            # Standings for other handles than the registered ones aren't stored.
+            fetch = exporting.fetcher(usernames, options['show_unofficial'], use_store=False)
+        else:
+            usernames = get_handle_set().usernames
+            fetch = exporting.fetcher(usernames, options['show_unofficial'], use_store=True)
+        if not usernames:
+            raise CommandError('No handles to export.')
+
+        def report(contest_id, message):
+            self.stderr.write('{}: {}'.format(contest_id, message))
+
+        try:
+            result = exporting.export(contest_ids, fetch, output, output_format, checkpoint,
+                options['parallel'], options['retry_failed'], report)
+        except ValueError as e:
+            raise CommandError(str(e))
+        except KeyboardInterrupt:
+            raise CommandError('Interrupted; run the same command again to resume.')
+        self.stderr.write('{} contests exported, {} failed'.format(len(result.done), len(result.failed)))
@@ -0,0 +1,38 @@
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import cf_get
+from main import importing
+
+class Command(BaseCommand):
+    help = 'Register Codeforces handles as users, from files or the command line.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*',
+            help='Files with handles separated by whitespace, commas or semicolons, '
+                'or CSV files (*.csv) with a handle in the first column. "-" reads standard input.')
+        parser.add_argument('--handles', default='', help='Handles to import')
+
+    def handle(self, *args, **options):
+        handles = importing.parse_handles(options['handles'])
+        for path in options['files']:
+            try:
+                if path == '-':
+                    text = sys.stdin.read()
+                else:
+                    with open(path, encoding='utf-8-sig') as f:
+                        text = f.read()
+            except OSError as e:
+                raise CommandError(str(e))
+            handles.extend(importing.parse_csv(text) if path.endswith('.csv') else importing.parse_handles(text))
+        handles = importing.parse_handles(' '.join(handles))
+        if not handles:
+            raise CommandError('No handles given.')
+
+        outcomes = importing.import_handles(handles, cf_get.PRIORITY_BACKGROUND)
+        for handle, outcome in outcomes.items():
+            self.stdout.write('{}\t{}'.format(handle, outcome))
+        counts = Counter(outcomes.values())
+        self.stderr.write(', '.join('{} {}'.format(n, outcome) for outcome, n in sorted(counts.items())))
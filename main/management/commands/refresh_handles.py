@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from main import userinfo
+from main.handles import get_handle_set
+
+class Command(BaseCommand):
+    help = 'Refresh ratings and colors of registered handles from Codeforces.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+            help='Refresh all handles, not only those older than CF_HANDLE_INFO_MAX_AGE')
+
+    def handle(self, *args, **options):
+        usernames = set(get_handle_set())
+        if not options['all']:
+            usernames = userinfo.stale_handles(usernames)
+        invalid = userinfo.refresh_handles(usernames)
+        self.stdout.write('Refreshed {} handles.'.format(len(usernames) - len(invalid)))
+        if invalid:
+            self.stderr.write('Handles not found: {}'.format(', '.join(invalid)))
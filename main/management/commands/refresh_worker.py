@@ -0,0 +1,32 @@
+import logging
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.worker import RefreshWorker, check_cache_shared
+
+class Command(BaseCommand):
+    help = 'Keep standings and handle caches warm by refreshing them in the background.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int,
+            help='Number of refresh threads (default: WORKER_THREADS)')
+        parser.add_argument('--same-machine', action='store_true',
+            help='Web processes run on this machine, so a file-based cache is shared with them')
+
+    def handle(self, *args, **options):
+        problem = check_cache_shared(options['same_machine'])
+        if problem is not None:
+            # Refreshes would only warm a cache no web process reads, at the cost of API calls.
+            raise CommandError('The cache must be shared with web processes, but {}. '
+                'Use the database cache (see CACHE_TABLE) or memcached.'.format(problem))
+        level = logging.INFO if options['verbosity'] >= 1 else logging.WARNING
+        logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s %(message)s', level=level)
+        logging.getLogger('main').setLevel(level)
+        worker = RefreshWorker(options['threads'])
+        # Heroku sends SIGTERM on shutdown; let running refreshes finish.
+        signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            worker.stop()
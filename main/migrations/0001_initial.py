@@ -0,0 +1,80 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:54
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Contest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contest_id', models.IntegerField()),
+                ('show_unofficial', models.BooleanField()),
+                ('name', models.CharField(max_length=255)),
+                ('phase', models.CharField(max_length=32)),
+                ('type', models.CharField(max_length=16)),
+                ('handles_hash', models.CharField(max_length=40)),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'unique_together': {('contest_id', 'show_unofficial')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Participant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('username', models.CharField(max_length=255)),
+                ('type', models.CharField(max_length=32)),
+                ('rank', models.IntegerField()),
+                ('points', models.FloatField()),
+                ('color', models.CharField(blank=True, max_length=16)),
+                ('is_team', models.BooleanField()),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='main.contest')),
+            ],
+            options={
+                'ordering': ['position'],
+                'unique_together': {('contest', 'username', 'type')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Problem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('index', models.CharField(max_length=8)),
+                ('name', models.CharField(max_length=255)),
+                ('points', models.FloatField()),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='problems', to='main.contest')),
+            ],
+            options={
+                'ordering': ['position'],
+                'unique_together': {('contest', 'position')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Attempt',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('points', models.FloatField()),
+                ('rejects', models.IntegerField()),
+                ('time', models.DurationField(default=datetime.timedelta(0))),
+                ('participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='main.participant')),
+            ],
+            options={
+                'ordering': ['position'],
+                'unique_together': {('participant', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Handle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=255, unique=True)),
+                ('first_name', models.CharField(blank=True, max_length=255)),
+                ('last_name', models.CharField(blank=True, max_length=255)),
+                ('rating', models.IntegerField(default=0)),
+                ('rank', models.CharField(blank=True, max_length=32)),
+                ('color', models.CharField(blank=True, max_length=16)),
+                ('updated_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='participant',
+            name='color',
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_contest_scores(apps, schema_editor):
+    # Scores of standings stored before seasons existed. Only official standings
+    # count, as in seasons.ingest_contest.
+    Contest = apps.get_model('main', 'Contest')
+    ContestScore = apps.get_model('main', 'ContestScore')
+    for contest in Contest.objects.filter(show_unofficial=False):
+        rows = contest.participants.filter(type='CONTESTANT', is_team=False)
+        ContestScore.objects.bulk_create([ContestScore(contest_id=contest.contest_id,
+            username=p.username, points=p.points, rank=p.rank) for p in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_handle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Season',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SeasonScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=255)),
+                ('points', models.FloatField(default=0)),
+                ('contests', models.IntegerField(default=0)),
+                ('season', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scores', to='main.season')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SeasonContest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contest_id', models.IntegerField()),
+                ('season', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contests', to='main.season')),
+            ],
+            options={
+                'ordering': ['contest_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ContestScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contest_id', models.IntegerField(db_index=True)),
+                ('username', models.CharField(max_length=255)),
+                ('points', models.FloatField()),
+                ('rank', models.IntegerField()),
+            ],
+            options={
+                'unique_together': {('contest_id', 'username')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='seasonscore',
+            index=models.Index(fields=['season', '-points'], name='main_season_season__55eabc_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='seasonscore',
+            unique_together={('season', 'username')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='seasoncontest',
+            unique_together={('season', 'contest_id')},
+        ),
+        migrations.RunPython(fill_contest_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0003_season'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HandleGroup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('members', models.ManyToManyField(blank=True, related_name='handle_groups', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
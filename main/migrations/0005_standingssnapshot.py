@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_handlegroup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StandingsSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('is_checkpoint', models.BooleanField()),
+                ('data', models.BinaryField()),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='main.contest')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='standingssnapshot',
+            index=models.Index(fields=['contest', 'taken_at'], name='main_standi_contest_3138cf_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_standingssnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contest',
+            name='phase',
+            field=models.CharField(db_index=True, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='seasoncontest',
+            name='contest_id',
+            field=models.IntegerField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['contest', 'position'], name='main_partic_contest_70f552_idx'),
+        ),
+    ]
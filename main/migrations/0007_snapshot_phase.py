@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='standingssnapshot',
+            name='phase',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_snapshot_phase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='duration',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='contest',
+            name='start_time',
+            field=models.IntegerField(null=True),
+        ),
+    ]
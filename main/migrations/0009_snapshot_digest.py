@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_contest_times'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='standingssnapshot',
+            name='digest',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+    ]
@@ -0,0 +1,196 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+
+from . import cf_get
+from typing import Iterable
+
+class Contest(models.Model):
+    # Standings of a contest are stored separately with and without
+    # unofficial participants, since Codeforces ranks them differently.
+    contest_id = models.IntegerField()
+    show_unofficial = models.BooleanField()
+    name = models.CharField(max_length=255)
+    # Indexed for the background refresher, which looks for unfinished contests.
+    phase = models.CharField(max_length=32, db_index=True)
+    type = models.CharField(max_length=16)
+    # Unix times in seconds, like the API's; None if Codeforces left them out.
+    start_time = models.IntegerField(null=True)
+    duration = models.IntegerField(null=True)
+    # Hash of the handle set these standings were fetched for.
+    handles_hash = models.CharField(max_length=40)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = [('contest_id', 'show_unofficial')]
+
+    def __str__(self):
+        return '{} ({})'.format(self.contest_id, self.name)
+
+    def to_cf(self):
+        # type: () -> cf_get.Contest
+        return cf_get.Contest({'id': self.contest_id, 'name': self.name, 'phase': self.phase,
+            'type': self.type, 'startTimeSeconds': self.start_time, 'durationSeconds': self.duration})
+
+class Problem(models.Model):
+    contest = models.ForeignKey(Contest, on_delete=models.CASCADE, related_name='problems')
+    position = models.IntegerField()
+    index = models.CharField(max_length=8)
+    name = models.CharField(max_length=255)
+    points = models.FloatField()
+
+    class Meta:
+        unique_together = [('contest', 'position')]
+        ordering = ['position']
+
+    def to_cf(self):
+        # type: () -> cf_get.Problem
+        return cf_get.Problem({'name': self.name, 'index': self.index, 'points': self.points})
+
+class Participant(models.Model):
+    contest = models.ForeignKey(Contest, on_delete=models.CASCADE, related_name='participants')
+    # Position of this row in the standings returned by Codeforces.
+    position = models.IntegerField()
+    username = models.CharField(max_length=255)
+    type = models.CharField(max_length=32)
+    rank = models.IntegerField()
+    points = models.FloatField()
+    is_team = models.BooleanField()
+
+    class Meta:
+        unique_together = [('contest', 'username', 'type')]
+        # Standings are read in this order.
+        indexes = [models.Index(fields=['contest', 'position'])]
+        ordering = ['position']
+
+    def __str__(self):
+        return '{} in {}'.format(self.username, self.contest_id)
+
+    def to_cf(self, attempts):
+        # type: (Iterable[Attempt]) -> cf_get.Participant
+        if self.is_team:
+            party = {'teamName': self.username, 'members': [], 'participantType': self.type}
+        else:
+            party = {'members': [{'handle': self.username}], 'participantType': self.type}
+        participant = cf_get.Participant({
+            'party': party,
+            'rank': self.rank,
+            'points': self.points,
+            'problemResults': [],
+        })
+        participant.attempts = [attempt.to_cf() for attempt in attempts]
+        return participant
+
+class StandingsSnapshot(models.Model):
+    # Standings of a running contest at one time, compressed (see main.snapshots).
+    contest = models.ForeignKey(Contest, on_delete=models.CASCADE, related_name='snapshots')
+    taken_at = models.DateTimeField()
+    # A checkpoint holds the whole state; other snapshots hold the changes
+    # since the previous one.
+    is_checkpoint = models.BooleanField()
+    data = models.BinaryField()
+    # Phase of the contest in this snapshot's state, so that it can be read
+    # without decoding the chain. Empty for snapshots recorded before it was added.
+    phase = models.CharField(max_length=32, blank=True)
+    # snapshots.standings_digest of the standings, so that unchanged standings are
+    # found without decoding the chain. Empty for snapshots recorded before it was added.
+    digest = models.CharField(max_length=40, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['contest', 'taken_at'])]
+
+    def __str__(self):
+        return '{} at {}'.format(self.contest_id, self.taken_at)
+
+class Handle(models.Model):
+    # Codeforces profile data of a handle, used to color usernames on leaderboards.
+    username = models.CharField(max_length=255, unique=True)
+    first_name = models.CharField(max_length=255, blank=True)
+    last_name = models.CharField(max_length=255, blank=True)
+    rating = models.IntegerField(default=0)
+    rank = models.CharField(max_length=32, blank=True)
+    color = models.CharField(max_length=16, blank=True)
+    # None if this handle has never been looked up.
+    updated_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return self.username
+
+class HandleGroup(models.Model):
+    # A club or class with its own leaderboards, of some of the registered users.
+    # Their standings are filtered from those of all registered users (see main.groups).
+    slug = models.SlugField(unique=True)
+    name = models.CharField(max_length=255)
+    members = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='handle_groups', blank=True)
+
+    def __str__(self):
+        return self.name
+
+class Attempt(models.Model):
+    participant = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name='attempts')
+    # Position of the problem in the contest.
+    position = models.IntegerField()
+    points = models.FloatField()
+    rejects = models.IntegerField()
+    time = models.DurationField(default=timedelta(0))
+
+    class Meta:
+        unique_together = [('participant', 'position')]
+        ordering = ['position']
+
+    def to_cf(self):
+        # type: () -> cf_get.Attempt
+        return cf_get.Attempt({
+            'points': self.points,
+            'rejectedAttemptCount': self.rejects,
+            'bestSubmissionTimeSeconds': self.time.total_seconds(),
+        })
+
+class Season(models.Model):
+    # A series of contests with a combined ranking of registered users.
+    slug = models.SlugField(unique=True)
+    name = models.CharField(max_length=255)
+
+    def __str__(self):
+        return self.name
+
+class SeasonContest(models.Model):
+    season = models.ForeignKey(Season, on_delete=models.CASCADE, related_name='contests')
+    # Indexed to find the seasons of a contest whenever its standings are stored.
+    contest_id = models.IntegerField(db_index=True)
+
+    class Meta:
+        unique_together = [('season', 'contest_id')]
+        ordering = ['contest_id']
+
+    def __str__(self):
+        return '{} in {}'.format(self.contest_id, self.season.slug)
+
+class ContestScore(models.Model):
+    # Points of a registered user who took part in a contest as a contestant.
+    # Season totals are sums of these, see main.seasons.
+    contest_id = models.IntegerField(db_index=True)
+    username = models.CharField(max_length=255)
+    points = models.FloatField()
+    rank = models.IntegerField()
+
+    class Meta:
+        unique_together = [('contest_id', 'username')]
+
+    def __str__(self):
+        return '{} in {}'.format(self.username, self.contest_id)
+
+class SeasonScore(models.Model):
+    season = models.ForeignKey(Season, on_delete=models.CASCADE, related_name='scores')
+    username = models.CharField(max_length=255)
+    points = models.FloatField(default=0)
+    # Number of the season's contests this user took part in.
+    contests = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [('season', 'username')]
+        indexes = [models.Index(fields=['season', '-points'])]
+
+    def __str__(self):
+        return '{} in {}'.format(self.username, self.season.slug)
@@ -0,0 +1,95 @@
+"""
+A token-bucket rate limiter for Codeforces API calls.
+
+The bucket can be kept in a state file guarded by flock(), so that all
+worker processes on a machine share one budget. Within a process, waiting
+callers are served in priority order, so interactive page views go ahead of
+background refresh jobs.
+"""
+
+import os
+import time
+import heapq
+import itertools
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # type: ignore
+
+from typing import List, Optional, Tuple
+
+class RateLimiter:
+    def __init__(self, rate, capacity, state_file=None):
+        # type: (float, float, Optional[str]) -> None
+        """
+        rate - tokens added per second.
+        capacity - maximum number of tokens, i.e. the largest allowed burst.
+        state_file - if given, the bucket is shared by every process using this file.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.state_file = state_file if fcntl is not None else None
+        self._tokens = capacity
+        self._stamp = time.time()
+        self._cond = threading.Condition()
+        self._waiters = [] # type: List[Tuple[int, int]]
+        self._seq = itertools.count()
+
+    def acquire(self, priority=0):
+        # type: (int) -> float
+        """
+        Block until a token is available and take it.
+        Lower priority values are served first. Returns the time spent waiting.
+        """
+        start = time.time()
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    timeout = None # type: Optional[float]
+                    if self._waiters[0] == ticket:
+                        timeout = self._take()
+                        if timeout <= 0:
+                            return time.time() - start
+                    self._cond.wait(timeout)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def _refill(self, tokens, stamp, now):
+        # type: (float, float, float) -> Tuple[float, float]
+        # Returns (tokens left, seconds to wait); waiting 0 means a token was taken.
+        tokens = min(self.capacity, tokens + max(0.0, now - stamp) * self.rate)
+        if tokens >= 1:
+            return (tokens - 1, 0.0)
+        return (tokens, (1 - tokens) / self.rate)
+
+    def _take(self):
+        # type: () -> float
+        now = time.time()
+        if self.state_file is None:
+            self._tokens, wait = self._refill(self._tokens, self._stamp, now)
+            self._stamp = now
+            return wait
+
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        with open(self.state_file, 'a+') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                fields = f.read().split()
+                tokens, stamp = self.capacity, now
+                if len(fields) == 2:
+                    tokens, stamp = float(fields[0]), float(fields[1])
+                tokens, wait = self._refill(tokens, stamp, now)
+                f.seek(0)
+                f.truncate()
+                f.write('{!r} {!r}'.format(tokens, now))
+                f.flush()
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return wait
@@ -0,0 +1,108 @@
+"""
+Combined rankings of registered users over a season of contests.
+
+When the official standings of a contest are stored (main.store.save_standings),
+the points of registered contestants are saved as ContestScore rows. Only
+official standings are used, so that ranks are those of the official ranking.
+Then the SeasonScore totals of users whose points changed are recomputed from
+their ContestScore rows, in seasons which include the contest. So a season
+ranking is read in one query, however many contests the season has.
+
+Processes on different machines may store the same contest at once, so the
+contest's row and the seasons' rows are locked while scores are written, and
+totals are sums rather than increments, which can't be counted twice.
+
+Totals of a season are recomputed from ContestScore rows when contests are
+added to it or removed from it.
+"""
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from . import cf_get
+from .models import Contest, ContestScore, Season, SeasonContest, SeasonScore
+from typing import Dict, Iterable, List, Set, Tuple
+
+def contest_scores(participants):
+    # type: (Iterable[cf_get.Participant]) -> Dict[str, Tuple[float, int]]
+    # Only contestants count; virtual and practice participation don't.
+    return {p.username: (p.points, p.rank) for p in participants
+        if p.type == 'CONTESTANT' and not p.is_team}
+
+def update_totals(season_ids, usernames):
+    # type: (List[int], Set[str]) -> None
+    """Recompute the totals of usernames in seasons from their contest scores."""
+    # Locked in a fixed order, so that concurrent updates can't deadlock.
+    for season_id in Season.objects.select_for_update().filter(pk__in=season_ids).order_by(
+            'pk').values_list('pk', flat=True):
+        contest_ids = SeasonContest.objects.filter(season_id=season_id).values_list('contest_id', flat=True)
+        totals = {row['username']: (row['total'], row['count']) for row in
+            ContestScore.objects.filter(contest_id__in=contest_ids, username__in=usernames).values(
+                'username').annotate(total=Sum('points'), count=Count('contest_id'))}
+        scores = SeasonScore.objects.filter(season_id=season_id, username__in=usernames)
+        existing = {score.username: score for score in scores}
+        changed = [] # type: List[SeasonScore]
+        for username, score in existing.items():
+            if username in totals and (score.points, score.contests) != totals[username]:
+                score.points, score.contests = totals[username]
+                changed.append(score)
+        SeasonScore.objects.bulk_update(changed, ['points', 'contests'])
+        scores.exclude(username__in=totals).delete()
+        SeasonScore.objects.bulk_create([SeasonScore(season_id=season_id, username=username,
+            points=points, contests=contests) for username, (points, contests) in totals.items()
+            if username not in existing])
+
+@transaction.atomic
+def ingest_contest(contest_id, participants):
+    # type: (int, Iterable[cf_get.Participant]) -> int
+    """
+    Store scores of a contest from its official standings and update season
+    totals of the users whose points changed. Returns their number.
+    """
+    # Serializes ingests of this contest (a no-op on SQLite, where writers are serialized anyway).
+    list(Contest.objects.select_for_update().filter(contest_id=contest_id, show_unofficial=False))
+    new = contest_scores(participants)
+    old = {row.username: row for row in ContestScore.objects.filter(contest_id=contest_id)}
+    affected = set() # type: Set[str]
+    created = [] # type: List[ContestScore]
+    changed = [] # type: List[ContestScore]
+
+    for username, (points, rank) in new.items():
+        row = old.get(username)
+        if row is None:
+            created.append(ContestScore(contest_id=contest_id, username=username, points=points, rank=rank))
+            affected.add(username)
+        elif (row.points, row.rank) != (points, rank):
+            if row.points != points:
+                affected.add(username)
+            row.points, row.rank = points, rank
+            changed.append(row)
+    removed = [username for username in old if username not in new]
+    if removed:
+        ContestScore.objects.filter(contest_id=contest_id, username__in=removed).delete()
+        affected.update(removed)
+    ContestScore.objects.bulk_update(changed, ['points', 'rank'])
+    ContestScore.objects.bulk_create(created)
+
+    season_ids = list(SeasonContest.objects.filter(contest_id=contest_id).values_list('season_id', flat=True))
+    if affected and season_ids:
+        update_totals(season_ids, affected)
+    return len(affected)
+
+@transaction.atomic
+def rebuild_season(season_id):
+    # type: (int) -> None
+    if not Season.objects.select_for_update().filter(pk=season_id).exists():
+        return
+    contest_ids = SeasonContest.objects.filter(season_id=season_id).values_list('contest_id', flat=True)
+    totals = ContestScore.objects.filter(contest_id__in=contest_ids).values('username').annotate(
+        total=Sum('points'), count=Count('contest_id'))
+    SeasonScore.objects.filter(season_id=season_id).delete()
+    SeasonScore.objects.bulk_create([SeasonScore(season_id=season_id, username=row['username'],
+        points=row['total'], contests=row['count']) for row in totals])
+
+def season_contests_changed(sender, instance, **kwargs):
+    # type: (type, SeasonContest, **object) -> None
+    # After commit, so that deleting a whole season doesn't recreate its scores.
+    season_id = instance.season_id
+    transaction.on_commit(lambda: rebuild_season(season_id))
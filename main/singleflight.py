@@ -0,0 +1,119 @@
+"""
+Request coalescing: concurrent callers asking for the same key share the
+result of a single call instead of each making their own.
+"""
+
+import os
+import hashlib
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; there we only coalesce within a process.
+    fcntl = None # type: ignore
+
+from typing import Any, Callable, Dict, Iterator, Optional
+
+@contextlib.contextmanager
+def file_lock(lock_dir, key):
+    # type: (str, str) -> Iterator[None]
+    """Hold an exclusive lock shared by all processes on this machine."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(lock_dir, exist_ok=True)
+    fname = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.lock'
+    with open(os.path.join(lock_dir, fname), 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class _Call:
+    def __init__(self):
+        # type: () -> None
+        self.done = threading.Event()
+        self.result = None # type: Any
+        self.error = None # type: Optional[BaseException]
+
+class SingleFlight:
+    """
+    Within a process, the first caller for a key runs func() and the others
+    wait for its result. If lock_dir is given, the callers which run func()
+    in different processes are also serialized on a file lock.
+
+    Waiters don't lend their priority to func(): an urgent caller waits as
+    long as the one which got there first.
+    """
+
+    def __init__(self, lock_dir=None):
+        # type: (Optional[str]) -> None
+        self.lock_dir = lock_dir
+        self._lock = threading.Lock()
+        self._calls = {} # type: Dict[str, _Call]
+        self.issued = 0
+        self.coalesced = 0
+        self.coalesced_remote = 0
+
+    def do(self, key, func, recheck=None):
+        # type: (str, Callable[[], Any], Optional[Callable[[], Any]]) -> Any
+        """
+        Return func(), calling it at most once at a time per key.
+        recheck() is called after taking the file lock; if it returns
+        something other than None, another process has just done the work
+        and its result is used instead of calling func().
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, func, recheck)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _run(self, key, func, recheck):
+        # type: (str, Callable[[], Any], Optional[Callable[[], Any]]) -> Any
+        if self.lock_dir is None:
+            with self._lock:
+                self.issued += 1
+            return func()
+        with file_lock(self.lock_dir, key):
+            if recheck is not None:
+                result = recheck()
+                if result is not None:
+                    with self._lock:
+                        self.coalesced_remote += 1
+                    return result
+            with self._lock:
+                self.issued += 1
+            return func()
+
+    def stats(self):
+        # type: () -> Dict[str, int]
+        with self._lock:
+            return {
+                'issued': self.issued,
+                'coalesced': self.coalesced,
+                'coalesced_remote': self.coalesced_remote,
+                'in_flight': len(self._calls),
+            }
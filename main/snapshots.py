@@ -0,0 +1,369 @@
+"""
+History of the standings of running contests, to show a leaderboard as it
+was at any time.
+
+Whenever standings of a contest which has started are stored (see
+main.store.save_standings), a snapshot of them is recorded, at most once
+per SNAPSHOT_INTERVAL unless the phase changed, and only if something
+changed: each snapshot keeps a digest of its standings, so unchanged
+standings are found without decoding the chain. The last one is recorded when the contest is first seen FINISHED;
+contests which are only seen after they finished have no history.
+
+Snapshots are zlib-compressed JSON. Every SNAPSHOT_CHECKPOINT_EVERY-th one
+is a checkpoint with the whole state in columns; the others only hold the
+changes since the previous snapshot. The state at a time is rebuilt from
+the last checkpoint before it and the snapshots after that checkpoint.
+
+In a state, each participant has a slot: their position in "keys", which
+never changes once assigned. "order" lists slots in the order of the
+standings, and the other columns are indexed by slot:
+
+    {"contest": {"name", "phase", "type", "start_time", "duration"},
+     "problems": [[index, name, points], ...],
+     "keys": [[username, type, is_team], ...],
+     "rank": [...], "points": [...],
+     "attempts": [[[points, rejects, time], ...], ...],  # one per problem
+     "order": [...]}
+
+Stored snapshots differ from states in three ways, which keep them small
+when only a few participants move:
+
+- "order" is a flat list of [start, length] runs of a base sequence: the
+  previous order followed by the new slots (all slots for checkpoints).
+- Ranks are stored by position in "order", as "ties", [start, length] runs
+  of positions whose rank equals the one before, and "ranks", [position,
+  rank] pairs for the ranks which aren't position + 1 or a tie.
+- Checkpoints store "attempts" column by column, one list per problem and
+  field, since most attempts are empty and runs of zeros compress well.
+
+Change sets have "contest", "order", "ties" and "ranks" only if they
+changed, "keys" of new slots, [slot, value] pairs in "points", and [slot,
+position, points, rejects, time] items in "attempts". Problems only change
+in checkpoints.
+"""
+
+import hashlib
+import json
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+
+from . import cf_get
+from .api import num
+from .models import Contest, StandingsSnapshot
+from typing import Any, Dict, List, Optional, Tuple
+
+Standings = Tuple[cf_get.Contest, List[cf_get.Problem], List[cf_get.Participant]]
+State = Dict[str, Any]
+
+NO_ATTEMPT = [0, 0, 0]
+
+def pack(data):
+    # type: (Any) -> bytes
+    return zlib.compress(json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8'), 9)
+
+def unpack(blob):
+    # type: (bytes) -> Any
+    return json.loads(zlib.decompress(bytes(blob)).decode('utf-8'))
+
+def build_state(standings, previous=None):
+    # type: (Standings, Optional[State]) -> State
+    """The state of standings, with the slots of participants in previous kept."""
+    contest, problems, participants = standings
+    keys = [list(key) for key in previous['keys']] if previous is not None else []
+    slots = {(username, ptype): slot for slot, (username, ptype, is_team) in enumerate(keys)}
+    for p in participants:
+        if (p.username, p.type) not in slots:
+            slots[(p.username, p.type)] = len(keys)
+            keys.append([p.username, p.type, int(p.is_team)])
+    rank = [0] * len(keys)
+    points = [0] * len(keys) # type: List[Any]
+    attempts = [[NO_ATTEMPT] * len(problems) for key in keys] # type: List[List[List[Any]]]
+    order = []
+    for p in participants:
+        slot = slots[(p.username, p.type)]
+        order.append(slot)
+        rank[slot] = p.rank
+        points[slot] = num(p.points)
+        attempts[slot] = [[num(a.points), a.rejects, int(a.time.total_seconds())] for a in p.attempts]
+    return {
+        'contest': {'name': contest.name, 'phase': contest.phase, 'type': contest.type,
+            'start_time': contest.start_time, 'duration': contest.duration},
+        'problems': [[p.index, p.name, num(p.points)] for p in problems],
+        'keys': keys,
+        'rank': rank,
+        'points': points,
+        'attempts': attempts,
+        'order': order,
+    }
+
+def encode_order(order, base):
+    # type: (List[int], List[int]) -> List[int]
+    positions = {slot: i for i, slot in enumerate(base)}
+    runs = [] # type: List[int]
+    for slot in order:
+        position = positions[slot]
+        if runs and runs[-2] + runs[-1] == position:
+            runs[-1] += 1
+        else:
+            runs.extend([position, 1])
+    return runs
+
+def decode_order(runs, base):
+    # type: (List[int], List[int]) -> List[int]
+    order = [] # type: List[int]
+    for i in range(0, len(runs), 2):
+        order.extend(base[runs[i]:runs[i] + runs[i + 1]])
+    return order
+
+def order_base(order, n_keys):
+    # type: (List[int], int) -> List[int]
+    if len(order) == n_keys:
+        return order
+    in_order = set(order)
+    return order + [slot for slot in range(n_keys) if slot not in in_order]
+
+def encode_ranks(ranks):
+    # type: (List[int]) -> Tuple[List[int], List[List[int]]]
+    """Ties and other ranks of a list of ranks in standings order."""
+    ties = [] # type: List[int]
+    other = []
+    for position, rank in enumerate(ranks):
+        if position and rank == ranks[position - 1]:
+            if ties and ties[-2] + ties[-1] == position:
+                ties[-1] += 1
+            else:
+                ties.extend([position, 1])
+        elif rank != position + 1:
+            other.append([position, rank])
+    return (ties, other)
+
+def decode_ranks(ties, other, n):
+    # type: (List[int], List[List[int]], int) -> List[int]
+    ranks = [position + 1 for position in range(n)]
+    for position, rank in other:
+        ranks[position] = rank
+    # Runs are in increasing order, so a run sees the ranks before it.
+    for i in range(0, len(ties), 2):
+        start, length = ties[i], ties[i + 1]
+        for position in range(start, start + length):
+            ranks[position] = ranks[start - 1]
+    return ranks
+
+def _set_ranks(state, ties, other):
+    # type: (State, List[int], List[List[int]]) -> None
+    rank = [0] * len(state['keys'])
+    for slot, value in zip(state['order'], decode_ranks(ties, other, len(state['order']))):
+        rank[slot] = value
+    state['rank'] = rank
+
+def changes(old, new):
+    # type: (State, State) -> Dict[str, Any]
+    """The change set from old to new, which must have the same problems and keep old's slots."""
+    result = {} # type: Dict[str, Any]
+    if new['contest'] != old['contest']:
+        result['contest'] = new['contest']
+    n_old = len(old['keys'])
+    if len(new['keys']) > n_old:
+        result['keys'] = new['keys'][n_old:]
+    if new['order'] != old['order']:
+        result['order'] = encode_order(new['order'], order_base(old['order'], len(new['keys'])))
+    old_ranks = encode_ranks([old['rank'][slot] for slot in old['order']])
+    new_ranks = encode_ranks([new['rank'][slot] for slot in new['order']])
+    if new_ranks != old_ranks or 'order' in result:
+        # Ranks are by position, so they go with every change of order.
+        result['ties'], result['ranks'] = new_ranks
+    no_attempts = [NO_ATTEMPT] * len(new['problems'])
+    points = []
+    attempts = []
+    for slot in range(len(new['keys'])):
+        known = slot < n_old
+        if new['points'][slot] != (old['points'][slot] if known else 0):
+            points.append([slot, new['points'][slot]])
+        old_attempts = old['attempts'][slot] if known else no_attempts
+        for position, attempt in enumerate(new['attempts'][slot]):
+            if attempt != old_attempts[position]:
+                attempts.append([slot, position] + attempt)
+    if points:
+        result['points'] = points
+    if attempts:
+        result['attempts'] = attempts
+    return result
+
+def apply_changes(state, change_set, ranks=True):
+    # type: (State, Dict[str, Any], bool) -> None
+    """Apply a change set to state. Unless ranks, state's ranks are left out of date."""
+    if 'contest' in change_set:
+        state['contest'] = change_set['contest']
+    for key in change_set.get('keys', []):
+        state['keys'].append(key)
+        state['points'].append(0)
+        state['attempts'].append([NO_ATTEMPT] * len(state['problems']))
+    if 'order' in change_set:
+        state['order'] = decode_order(change_set['order'], order_base(state['order'], len(state['keys'])))
+    if ranks and 'ties' in change_set:
+        _set_ranks(state, change_set['ties'], change_set['ranks'])
+    elif ranks:
+        state['rank'].extend([0] * (len(state['keys']) - len(state['rank'])))
+    for slot, value in change_set.get('points', []):
+        state['points'][slot] = value
+    for slot, position, points, rejects, time in change_set.get('attempts', []):
+        # Rows are shared with the previous state until they change.
+        row = state['attempts'][slot] = list(state['attempts'][slot])
+        row[position] = [points, rejects, time]
+
+def checkpoint_data(state):
+    # type: (State) -> Dict[str, Any]
+    data = {key: state[key] for key in ('contest', 'problems', 'keys', 'points')}
+    data['order'] = encode_order(state['order'], list(range(len(state['keys']))))
+    data['ties'], data['ranks'] = encode_ranks([state['rank'][slot] for slot in state['order']])
+    data['attempts'] = [[[row[position][field] for row in state['attempts']] for field in range(3)]
+        for position in range(len(state['problems']))]
+    return data
+
+def state_from_checkpoint(data):
+    # type: (Dict[str, Any]) -> State
+    n = len(data['keys'])
+    state = {key: data[key] for key in ('contest', 'problems', 'keys', 'points')}
+    state['order'] = decode_order(data['order'], list(range(n)))
+    by_problem = [[list(attempt) for attempt in zip(*fields)] for fields in data['attempts']]
+    state['attempts'] = [list(row) for row in zip(*by_problem)] if by_problem else [[] for i in range(n)]
+    _set_ranks(state, data['ties'], data['ranks'])
+    return state
+
+def standings_from_state(state):
+    # type: (State) -> Standings
+    contest = state['contest']
+    problems = [cf_get.Problem({'index': index, 'name': name, 'points': points})
+        for index, name, points in state['problems']]
+    # Equal attempts (mostly empty ones) share an object; nothing changes them.
+    attempts = {} # type: Dict[Tuple[Any, ...], cf_get.Attempt]
+    participants = []
+    for slot in state['order']:
+        username, ptype, is_team = state['keys'][slot]
+        if is_team:
+            party = {'teamName': username, 'members': [], 'participantType': ptype}
+        else:
+            party = {'members': [{'handle': username}], 'participantType': ptype}
+        participant = cf_get.Participant({
+            'party': party,
+            'rank': state['rank'][slot],
+            'points': state['points'][slot],
+            'problemResults': [],
+        })
+        for points, rejects, time in state['attempts'][slot]:
+            attempt = attempts.get((points, rejects, time))
+            if attempt is None:
+                attempt = attempts[(points, rejects, time)] = cf_get.Attempt({'points': points,
+                    'rejectedAttemptCount': rejects, 'bestSubmissionTimeSeconds': time})
+            participant.attempts.append(attempt)
+        participants.append(participant)
+    return (cf_get.Contest({'name': contest['name'], 'phase': contest['phase'], 'type': contest['type'],
+        'startTimeSeconds': contest['start_time'], 'durationSeconds': contest['duration']}),
+        problems, participants)
+
+def _chain_state(rows):
+    # type: (List[Tuple[bool, bytes]]) -> State
+    # rows are (is_checkpoint, data) from a checkpoint on.
+    state = state_from_checkpoint(unpack(rows[0][1]))
+    # Ranks are only decoded for the last change set which has them.
+    last_ranks = None
+    for is_checkpoint, data in rows[1:]:
+        change_set = unpack(data)
+        apply_changes(state, change_set, ranks=False)
+        if 'ties' in change_set:
+            last_ranks = change_set
+    if last_ranks is not None:
+        _set_ranks(state, last_ranks['ties'], last_ranks['ranks'])
+    else:
+        state['rank'].extend([0] * (len(state['keys']) - len(state['rank'])))
+    return state
+
+def _rows_until(contest_row, when):
+    # type: (Contest, datetime) -> List[Tuple[datetime, bool, bytes]]
+    """Snapshots from the last checkpoint taken at or before when, up to when."""
+    snapshots = StandingsSnapshot.objects.filter(contest=contest_row, taken_at__lte=when)
+    checkpoint_at = snapshots.filter(is_checkpoint=True).order_by('-taken_at').values_list(
+        'taken_at', flat=True).first()
+    if checkpoint_at is None:
+        return []
+    return list(snapshots.filter(taken_at__gte=checkpoint_at).order_by('taken_at').values_list(
+        'taken_at', 'is_checkpoint', 'data'))
+
+def state_at(contest_row, when):
+    # type: (Contest, datetime) -> Optional[Tuple[datetime, State]]
+    """The last recorded state at or before when, and when it was recorded."""
+    rows = _rows_until(contest_row, when)
+    if not rows:
+        return None
+    return (rows[-1][0], _chain_state([(is_checkpoint, data) for taken_at, is_checkpoint, data in rows]))
+
+def standings_at(contest_row, when):
+    # type: (Contest, datetime) -> Optional[Tuple[datetime, Standings]]
+    result = state_at(contest_row, when)
+    if result is None:
+        return None
+    return (result[0], standings_from_state(result[1]))
+
+def start_time(contest_row):
+    # type: (Contest) -> Optional[datetime]
+    """When the contest started, or else when its first snapshot was taken."""
+    first = StandingsSnapshot.objects.filter(contest=contest_row).order_by('taken_at').first()
+    if first is None:
+        return None
+    start = unpack(first.data)['contest']['start_time']
+    if start is None:
+        return first.taken_at
+    return datetime.fromtimestamp(start, dt_timezone.utc)
+
+def standings_digest(standings):
+    # type: (Standings) -> str
+    """Hash of everything in standings which a snapshot records."""
+    contest, problems, participants = standings
+    h = hashlib.sha1()
+    h.update(repr((contest.name, contest.phase, contest.type, contest.start_time, contest.duration,
+        [(p.index, p.name, num(p.points)) for p in problems])).encode('utf-8'))
+    for p in participants:
+        h.update(repr((p.username, p.type, int(p.is_team), p.rank, num(p.points),
+            [(num(a.points), a.rejects, int(a.time.total_seconds())) for a in p.attempts])).encode('utf-8'))
+    return h.hexdigest()
+
+def record(contest_row, standings, taken_at):
+    # type: (Contest, Standings, datetime) -> Optional[StandingsSnapshot]
+    """Record a snapshot of standings, if one is due. Returns it, if it was recorded."""
+    phase = standings[0].phase
+    if phase == 'BEFORE':
+        return None
+    latest = StandingsSnapshot.objects.filter(contest=contest_row, taken_at__lte=taken_at).order_by(
+        '-taken_at').values_list('taken_at', 'phase', 'digest').first()
+    if latest is None and phase == 'FINISHED':
+        return None
+    # Most calls return here, without decoding the chain.
+    if latest is not None and _skip(latest[1], phase, taken_at - latest[0]):
+        return None
+    digest = standings_digest(standings)
+    if latest is not None and latest[2] == digest:
+        return None
+    rows = _rows_until(contest_row, taken_at)
+    previous = None # type: Optional[State]
+    if rows:
+        previous = _chain_state([(is_checkpoint, data) for t, is_checkpoint, data in rows])
+        if _skip(previous['contest']['phase'], phase, taken_at - rows[-1][0]):
+            return None
+    state = build_state(standings, previous)
+    if previous is None or previous['problems'] != state['problems'] or \
+            len(rows) >= settings.SNAPSHOT_CHECKPOINT_EVERY:
+        return StandingsSnapshot.objects.create(contest=contest_row, taken_at=taken_at,
+            is_checkpoint=True, data=pack(checkpoint_data(state)), phase=phase, digest=digest)
+    change_set = changes(previous, state)
+    if not change_set:
+        return None
+    return StandingsSnapshot.objects.create(contest=contest_row, taken_at=taken_at,
+        is_checkpoint=False, data=pack(change_set), phase=phase, digest=digest)
+
+def _skip(previous_phase, phase, since):
+    # type: (str, str, timedelta) -> bool
+    if previous_phase == 'FINISHED':
+        return True
+    return since.total_seconds() < settings.SNAPSHOT_INTERVAL and previous_phase == phase
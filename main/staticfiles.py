@@ -0,0 +1,32 @@
+"""
+Static files middleware which works in both WSGI and ASGI middleware chains.
+
+WhiteNoiseMiddleware (5.x) is synchronous only. Under ASGI, Django adapts a
+synchronous middleware by running it, and everything after it, through
+async_to_sync and sync_to_async, so each request crosses the thread boundary
+several times and async views lose most of their benefit. This wraps the same
+file lookup in a middleware which is native in both modes.
+"""
+
+import asyncio
+
+from django.utils.decorators import sync_and_async_middleware
+from whitenoise.middleware import WhiteNoiseMiddleware
+from typing import Any
+
+@sync_and_async_middleware
+def static_files_middleware(get_response):
+    # type: (Any) -> Any
+    whitenoise = WhiteNoiseMiddleware(get_response)
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            # type: (Any) -> Any
+            # The lookup is in memory, except with WHITENOISE_AUTOREFRESH (DEBUG),
+            # where it checks the filesystem.
+            response = whitenoise.process_request(request)
+            if response is None:
+                response = await get_response(request)
+            return response
+    else:
+        middleware = whitenoise
+    return middleware
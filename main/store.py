@@ -0,0 +1,171 @@
+"""
+Persistent local store of contest standings.
+
+Standings of FINISHED contests never change, so once stored they are read
+from the database only. Standings of running contests are refreshed from
+Codeforces, and only the rows whose values changed are written back.
+Storing standings also updates season totals (see main.seasons) and
+records snapshots of running contests (see main.snapshots).
+"""
+
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import cf_get
+from . import models
+from . import seasons
+from . import snapshots
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Standings = Tuple[cf_get.Contest, List[cf_get.Problem], List[cf_get.Participant]]
+
+def handles_hash(usernames):
+    # type: (Iterable[str]) -> str
+    joined = ';'.join(sorted(set(usernames)))
+    return hashlib.sha1(joined.encode('utf-8')).hexdigest()[:16]
+
+def load_standings(contest_row):
+    # type: (models.Contest) -> Standings
+    problems = [problem.to_cf() for problem in contest_row.problems.all()]
+    participants = [p.to_cf(p.attempts.all()) for p in
+        contest_row.participants.prefetch_related('attempts')]
+    return (contest_row.to_cf(), problems, participants)
+
+def _save_problems(contest_row, problems):
+    # type: (models.Contest, List[cf_get.Problem]) -> None
+    old = [(p.index, p.name, p.points) for p in contest_row.problems.all()]
+    new = [(p.index, p.name, float(p.points)) for p in problems]
+    if old != new:
+        contest_row.problems.all().delete()
+        models.Problem.objects.bulk_create([models.Problem(contest=contest_row, position=i,
+            index=index, name=name, points=points) for i, (index, name, points) in enumerate(new)])
+
+def _new_attempts(participant_row, attempts):
+    # type: (models.Participant, List[cf_get.Attempt]) -> List[models.Attempt]
+    return [models.Attempt(participant=participant_row, position=i, points=a.points,
+        rejects=a.rejects, time=a.time) for i, a in enumerate(attempts)]
+
+# Rows per UPDATE statement of bulk_update, which sets each column with a CASE
+# over the primary keys. Running contests change a few hundred rows at most
+# between refreshes.
+BULK_UPDATE_BATCH_SIZE = 500
+PARTICIPANT_FIELDS = ['position', 'rank', 'points', 'is_team']
+ATTEMPT_FIELDS = ['points', 'rejects', 'time']
+
+def _save_participants(contest_row, participants):
+    # type: (models.Contest, List[cf_get.Participant]) -> Dict[str, int]
+    existing = {(p.username, p.type): p for p in
+        contest_row.participants.prefetch_related('attempts')}
+    created = [] # type: List[Tuple[models.Participant, cf_get.Participant]]
+    changed_rows = [] # type: List[models.Participant]
+    changed_attempts = [] # type: List[models.Attempt]
+    replaced = [] # type: List[Tuple[models.Participant, cf_get.Participant]]
+    counts = {'created': 0, 'updated': 0, 'deleted': 0}
+
+    for position, p in enumerate(participants):
+        values = {'position': position, 'rank': p.rank, 'points': p.points,
+            'is_team': p.is_team}
+        row = existing.pop((p.username, p.type), None)
+        if row is None:
+            created.append((models.Participant(contest=contest_row, username=p.username,
+                type=p.type, **values), p))
+            continue
+
+        if any(getattr(row, k) != v for k, v in values.items()):
+            for k, v in values.items():
+                setattr(row, k, v)
+            changed_rows.append(row)
+
+        old_attempts = list(row.attempts.all())
+        if len(old_attempts) != len(p.attempts):
+            replaced.append((row, p))
+            continue
+        for old, new in zip(old_attempts, p.attempts):
+            if (old.points, old.rejects, old.time) != (new.points, new.rejects, new.time):
+                old.points, old.rejects, old.time = new.points, new.rejects, new.time
+                changed_attempts.append(old)
+
+    models.Participant.objects.bulk_update(changed_rows, PARTICIPANT_FIELDS, batch_size=BULK_UPDATE_BATCH_SIZE)
+    counts['updated'] = len(changed_rows)
+    models.Attempt.objects.bulk_update(changed_attempts, ATTEMPT_FIELDS, batch_size=BULK_UPDATE_BATCH_SIZE)
+    if replaced:
+        models.Attempt.objects.filter(participant__in=[row for row, p in replaced]).delete()
+        models.Attempt.objects.bulk_create([a for row, p in replaced for a in _new_attempts(row, p.attempts)])
+
+    if existing:
+        models.Participant.objects.filter(pk__in=[row.pk for row in existing.values()]).delete()
+        counts['deleted'] = len(existing)
+
+    if created:
+        models.Participant.objects.bulk_create([row for row, p in created])
+        # bulk_create doesn't set primary keys on every database backend.
+        ids = dict(((username, ptype), pk) for username, ptype, pk in
+            contest_row.participants.values_list('username', 'type', 'pk'))
+        attempts = [] # type: List[models.Attempt]
+        for row, p in created:
+            row.pk = ids[(p.username, p.type)]
+            attempts.extend(_new_attempts(row, p.attempts))
+        models.Attempt.objects.bulk_create(attempts)
+        counts['created'] = len(created)
+    return counts
+
+@transaction.atomic
+def save_standings(contest_id, show_unofficial, handles_digest, standings):
+    # type: (int, bool, str, Standings) -> Dict[str, int]
+    """
+    Store standings, writing only rows which changed.
+    Returns the number of participant rows created, updated and deleted.
+    """
+    contest, problems, participants = standings
+    values = {
+        'name': contest.name,
+        'phase': contest.phase,
+        'type': contest.type,
+        'start_time': contest.start_time,
+        'duration': contest.duration,
+        'handles_hash': handles_digest,
+        'updated_at': timezone.now(),
+    }
+    # Write before reading: on SQLite, a transaction which has read can't
+    # wait for another writer to finish, and fails with "database is locked".
+    rows = models.Contest.objects.filter(contest_id=contest_id, show_unofficial=show_unofficial)
+    if rows.update(**values):
+        contest_row = rows.get()
+    else:
+        try:
+            # In a savepoint, so that the transaction can go on if it fails.
+            with transaction.atomic():
+                contest_row = models.Contest.objects.create(contest_id=contest_id,
+                    show_unofficial=show_unofficial, **values)
+        except IntegrityError:
+            # Another process created it after update(). The insert waited for that
+            # process to commit, so the row can be updated now.
+            rows.update(**values)
+            contest_row = rows.get()
+    _save_problems(contest_row, problems)
+    counts = _save_participants(contest_row, participants)
+    if not show_unofficial:
+        seasons.ingest_contest(contest_id, participants)
+    snapshots.record(contest_row, standings, values['updated_at'])
+    return counts
+
+def get_stored(contest_id, show_unofficial, handles_digest):
+    # type: (int, bool, str) -> Optional[models.Contest]
+    """Return stored standings for a finished contest, if they are complete."""
+    return models.Contest.objects.filter(contest_id=contest_id, show_unofficial=show_unofficial,
+        phase='FINISHED', handles_hash=handles_digest).first()
+
+def get_standings(contest_id, usernames, show_unofficial, priority=cf_get.PRIORITY_INTERACTIVE,
+        handles_digest=None):
+    # type: (int, Iterable[str], bool, int, Optional[str]) -> Standings
+    usernames = list(usernames)
+    digest = handles_digest or handles_hash(usernames)
+    contest_row = get_stored(contest_id, show_unofficial, digest)
+    if contest_row is not None:
+        return load_standings(contest_row)
+    standings = cf_get.get_contest_info(contest_id, usernames, show_unofficial, priority,
+        fetch_colors=False)
+    save_standings(contest_id, show_unofficial, digest, standings)
+    return standings
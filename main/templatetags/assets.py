@@ -0,0 +1,40 @@
+from functools import lru_cache
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.utils.safestring import mark_safe
+from typing import Dict, List
+
+register = template.Library()
+
+# Stylesheets which are inlined in pages, so that they render without
+# waiting for any other request. vendor/bootstrap-ldrbrd.css is the part
+# of Bootstrap used by the leaderboard (see devel/purge_css.py).
+CRITICAL_CSS = {
+    'ldrbrd': ['vendor/bootstrap-ldrbrd.css', 'base.css'],
+} # type: Dict[str, List[str]]
+
+def _read_static(path):
+    # type: (str) -> str
+    full_path = finders.find(path)
+    if full_path is None:
+        raise ValueError('Static file not found: {}'.format(path))
+    with open(full_path, encoding='utf-8') as f:
+        return f.read()
+
+@lru_cache()
+def _read_static_cached(path):
+    # type: (str) -> str
+    return _read_static(path)
+
+def critical_css_text(name):
+    # type: (str) -> str
+    # Static files only change across deploys, except while developing.
+    read = _read_static if settings.DEBUG else _read_static_cached
+    return ''.join(read(path) for path in CRITICAL_CSS[name])
+
+@register.simple_tag
+def critical_css(name):
+    # type: (str) -> str
+    return mark_safe('<style>{}</style>'.format(critical_css_text(name)))
@@ -0,0 +1,905 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from devel.stub_cf_api import start_stub_server
+from main import api
+from main import caching
+from main import cf_get
+from main import exporting
+from main import groups
+from main import importing
+from main import live
+from main import seasons
+from main import snapshots
+from main import store
+from main import userinfo
+from main import views
+from main.handles import bump_version, get_handle_set
+from main.models import Contest, ContestScore, Handle, HandleGroup, Season, SeasonContest, SeasonScore
+from main.singleflight import SingleFlight
+from main.staticfiles import static_files_middleware
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+def setUpModule():
+    # type: () -> None
+    # One INFO line per request and API call would bury the test output. Set
+    # LOG_LEVEL to see them.
+    if 'LOG_LEVEL' not in os.environ:
+        logging.getLogger('main').setLevel(logging.WARNING)
+
+def tearDownModule():
+    # type: () -> None
+    logging.getLogger('main').setLevel(settings.LOG_LEVEL)
+
+def participant(username, points, rank, participant_type='CONTESTANT', attempts=None):
+    # type: (str, float, int, str, Optional[List[Tuple[float, int, int]]]) -> cf_get.Participant
+    return cf_get.Participant({
+        'party': {'members': [{'handle': username}], 'participantType': participant_type},
+        'rank': rank,
+        'points': points,
+        'problemResults': [{'points': p, 'rejectedAttemptCount': r, 'bestSubmissionTimeSeconds': t}
+            for p, r, t in attempts or []],
+    })
+
+def standings(contest_id, participants, phase='FINISHED', n_problems=0):
+    # type: (int, List[cf_get.Participant], str, int) -> store.Standings
+    contest = cf_get.Contest({'id': contest_id, 'name': 'Round {}'.format(contest_id), 'phase': phase,
+        'type': 'CF'})
+    problems = [cf_get.Problem({'index': chr(ord('A') + i), 'name': 'Problem', 'points': 500 * (i + 1)})
+        for i in range(n_problems)]
+    return (contest, problems, participants)
+
+class SeasonTests(TestCase):
+    def setUp(self):
+        self.season = Season.objects.create(slug='s', name='Season')
+        SeasonContest.objects.create(season=self.season, contest_id=1)
+        SeasonContest.objects.create(season=self.season, contest_id=2)
+
+    def totals(self):
+        # type: () -> Dict[str, Tuple[float, int]]
+        return {score.username: (score.points, score.contests) for score in
+            SeasonScore.objects.filter(season=self.season)}
+
+    def test_created_changed_and_removed(self):
+        seasons.ingest_contest(1, [participant('alice', 100, 1), participant('bob', 50, 2)])
+        seasons.ingest_contest(2, [participant('alice', 30, 2), participant('carol', 70, 1)])
+        self.assertEqual(self.totals(), {'alice': (130, 2), 'bob': (50, 1), 'carol': (70, 1)})
+
+        # bob's points change, carol's rank only, and alice leaves contest 2.
+        affected = seasons.ingest_contest(2, [participant('bob', 20, 2), participant('carol', 70, 3)])
+        self.assertEqual(affected, 2)
+        self.assertEqual(self.totals(), {'alice': (100, 1), 'bob': (70, 2), 'carol': (70, 1)})
+        self.assertEqual(ContestScore.objects.get(contest_id=2, username='carol').rank, 3)
+        self.assertFalse(ContestScore.objects.filter(contest_id=2, username='alice').exists())
+
+        # Ingesting the same standings again changes nothing.
+        self.assertEqual(seasons.ingest_contest(2, [participant('bob', 20, 2), participant('carol', 70, 3)]), 0)
+        self.assertEqual(self.totals(), {'alice': (100, 1), 'bob': (70, 2), 'carol': (70, 1)})
+
+        seasons.ingest_contest(1, [])
+        self.assertEqual(self.totals(), {'bob': (20, 1), 'carol': (70, 1)})
+
+    def test_only_contestants_count(self):
+        seasons.ingest_contest(1, [participant('alice', 100, 1), participant('bob', 90, 0, 'VIRTUAL'),
+            participant('carol', 80, 0, 'PRACTICE')])
+        self.assertEqual(self.totals(), {'alice': (100, 1)})
+
+    def test_only_official_standings_are_ingested(self):
+        store.save_standings(1, True, 'digest', standings(1, [participant('alice', 100, 5)]))
+        self.assertFalse(ContestScore.objects.exists())
+        store.save_standings(1, False, 'digest', standings(1, [participant('alice', 100, 3)]))
+        self.assertEqual(ContestScore.objects.get(contest_id=1, username='alice').rank, 3)
+        self.assertEqual(self.totals(), {'alice': (100, 1)})
+
+    def test_rebuild_season(self):
+        seasons.ingest_contest(1, [participant('alice', 100, 1)])
+        seasons.ingest_contest(3, [participant('alice', 10, 1), participant('bob', 40, 2)])
+        self.assertEqual(self.totals(), {'alice': (100, 1)})
+
+        # Adding a contest to the season rebuilds its totals when the transaction commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            SeasonContest.objects.create(season=self.season, contest_id=3)
+        self.assertEqual(self.totals(), {'alice': (110, 2), 'bob': (40, 1)})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SeasonContest.objects.filter(season=self.season, contest_id=1).delete()
+        self.assertEqual(self.totals(), {'alice': (10, 1), 'bob': (40, 1)})
+
+class DeferredThread:
+    """Stands in for threading.Thread, to run a background target when the test says so."""
+    started = [] # type: List[DeferredThread]
+
+    def __init__(self, target, daemon=False):
+        # type: (Callable[[], None], bool) -> None
+        self.target = target
+
+    def start(self):
+        # type: () -> None
+        self.started.append(self)
+
+    def run_on_thread(self):
+        # type: () -> None
+        # On a real thread, which has database connections of its own to close.
+        thread = threading.Thread(target=self.target)
+        thread.start()
+        thread.join()
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'standings'}})
+class StandingsCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.fetches = [] # type: List[int]
+        DeferredThread.started = []
+        patcher = mock.patch.object(caching, 'get_standings', self.fake_get_standings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+    def fake_get_standings(self, contest_id, usernames, show_unofficial, priority, handles_digest):
+        # type: (int, List[str], bool, int, str) -> store.Standings
+        self.fetches.append(priority)
+        return standings(contest_id, [participant('alice', 100 * len(self.fetches), 1)])
+
+    def points(self, entry):
+        # type: (Dict[str, Any]) -> float
+        return entry['value'][2][0].points
+
+    def expire(self):
+        # type: () -> str
+        key = caching.standings_key(1, store.handles_hash(['alice']), False)
+        entry = cache.get(key)
+        entry['fresh_until'] = time.time() - 1
+        cache.set(key, entry)
+        return key
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self.points(caching.get_standings_entry(1, ['alice'], False)), 100)
+        self.assertEqual(self.points(caching.get_standings_entry(1, ['alice'], False)), 100)
+        self.assertEqual(self.fetches, [cf_get.PRIORITY_INTERACTIVE])
+
+    def test_stale_entry_is_served_while_one_refresh_runs(self):
+        caching.get_standings_entry(1, ['alice'], False)
+        key = self.expire()
+        with mock.patch.object(caching.threading, 'Thread', DeferredThread):
+            # Both callers get the stale standings right away; only the first starts a refresh.
+            self.assertEqual(self.points(caching.get_standings_entry(1, ['alice'], False)), 100)
+            self.assertEqual(self.points(caching.get_standings_entry(1, ['alice'], False)), 100)
+        self.assertEqual(len(DeferredThread.started), 1)
+        self.assertIsNotNone(cache.get(key + ':refreshing'))
+
+        DeferredThread.started[0].run_on_thread()
+        self.assertEqual(self.fetches, [cf_get.PRIORITY_INTERACTIVE, cf_get.PRIORITY_BACKGROUND])
+        self.assertIsNone(cache.get(key + ':refreshing'))
+        self.assertEqual(self.points(caching.get_standings_entry(1, ['alice'], False)), 200)
+
+    def test_fresh_entry_waits_for_refresh(self):
+        caching.get_standings_entry(1, ['alice'], False)
+        self.expire()
+        self.assertEqual(self.points(caching.get_fresh_standings_entry(1, ['alice'], False)), 200)
+
+class SingleFlightTests(SimpleTestCase):
+    def concurrent_calls(self, flight, func, n=4):
+        # type: (SingleFlight, Callable[[], Any], int) -> List[Any]
+        """Make n calls of func for one key at once; returns their results or errors."""
+        release = threading.Event()
+        results = [] # type: List[Any]
+
+        def leader():
+            # type: () -> Any
+            release.wait()
+            return func()
+
+        def call(f):
+            # type: (Callable[[], Any]) -> None
+            try:
+                results.append(flight.do('key', f))
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=call, args=(leader,))]
+        threads[0].start()
+        while not flight.stats()['in_flight']:
+            time.sleep(0.001)
+        # The others find the call in flight, and never run their own function.
+        threads += [threading.Thread(target=call, args=(lambda: 'own call',)) for i in range(n - 1)]
+        for thread in threads[1:]:
+            thread.start()
+        while flight.stats()['coalesced'] < n - 1:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_calls_share_one_result(self):
+        flight = SingleFlight()
+        calls = []
+        self.assertEqual(self.concurrent_calls(flight, lambda: calls.append(1) or 'standings'),
+            ['standings'] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats(), {'issued': 1, 'coalesced': 3, 'coalesced_remote': 0, 'in_flight': 0})
+        # Later calls aren't coalesced with finished ones.
+        self.assertEqual(flight.do('key', lambda: 'new'), 'new')
+
+    def test_error_reaches_every_waiter(self):
+        error = ValueError('standings unavailable')
+
+        def fail():
+            # type: () -> None
+            raise error
+
+        self.assertEqual(self.concurrent_calls(SingleFlight(), fail), [error] * 4)
+
+    def test_recheck_skips_call(self):
+        with tempfile.TemporaryDirectory() as lock_dir:
+            flight = SingleFlight(lock_dir)
+            self.assertEqual(flight.do('key', lambda: 'fetched', recheck=lambda: 'cached'), 'cached')
+            self.assertEqual(flight.do('key', lambda: 'fetched', recheck=lambda: None), 'fetched')
+        self.assertEqual(flight.stats()['coalesced_remote'], 1)
+
+class GroupTests(SimpleTestCase):
+    def test_intra_ranks(self):
+        participants = [participant(name, 0, rank) for name, rank in
+            [('a', 1), ('b', 3), ('c', 3), ('d', 7), ('e', 0), ('f', 0)]]
+        groups.set_intra_ranks(participants)
+        self.assertEqual([p.intra_rank for p in participants], [1, 2, 2, 4, 0, 0])
+
+    def test_group_participants_are_copies(self):
+        participants = [participant('alice', 100, 1), participant('bob', 90, 2), participant('carol', 80, 3)]
+        groups.set_intra_ranks(participants)
+        members = groups.group_participants(participants, frozenset(['bob', 'carol', 'dave']))
+        groups.set_intra_ranks(members)
+        self.assertEqual([(p.username, p.intra_rank) for p in members], [('bob', 1), ('carol', 2)])
+        # The shared standings keep their own ranks.
+        self.assertEqual([p.intra_rank for p in participants], [1, 2, 3])
+
+class StoreTests(TestCase):
+    def setUp(self):
+        self.standings = standings(1, [participant('alice', 100, 1)])
+        self.standings[0].start_time = 1600000000
+        self.standings[0].duration = 7200
+
+    def test_contest_round_trip(self):
+        store.save_standings(1, False, 'digest', self.standings)
+        contest = store.load_standings(Contest.objects.get(contest_id=1))[0]
+        self.assertEqual((contest.id, contest.name, contest.phase, contest.start_time, contest.duration),
+            (1, 'Round 1', 'FINISHED', 1600000000, 7200))
+
+    def test_contest_created_concurrently(self):
+        Contest.objects.create(contest_id=1, show_unofficial=False, name='Round 1', phase='CODING',
+            type='CF', updated_at=timezone.now())
+        update = QuerySet.update
+        missed = []
+
+        def update_after_other_process(queryset, **kwargs):
+            # The first update() runs before the other process has created the row.
+            if queryset.model is Contest and not missed:
+                missed.append(queryset)
+                return 0
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', update_after_other_process):
+            store.save_standings(1, False, 'digest', self.standings)
+        self.assertEqual(Contest.objects.get(contest_id=1).phase, 'FINISHED')
+
+    def test_changed_rows_are_updated_in_bulk(self):
+        def changes_queries(n):
+            # type: (int) -> int
+            Contest.objects.all().delete()
+            before = standings(1, [participant('u{}'.format(i), 100, i + 1, attempts=[(100, 0, 60)])
+                for i in range(n)], n_problems=1)
+            after = standings(1, [participant('u{}'.format(i), 200, i + 1, attempts=[(200, 1, 90)])
+                for i in range(n)], n_problems=1)
+            store.save_standings(1, False, 'digest', before)
+            with CaptureQueriesContext(connection) as queries:
+                counts = store.save_standings(1, False, 'digest', after)
+            self.assertEqual(counts['updated'], n)
+            stored = store.load_standings(Contest.objects.get(contest_id=1, show_unofficial=False))[2]
+            self.assertEqual([(p.points, p.attempts[0].rejects) for p in stored], [(200, 1)] * n)
+            return len(queries)
+
+        self.assertEqual(changes_queries(2), changes_queries(6))
+
+class ExportTests(TestCase):
+    def test_network_error_fails_one_contest(self):
+        def fetch(contest_id):
+            # type: (int) -> store.Standings
+            if contest_id == 2:
+                raise cf_get.network_errors()[0]('Connection refused')
+            return standings(contest_id, [participant('alice', 100, 1, attempts=[(100, 0, 60)])], n_problems=1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'out.csv')
+            checkpoint = exporting.export([1, 2, 3], fetch, output, 'csv',
+                os.path.join(directory, 'out.checkpoint'), parallel=1)
+            self.assertEqual(sorted(checkpoint.done), [1, 3])
+            self.assertEqual(list(checkpoint.failed), [2])
+            with open(output) as f:
+                self.assertEqual(len(f.readlines()), 3)
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.contest_row = Contest.objects.create(contest_id=1, show_unofficial=False, name='Round 1',
+            phase='CODING', type='CF', updated_at=timezone.now())
+        self.first = standings(1, [participant('alice', 100, 1, attempts=[(100, 0, 60), (0, 0, 0)]),
+            participant('bob', 50, 2, attempts=[(50, 2, 600), (0, 0, 0)]),
+            participant('carol', 0, 3, attempts=[(0, 1, 0), (0, 0, 0)])], 'CODING', 2)
+        # bob passes alice and dave ties with carol.
+        self.second = standings(1, [participant('bob', 150, 1, attempts=[(50, 2, 600), (100, 0, 900)]),
+            participant('alice', 100, 2, attempts=[(100, 0, 60), (0, 0, 0)]),
+            participant('carol', 0, 3, attempts=[(0, 1, 0), (0, 0, 0)]),
+            participant('dave', 0, 3, attempts=[(0, 0, 0), (0, 3, 0)])], 'CODING', 2)
+
+    def test_round_trip(self):
+        first = snapshots.build_state(self.first)
+        second = snapshots.build_state(self.second, first)
+        self.assertEqual(snapshots.state_from_checkpoint(snapshots.unpack(snapshots.pack(
+            snapshots.checkpoint_data(second)))), second)
+        change_set = snapshots.unpack(snapshots.pack(snapshots.changes(first, second)))
+        state = snapshots.state_from_checkpoint(snapshots.checkpoint_data(first))
+        snapshots.apply_changes(state, change_set)
+        self.assertEqual(state, second)
+        self.assertEqual(snapshots.changes(second, second), {})
+        contest, problems, participants = snapshots.standings_from_state(second)
+        self.assertEqual([(p.username, p.rank, p.points) for p in participants],
+            [(p.username, p.rank, p.points) for p in self.second[2]])
+
+    def test_ranks(self):
+        for ranks in ([], [1, 2, 3], [1, 1, 3, 3, 3, 6], [2, 2, 2], [1, 5, 5, 9]):
+            ties, other = snapshots.encode_ranks(ranks)
+            self.assertEqual(snapshots.decode_ranks(ties, other, len(ranks)), ranks)
+
+    def test_record(self):
+        start = timezone.now()
+        self.assertTrue(snapshots.record(self.contest_row, self.first, start).is_checkpoint)
+        # Not due yet: only the time of the latest snapshot is read.
+        with self.assertNumQueries(1):
+            self.assertIsNone(snapshots.record(self.contest_row, self.second, start + timedelta(seconds=10)))
+        later = start + timedelta(seconds=120)
+        self.assertFalse(snapshots.record(self.contest_row, self.second, later).is_checkpoint)
+        taken_at, state = snapshots.state_at(self.contest_row, later)
+        self.assertEqual(state, snapshots.build_state(self.second, snapshots.build_state(self.first)))
+        # Due, but unchanged: the digest of the latest snapshot tells, without decoding the chain.
+        with self.assertNumQueries(1):
+            self.assertIsNone(snapshots.record(self.contest_row, self.second, later + timedelta(seconds=120)))
+        # The phase change is recorded right away, and nothing after it.
+        finished = standings(1, self.second[2], 'FINISHED', 2)
+        self.assertIsNotNone(snapshots.record(self.contest_row, finished, later + timedelta(seconds=1)))
+        with self.assertNumQueries(1):
+            self.assertIsNone(snapshots.record(self.contest_row, finished, later + timedelta(hours=1)))
+
+class AsyncViewTests(SimpleTestCase):
+    def test_requests_run_concurrently(self):
+        def slow_ldrbrd(request, contest_id, group):
+            time.sleep(0.3)
+            return HttpResponse()
+
+        async def four_requests():
+            request = RequestFactory().get('/ldrbrd/1/')
+            return await asyncio.gather(*[views.ldrbrd_async(request, 1) for i in range(4)])
+
+        start = time.perf_counter()
+        with mock.patch.object(views, 'ldrbrd', slow_ldrbrd):
+            async_to_sync(four_requests)()
+        # One after another, they would take 1.2 s.
+        self.assertLess(time.perf_counter() - start, 0.9)
+
+class StaticFilesTests(SimpleTestCase):
+    def test_middleware_is_async_capable(self):
+        # Under ASGI, one synchronous middleware makes Django run the chain through
+        # thread adapters.
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(getattr(import_string(path), 'async_capable', False), path)
+
+    def test_serves_files_in_async_chain(self):
+        async def get_response(request):
+            return HttpResponse('view')
+
+        with tempfile.TemporaryDirectory() as static_root:
+            with open(os.path.join(static_root, 'ldrbrd.css'), 'w') as f:
+                f.write('body {}')
+            with override_settings(STATIC_ROOT=static_root, WHITENOISE_AUTOREFRESH=False):
+                middleware = static_files_middleware(get_response)
+                static = async_to_sync(middleware)(RequestFactory().get('/static/ldrbrd.css'))
+                other = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertEqual(static.status_code, 200)
+        self.assertEqual(b''.join(static.streaming_content), b'body {}')
+        static.close()
+        self.assertEqual(other.content, b'view')
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'api'}})
+class ApiEncodingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_choose_encoding(self):
+        self.assertEqual(api.choose_encoding('GZIP, deflate'), 'gzip')
+        self.assertEqual(api.choose_encoding('gzip;q=0, identity'), None)
+        self.assertEqual(api.choose_encoding(''), None)
+        if api.brotli is not None:
+            self.assertEqual(api.choose_encoding('gzip, deflate, br'), 'br')
+            self.assertEqual(api.choose_encoding('br;q=0, gzip'), 'gzip')
+
+    def test_body_is_encoded_once_per_etag_and_encoding(self):
+        data = {'participants': ['user{}'.format(i) for i in range(100)]}
+        encode = mock.Mock(return_value=data)
+        body, encoding = api.encoded_body('"etag"', 'gzip', encode)
+        self.assertEqual(encoding, 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(body)), data)
+        self.assertEqual(api.encoded_body('"etag"', 'gzip', encode), (body, encoding))
+        self.assertEqual(encode.call_count, 1)
+
+        body, encoding = api.encoded_body('"etag"', '', encode)
+        self.assertEqual((json.loads(body), encoding), (data, None))
+        api.encoded_body('"other"', 'gzip', encode)
+        self.assertEqual(encode.call_count, 3)
+
+    def test_small_body_is_not_compressed(self):
+        body, encoding = api.encoded_body('"etag"', 'gzip', lambda: {'participants': []})
+        self.assertEqual((body, encoding), (b'{"participants":[]}', None))
+
+def parse_event(message):
+    # type: (bytes) -> Tuple[str, Any]
+    fields = dict(line.split(': ', 1) for line in message.decode('utf-8').strip().split('\n'))
+    return (fields['event'], json.loads(fields['data']))
+
+class LiveDiffTests(SimpleTestCase):
+    def snapshot(self, participants, phase='CODING'):
+        # type: (List[cf_get.Participant], str) -> live.Snapshot
+        contest, problems, participants = standings(1, participants, phase, n_problems=2)
+        return live.Snapshot(1, contest, problems, participants)
+
+    def test_diff(self):
+        old = self.snapshot([participant('alice', 100, 1, attempts=[(100, 0, 60), (0, 1, 0)]),
+            participant('bob', 50, 2, attempts=[(50, 0, 30), (0, 0, 0)]),
+            participant('carol', 10, 3, attempts=[(10, 2, 90), (0, 0, 0)])])
+        new = self.snapshot([participant('bob', 150, 1, attempts=[(50, 0, 30), (100, 1, 600)]),
+            participant('alice', 100, 2, attempts=[(100, 0, 60), (0, 1, 0)]),
+            participant('dave', 5, 3, attempts=[(5, 0, 10), (0, 0, 0)])])
+        self.assertEqual(new.diff(old), {
+            'rows': [
+                {'key': ['bob', 'CONTESTANT'], 'rank': 1, 'points': 150, 'attempts': {'1': [100, 1, 600]}},
+                {'key': ['alice', 'CONTESTANT'], 'rank': 2},
+                {'key': ['dave', 'CONTESTANT'], 'rank': 3, 'points': 5, 'is_team': 0, 'color': '',
+                    'attempts': {'0': [5, 0, 10], '1': [0, 0, 0]}},
+            ],
+            'removed': [['carol', 'CONTESTANT']],
+            'order': [['bob', 'CONTESTANT'], ['alice', 'CONTESTANT'], ['dave', 'CONTESTANT']],
+        })
+        self.assertEqual(new.diff(new), {})
+        finished = self.snapshot([participant('alice', 100, 1)], 'FINISHED')
+        self.assertEqual(finished.diff(self.snapshot([participant('alice', 100, 1)]))['contest']['phase'],
+            'FINISHED')
+
+    @override_settings(LIVE_QUEUE_SIZE=2)
+    def test_publish(self):
+        poller = live.Poller(1, False)
+        sub = live.Subscription()
+        poller.subscribe(sub)
+        poller.publish(self.snapshot([participant('alice', 100, 1)]))
+        poller.publish(self.snapshot([participant('alice', 100, 1)]))
+        poller.publish(self.snapshot([participant('alice', 200, 1)]))
+        self.assertEqual(parse_event(sub.queue.get_nowait())[0], 'snapshot')
+        # Unchanged standings send nothing.
+        self.assertEqual(parse_event(sub.queue.get_nowait()),
+            ('diff', {'rows': [{'key': ['alice', 'CONTESTANT'], 'points': 200}]}))
+
+        # A new subscriber starts from the latest snapshot.
+        late = live.Subscription()
+        poller.subscribe(late)
+        event, board = parse_event(late.queue.get_nowait())
+        self.assertEqual((event, board['participants']['points']), ('snapshot', [200]))
+
+        # A subscriber which falls behind is dropped, and reconnects.
+        for points in (300, 400, 500):
+            poller.publish(self.snapshot([participant('alice', points, 1)]))
+        self.assertTrue(sub.closed)
+        self.assertNotIn(sub, poller.subscriptions)
+
+class StubApiTestCase(TestCase):
+    """Calls the API on a local stub, started with stub_options."""
+    stub_options = {} # type: Dict[str, Any]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.saved = (cf_get.BASE_URL, cf_get.MODE, cf_get.FIXTURE_DIR, cf_get.MAX_RETRIES, cf_get.rate_limiter)
+        cls.stub = start_stub_server(**cls.stub_options)
+        cf_get.configure(base_url=cls.stub.base_url, mode='live')
+        # The stub has no call limit.
+        cf_get.rate_limiter = None
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.shutdown()
+        cls.stub.server_close()
+        cf_get.configure(base_url=cls.saved[0], mode=cls.saved[1], fixture_dir=cls.saved[2],
+            max_retries=cls.saved[3])
+        cf_get.rate_limiter = cls.saved[4]
+        super().tearDownClass()
+
+class RetryTestCase(StubApiTestCase):
+    def setUp(self):
+        self.backoff = (cf_get.BACKOFF_BASE, cf_get.BACKOFF_MAX)
+        cf_get.BACKOFF_BASE = 0.001
+
+    def tearDown(self):
+        cf_get.BACKOFF_BASE, cf_get.BACKOFF_MAX = self.backoff
+
+    def user_info(self, handles):
+        # type: (str) -> Any
+        return cf_get.log_and_request(url=self.stub.base_url + '/user.info', params={'handles': handles})
+
+class ServiceErrorRetryTests(RetryTestCase):
+    stub_options = {'error_rate': 1.0}
+
+    def test_retries_then_fails(self):
+        cf_get.configure(max_retries=2)
+        before = self.stub.status_counts[503]
+        with mock.patch.object(cf_get, 'backoff_delay', wraps=cf_get.backoff_delay) as backoff_delay:
+            with self.assertRaises(cf_get.CfApiError):
+                self.user_info('alice')
+        self.assertEqual(self.stub.status_counts[503] - before, 3)
+        self.assertEqual([call.args for call in backoff_delay.call_args_list], [(0,), (1,)])
+
+    def test_backoff_is_capped(self):
+        cf_get.BACKOFF_BASE = 1.0
+        cf_get.BACKOFF_MAX = 16.0
+        for attempt in range(8):
+            delays = [cf_get.backoff_delay(attempt) for i in range(50)]
+            self.assertTrue(all(0 <= delay <= min(16, 2 ** attempt) for delay in delays))
+
+class CallLimitRetryTests(RetryTestCase):
+    # Calls sooner than min_interval after the previous one fail with "Call limit exceeded".
+    stub_options = {'min_interval': 0.05}
+
+    def test_retries_call_limit(self):
+        cf_get.BACKOFF_BASE = 0.05
+        cf_get.configure(max_retries=10)
+        before = self.stub.status_counts[503]
+        self.user_info('alice')
+        self.assertEqual([user['handle'] for user in self.user_info('bob')], ['bob'])
+        self.assertGreater(self.stub.status_counts[503] - before, 0)
+
+    def test_not_found_is_not_retried(self):
+        time.sleep(0.05)
+        before = sum(self.stub.status_counts.values())
+        with self.assertRaises(cf_get.CfApiError) as context:
+            self.user_info('nosuch')
+        self.assertEqual(sum(self.stub.status_counts.values()) - before, 1)
+        self.assertEqual(userinfo.not_found_handle(context.exception), 'nosuch')
+
+    def test_session_is_reused(self):
+        time.sleep(0.05)
+        session = cf_get.get_session()
+        pool = session.get_adapter(self.stub.base_url).poolmanager.connection_from_url(self.stub.base_url)
+        before = pool.num_connections
+        for handle in ('alice', 'bob', 'carol'):
+            time.sleep(0.05)
+            self.user_info(handle)
+        self.assertIs(cf_get.get_session(), session)
+        # Kept alive between calls.
+        self.assertLessEqual(pool.num_connections - before, 1)
+        # A forked child process doesn't share its parent's connections.
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(cf_get.get_session(), session)
+        cf_get.reset_session()
+
+class CallLimitTests(StubApiTestCase):
+    stub_options = {'limit_rate': 1.0}
+
+    def test_comment_of_streamed_error(self):
+        cf_get.configure(max_retries=0)
+        with self.assertRaises(cf_get.CfApiError) as context:
+            cf_get.get_contest_info(1, ['alice', 'bob'], True, fetch_colors=False)
+        self.assertEqual(context.exception.comment, 'Call limit exceeded')
+
+class ServiceUnavailableTests(StubApiTestCase):
+    stub_options = {'error_rate': 1.0}
+
+    def test_comment_has_no_url(self):
+        cf_get.configure(max_retries=0)
+        with self.assertRaises(cf_get.CfApiError) as context:
+            cf_get.get_contest_info(1, ['alice', 'bob'], True, fetch_colors=False)
+        self.assertEqual(context.exception.comment, 'Codeforces API error: 503 Service Unavailable')
+        self.assertNotIn('alice', context.exception.comment)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'handles'}})
+class HandleSetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create(username='alice')
+
+    def test_snapshot_is_kept_until_version_changes(self):
+        handle_set = get_handle_set()
+        self.assertEqual(handle_set.usernames, ('alice',))
+        with self.assertNumQueries(0):
+            self.assertIs(get_handle_set(), handle_set)
+        # Another process changed the users.
+        bump_version()
+        self.assertIsNot(get_handle_set(), handle_set)
+
+    def test_user_changes_bump_version(self):
+        get_handle_set()
+        with self.captureOnCommitCallbacks(execute=True):
+            bob = User.objects.create(username='bob')
+        self.assertEqual(get_handle_set().usernames, ('alice', 'bob'))
+        handle_set = get_handle_set()
+        # A login only saves last_login.
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            bob.last_login = timezone.now()
+            bob.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+        self.assertIs(get_handle_set(), handle_set)
+        with self.captureOnCommitCallbacks(execute=True):
+            bob.delete()
+        self.assertEqual(get_handle_set().usernames, ('alice',))
+
+    def test_group_members(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            group = HandleGroup.objects.create(slug='club', name='Club')
+        self.assertEqual(get_handle_set().groups['club'].usernames, frozenset())
+        with self.captureOnCommitCallbacks(execute=True):
+            group.members.add(User.objects.get(username='alice'))
+        club = get_handle_set().groups['club']
+        self.assertEqual(club.usernames, frozenset(['alice']))
+        self.assertEqual(club.digest, store.handles_hash(['alice']))
+
+    @override_settings(HANDLE_SET_MAX_AGE=0)
+    def test_snapshot_expires(self):
+        # In case the cache isn't shared, and a bump isn't seen.
+        self.assertIsNot(get_handle_set(), get_handle_set())
+
+class UserInfoTests(TestCase):
+    def test_save_updates_existing_handles(self):
+        Handle.objects.create(username='alice', rating=1500, color='cyan')
+        alice = cf_get.CfUser({'handle': 'alice', 'rating': 2100, 'rank': 'master'})
+        bob = cf_get.CfUser({'handle': 'bob', 'rating': 1200, 'rank': 'pupil'})
+        userinfo.save_user_info([alice, bob], ['nosuch'])
+        self.assertEqual(dict(Handle.objects.values_list('username', 'rating')),
+            {'alice': 2100, 'bob': 1200, 'nosuch': 0})
+        self.assertEqual(Handle.objects.get(username='alice').color, alice.color)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'refresh'}})
+    def test_background_refresh_logs_any_error(self):
+        threads = [] # type: List[threading.Thread]
+        real_thread = threading.Thread
+
+        def thread(**kwargs):
+            # type: (Any) -> threading.Thread
+            threads.append(real_thread(**kwargs))
+            return threads[-1]
+
+        with mock.patch.object(userinfo, 'refresh_handles', side_effect=ValueError), \
+                mock.patch.object(userinfo.threading, 'Thread', thread), \
+                self.assertLogs('main.userinfo', 'WARNING') as logs:
+            userinfo.refresh_in_background(['alice'])
+            threads[0].join()
+        self.assertIn('ValueError', logs.output[0])
+        # The lock is released, so the next refresh runs.
+        self.assertIsNone(cache.get('handles:refreshing'))
+
+@override_settings(IMPORT_MAX_WEB_HANDLES=2,
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ImportTests(StubApiTestCase):
+    def test_web_import_is_capped(self):
+        response = self.client.post('/', {'usernames': 'alice bob carol'})
+        self.assertContains(response, 'At most 2 users can be added at once')
+        self.assertFalse(User.objects.exists())
+
+    def test_missing_handles_count_as_calls(self):
+        before = sum(self.stub.status_counts.values())
+        outcomes = importing.import_handles(['nosuch1', 'nosuch2', 'alice'], max_calls=2)
+        self.assertEqual(sum(self.stub.status_counts.values()) - before, 2)
+        self.assertEqual(outcomes, {'nosuch1': importing.NOT_FOUND, 'nosuch2': importing.NOT_FOUND,
+            'alice': importing.UNCHECKED})
+        self.assertEqual(importing.import_handles(['nosuch1', 'alice'], max_calls=2),
+            {'nosuch1': importing.NOT_FOUND, 'alice': importing.CREATED})
+
+    def test_unreachable_api(self):
+        self.stub.shutdown()
+        self.stub.server_close()
+        cf_get.configure(max_retries=0)
+        try:
+            self.assertEqual(importing.import_handles(['alice', 'bob']),
+                {'alice': importing.FAILED, 'bob': importing.FAILED})
+        finally:
+            self.stub = start_stub_server(**self.stub_options)
+            cf_get.configure(base_url=self.stub.base_url)
+
+class ChunkedFetchTests(StubApiTestCase):
+    def test_merge_keeps_order_and_drops_duplicates(self):
+        team = cf_get.Participant({'party': {'teamName': 'team', 'members': [{'handle': 'bob'}, {'handle': 'carol'}],
+            'participantType': 'CONTESTANT'}, 'rank': 2, 'points': 90, 'problemResults': []})
+        # A team is returned for each chunk which has one of its members.
+        first = [participant('alice', 100, 1), team, participant('dave', 80, 4), participant('erin', 0, 0, 'PRACTICE')]
+        second = [team, participant('frank', 85, 3), participant('grace', 0, 0, 'PRACTICE')]
+        merged = cf_get.merge_participants([first, second])
+        self.assertEqual([p.username for p in merged], ['alice', 'team', 'frank', 'dave', 'erin', 'grace'])
+
+    def test_chunks_match_one_request(self):
+        handles = ['user{}'.format(i) for i in range(20)]
+        whole = cf_get.get_contest_info(1, handles, True, fetch_colors=False)[2]
+        saved = cf_get.HANDLES_PER_REQUEST
+        cf_get.configure(handles_per_request=3)
+        before = sum(self.stub.status_counts.values())
+        try:
+            chunked = cf_get.get_contest_info(1, handles, True, fetch_colors=False)[2]
+        finally:
+            cf_get.configure(handles_per_request=saved)
+        self.assertEqual(sum(self.stub.status_counts.values()) - before, 7)
+        self.assertEqual(sorted(p.username for p in chunked), sorted(p.username for p in whole))
+        self.assertEqual([p.rank for p in chunked], [p.rank for p in whole])
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'ldrbrd'}}, STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class LeaderboardResponseTests(StubApiTestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.bulk_create([User(username='alice'), User(username='bob')])
+        # Known colors, so that no background refresh writes to the database.
+        userinfo.save_user_info(cf_get.get_user_info(['alice', 'bob']))
+        bump_version()
+
+    def test_not_modified(self):
+        response = self.client.get('/ldrbrd/1/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with mock.patch.object(views, 'render_to_string', wraps=views.render_to_string) as render:
+            response = self.client.get('/ldrbrd/1/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response['ETag'], etag)
+            # Without a validator, the table comes from the render cache.
+            response = self.client.get('/ldrbrd/1/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['ETag'], etag)
+            render.assert_not_called()
+
+    def test_api_compression_and_not_modified(self):
+        response = self.client.get('/api/ldrbrd/1/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(sorted(data['participants']['username']), ['alice', 'bob'])
+
+        response = self.client.get('/api/ldrbrd/1/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_groups_share_one_fetch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            group = HandleGroup.objects.create(slug='club', name='Club')
+            group.members.add(User.objects.get(username='bob'))
+        before = self.stub.status_counts[200]
+        everyone = json.loads(self.client.get('/api/ldrbrd/1/').content)
+        club = json.loads(self.client.get('/api/group/club/ldrbrd/1/').content)
+        self.assertEqual(self.stub.status_counts[200] - before, 1)
+        self.assertEqual(sorted(everyone['participants']['username']), ['alice', 'bob'])
+        self.assertEqual((club['participants']['username'], club['participants']['intra_rank']), (['bob'], [1]))
+        self.assertEqual(self.client.get('/group/nosuch/ldrbrd/1/').status_code, 404)
+
+    def test_new_color_changes_etag(self):
+        etag = self.client.get('/ldrbrd/1/')['ETag']
+        userinfo.save_user_info([cf_get.CfUser({'handle': 'alice', 'rating': 3000, 'rank': 'legendary grandmaster'})])
+        response = self.client.get('/ldrbrd/1/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+class RecordReplayTests(StubApiTestCase):
+    def setUp(self):
+        fixture_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(fixture_dir.cleanup)
+        self.addCleanup(cf_get.configure, mode='live', fixture_dir=cf_get.FIXTURE_DIR)
+        cf_get.configure(mode='record', fixture_dir=fixture_dir.name)
+
+    def standings_rows(self, handles):
+        # type: (List[str]) -> List[Tuple[str, int, float]]
+        return [(p.username, p.rank, p.points) for p in cf_get.get_contest_info(1, handles, False)[2]]
+
+    def test_replay_recorded_calls(self):
+        handles = ['alice', 'bob', 'carol']
+        recorded = self.standings_rows(handles)
+        with self.assertRaises(cf_get.CfApiError):
+            cf_get.get_user_info(['nosuch'])
+
+        cf_get.configure(mode='replay')
+        before = sum(self.stub.status_counts.values())
+        # Handles in another order are the same call.
+        self.assertEqual(self.standings_rows(list(reversed(handles))), recorded)
+        # Errors are replayed too.
+        with self.assertRaises(cf_get.CfApiError) as cm:
+            cf_get.get_user_info(['nosuch'])
+        self.assertIn('nosuch', cm.exception.comment)
+        self.assertEqual(sum(self.stub.status_counts.values()), before)
+
+    def test_missing_fixture(self):
+        cf_get.configure(mode='replay')
+        with self.assertRaises(cf_get.CfApiError) as cm:
+            cf_get.get_user_info(['alice'])
+        self.assertIn('No recorded response', cm.exception.comment)
+
+# Numbers of handles the query budgets are checked with. Counts must not depend
+# on them. They are small, so that SQLite doesn't split bulk inserts into batches.
+BUDGET_SIZES = (3, 15)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'query_budget'}}, SHOW_ADD_USERS_PAGE=True,
+    # There is no manifest without collectstatic.
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class QueryBudgetTests(StubApiTestCase):
+    """
+    The leaderboard and index views make at most a fixed number of database
+    queries, however many handles are registered. Raise a budget only with a
+    reason: a query per handle or participant shows up as a failure at one size.
+    """
+
+    def register(self, size):
+        # type: (int) -> List[str]
+        # Each size has only its own users, so each sees the same state.
+        User.objects.all().delete()
+        cache.clear()
+        usernames = ['user{}x{}'.format(size, i) for i in range(size)]
+        User.objects.bulk_create([User(username=username) for username in usernames])
+        userinfo.save_user_info(cf_get.get_user_info(usernames))
+        bump_version()
+        return usernames
+
+    def get(self, path, queries):
+        # type: (str, int) -> None
+        with self.assertNumQueries(queries):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+
+    def test_ldrbrd(self):
+        for contest_id, size in enumerate(BUDGET_SIZES, 1):
+            with self.subTest(size=size):
+                self.register(size)
+                url = '/ldrbrd/{}/'.format(contest_id)
+                # Handle set, stored contest (created in a savepoint), saving the
+                # standings and season scores, the snapshot check and colors.
+                self.get(url, 19)
+                # Colors.
+                self.get(url, 1)
+                cache.clear()
+                # Handle set, contest, problems, participants, attempts and colors.
+                self.get(url, 8)
+
+    def test_index(self):
+        for size in BUDGET_SIZES:
+            with self.subTest(size=size):
+                usernames = self.register(size)
+                # Users and handle groups, for the handle set.
+                self.get('/', 3)
+                # The handle set is cached.
+                self.get('/', 0)
+                new_handles = ['new{}x{}'.format(size, i) for i in range(size)]
+                # Existing users, inserts and updates of users and handles, and the handle set.
+                with self.assertNumQueries(10):
+                    response = self.client.post('/', {'usernames': ' '.join(usernames[:1] + new_handles)})
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,318 @@
+"""
+Per-request timings and process-wide metrics.
+
+timing_middleware records how long each phase of a request took: Codeforces
+API calls (through cf_get.request_hooks), database queries, and the spans
+which views mark with span(name). The totals are sent in a Server-Timing
+header, so they show up in the network panel of browsers, and are logged
+as one line per request on the "main.timing" logger.
+
+Metrics are kept in memory by each process, and served at /metrics in the
+Prometheus text format: latency histograms of API calls and of requests,
+and hit/miss counters of the caches. Each process stores its metrics in the
+cache under its own key, at most every METRICS_PUBLISH_INTERVAL seconds, and
+/metrics sums those of all processes which share the cache. With a process
+local cache (locmem) that is only the process which serves /metrics; with
+the file cache, all processes on the machine (the dyno); with the database
+cache, all of them. Counters drop when a process stops publishing (e.g. it
+is restarted) for METRICS_PROCESS_TIMEOUT, which Prometheus treats as a reset.
+"""
+
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils.decorators import sync_and_async_middleware
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[str, ...]
+
+class Timings:
+    """Total time and count of each named span of one request."""
+
+    def __init__(self):
+        # type: () -> None
+        self.lock = threading.Lock()
+        # API calls run on several threads at once.
+        self.spans = OrderedDict() # type: OrderedDict[str, List[float]]
+
+    def add(self, name, seconds):
+        # type: (str, float) -> None
+        with self.lock:
+            span = self.spans.setdefault(name, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        # type: (Callable[..., Any], str, Any, bool, Dict[str, Any]) -> Any
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - start)
+
+    def server_timing(self, total):
+        # type: (float) -> str
+        with self.lock:
+            items = list(self.spans.items())
+        parts = []
+        for name, (seconds, count) in items:
+            part = '{};dur={:.1f}'.format(name, seconds * 1000)
+            if count > 1:
+                part += ';desc="{} calls"'.format(count)
+            parts.append(part)
+        parts.append('total;dur={:.1f}'.format(total * 1000))
+        return ', '.join(parts)
+
+_timings = contextvars.ContextVar('timings', default=None) # type: contextvars.ContextVar[Optional[Timings]]
+
+@contextlib.contextmanager
+def span(name):
+    # type: (str) -> Iterator[None]
+    """Add the time spent in the block to the span name of the current request, if any."""
+    timings = _timings.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add(name, time.perf_counter() - start)
+
+def _format_labels(names, values, extra=''):
+    # type: (Sequence[str], Labels, str) -> str
+    pairs = ['{}="{}"'.format(name, value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_number(value):
+    # type: (float) -> str
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+# Every metric, in the order they are served.
+METRICS = [] # type: List[Any]
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, label_names):
+        # type: (str, str, Sequence[str]) -> None
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.lock = threading.Lock()
+        self.values = {} # type: Dict[Labels, float]
+        METRICS.append(self)
+
+    def inc(self, labels, amount=1):
+        # type: (Labels, float) -> None
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def snapshot(self):
+        # type: () -> List[Tuple[Labels, float]]
+        with self.lock:
+            return list(self.values.items())
+
+    def lines(self, snapshots):
+        # type: (Sequence[List[Tuple[Labels, float]]]) -> List[str]
+        values = {} # type: Dict[Labels, float]
+        for snapshot in snapshots:
+            for labels, value in snapshot:
+                values[tuple(labels)] = values.get(tuple(labels), 0) + value
+        return metric_lines(self.name, self.help, self.kind, self.label_names, sorted(values.items()))
+
+class Callback(Counter):
+    """A counter or gauge whose values are read from func() when they are published."""
+
+    def __init__(self, name, help, kind, label_names, func):
+        # type: (str, str, str, Sequence[str], Callable[[], List[Tuple[Labels, float]]]) -> None
+        super().__init__(name, help, label_names)
+        self.kind = kind
+        self.func = func
+
+    def snapshot(self):
+        # type: () -> List[Tuple[Labels, float]]
+        return self.func()
+
+class Histogram:
+    def __init__(self, name, help, label_names, buckets):
+        # type: (str, str, Sequence[str], Sequence[float]) -> None
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = list(buckets)
+        self.lock = threading.Lock()
+        # Per label values: counts of each bucket (not cumulative), sum, count.
+        self.series = {} # type: Dict[Labels, Tuple[List[int], List[float]]]
+        METRICS.append(self)
+
+    def observe(self, labels, value):
+        # type: (Labels, float) -> None
+        with self.lock:
+            if labels not in self.series:
+                self.series[labels] = ([0] * (len(self.buckets) + 1), [0.0, 0])
+            counts, totals = self.series[labels]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def snapshot(self):
+        # type: () -> List[Tuple[Labels, List[int], List[float]]]
+        with self.lock:
+            return [(labels, list(counts), list(totals)) for labels, (counts, totals) in self.series.items()]
+
+    def lines(self, snapshots):
+        # type: (Sequence[List[Tuple[Labels, List[int], List[float]]]]) -> List[str]
+        series = {} # type: Dict[Labels, Tuple[List[int], List[float]]]
+        for snapshot in snapshots:
+            for labels, counts, totals in snapshot:
+                merged = series.setdefault(tuple(labels), ([0] * len(counts), [0.0, 0]))
+                for i, n in enumerate(counts):
+                    merged[0][i] += n
+                merged[1][0] += totals[0]
+                merged[1][1] += totals[1]
+        lines = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} histogram'.format(self.name)]
+        for labels, (counts, (total, count)) in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + [float('inf')], counts):
+                cumulative += n
+                le = 'le="{}"'.format('+Inf' if bound == float('inf') else _format_number(bound))
+                lines.append('{}_bucket{} {}'.format(self.name,
+                    _format_labels(self.label_names, labels, le), cumulative))
+            lines.append('{}_sum{} {}'.format(self.name, _format_labels(self.label_names, labels),
+                _format_number(total)))
+            lines.append('{}_count{} {}'.format(self.name, _format_labels(self.label_names, labels),
+                int(count)))
+        return lines
+
+def metric_lines(name, help, kind, label_names, values):
+    # type: (str, str, str, Sequence[str], List[Tuple[Labels, float]]) -> List[str]
+    lines = ['# HELP {} {}'.format(name, help), '# TYPE {} {}'.format(name, kind)]
+    for labels, value in values:
+        lines.append('{}{} {}'.format(name, _format_labels(label_names, labels), _format_number(value)))
+    return lines
+
+UPSTREAM_LATENCY = Histogram('cf_api_request_duration_seconds',
+    'Codeforces API calls, including rate limiting, retries and reading the body.',
+    ['method', 'status'], [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40])
+REQUEST_LATENCY = Histogram('ldrbrd_request_duration_seconds', 'Requests, by view.',
+    ['view'], [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10])
+CACHE_LOOKUPS = Counter('ldrbrd_cache_lookups_total',
+    'Lookups in the standings, render, API body and handle set caches.', ['cache', 'result'])
+
+PROCESSES_KEY = 'metrics:processes'
+PROCESS_KEY = 'metrics:process:{}:{}'.format(socket.gethostname(), os.getpid())
+
+_publish_lock = threading.Lock()
+_published_at = None # type: Optional[float]
+
+def publish_due():
+    # type: () -> bool
+    return _published_at is None or time.monotonic() - _published_at >= settings.METRICS_PUBLISH_INTERVAL
+
+def publish():
+    # type: () -> None
+    """Store the metrics of this process in the cache, where /metrics finds them."""
+    global _published_at
+    with _publish_lock:
+        _published_at = time.monotonic()
+        cache.set(PROCESS_KEY, {metric.name: metric.snapshot() for metric in METRICS},
+            settings.METRICS_PROCESS_TIMEOUT)
+        # Another process may register at the same time and drop this key;
+        # it is added again on the next publish.
+        processes = cache.get(PROCESSES_KEY) or []
+        if PROCESS_KEY not in processes:
+            cache.set(PROCESSES_KEY, processes + [PROCESS_KEY], None)
+
+def record_api_call(method, status_code, seconds):
+    # type: (str, Optional[int], float) -> None
+    """Hook for cf_get.request_hooks."""
+    UPSTREAM_LATENCY.observe((method, str(status_code) if status_code is not None else 'error'), seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings.add('cf_' + method.replace('.', '_'), seconds)
+
+def cache_lookup(cache_name, result):
+    # type: (str, str) -> None
+    CACHE_LOOKUPS.inc((cache_name, result))
+
+def render_metrics(extra_lines=()):
+    # type: (Sequence[str]) -> str
+    """The metrics of all processes which share the cache, summed."""
+    publish()
+    processes = cache.get(PROCESSES_KEY) or []
+    snapshots = cache.get_many(processes)
+    if len(snapshots) < len(processes):
+        # Forget processes which haven't published for METRICS_PROCESS_TIMEOUT.
+        cache.set(PROCESSES_KEY, [key for key in processes if key in snapshots], None)
+    lines = [] # type: List[str]
+    for metric in METRICS:
+        lines += metric.lines([snapshot[metric.name] for snapshot in snapshots.values()
+            if metric.name in snapshot])
+    lines += extra_lines
+    return '\n'.join(lines) + '\n'
+
+@sync_and_async_middleware
+def timing_middleware(get_response):
+    # type: (Any) -> Any
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            # type: (Any) -> Any
+            timings = Timings()
+            token = _timings.set(timings)
+            start = time.perf_counter()
+            try:
+                # Views run their queries on other threads; they are timed by the
+                # spans around them, since execute_wrapper is per connection.
+                response = await get_response(request)
+            finally:
+                _timings.reset(token)
+            finish(request, response, timings, time.perf_counter() - start)
+            if publish_due():
+                # The cache may be the database, which can't be used from the event loop.
+                await sync_to_async(publish)()
+            return response
+    else:
+        def middleware(request):
+            # type: (Any) -> Any
+            timings = Timings()
+            token = _timings.set(timings)
+            start = time.perf_counter()
+            try:
+                with connection.execute_wrapper(timings.db_wrapper):
+                    response = get_response(request)
+            finally:
+                _timings.reset(token)
+            finish(request, response, timings, time.perf_counter() - start)
+            if publish_due():
+                publish()
+            return response
+    return middleware
+
+def finish(request, response, timings, total):
+    # type: (Any, Any, Timings, float) -> None
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match is not None else 'unresolved'
+    REQUEST_LATENCY.observe((view,), total)
+    response['Server-Timing'] = timings.server_timing(total)
+    spans = {name: round(seconds * 1000, 1) for name, (seconds, count) in timings.spans.items()}
+    logger.info('%s %s status=%d view=%s total_ms=%.1f%s', request.method, request.path,
+        response.status_code, view, total * 1000,
+        ''.join(' {}_ms={}'.format(name, ms) for name, ms in spans.items()),
+        extra={'view': view, 'status': response.status_code, 'total_ms': round(total * 1000, 1),
+            'spans_ms': spans})
@@ -0,0 +1,151 @@
+"""
+Cached Codeforces profile data (rating, rank, color) of handles.
+
+Leaderboards color usernames from the Handle table and never wait for
+user.info. Handles which are missing or older than CF_HANDLE_INFO_MAX_AGE
+are refreshed on a background thread, in chunks small enough for the API's
+URL length limit.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import cf_get
+from .models import Handle
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND_PREFIX = 'handles: User with handle '
+NOT_FOUND_SUFFIX = ' not found'
+
+def not_found_handle(error):
+    # type: (cf_get.CfApiError) -> str
+    # user.info fails as a whole if any handle doesn't exist; find out which one.
+    comment = error.comment
+    if comment.startswith(NOT_FOUND_PREFIX) and comment.endswith(NOT_FOUND_SUFFIX):
+        return comment[len(NOT_FOUND_PREFIX):-len(NOT_FOUND_SUFFIX)]
+    return ''
+
+def fetch_user_info(usernames, priority=cf_get.PRIORITY_INTERACTIVE, max_calls=None):
+    # type: (List[str], int, Optional[int]) -> Tuple[List[cf_get.CfUser], List[str], List[str]]
+    """
+    Call user.info for one chunk of handles, once more for each handle which
+    doesn't exist. Returns the users found, the handles which don't exist, and
+    the handles left unchecked when max_calls calls have been made.
+    """
+    usernames = list(usernames)
+    invalid = [] # type: List[str]
+    calls = 0
+    while usernames:
+        if max_calls is not None and calls >= max_calls:
+            return ([], invalid, usernames)
+        calls += 1
+        try:
+            return (cf_get.get_user_info(usernames, priority), invalid, [])
+        except cf_get.CfApiError as e:
+            bad = not_found_handle(e)
+            lowered = [u.lower() for u in usernames]
+            if not bad or bad.lower() not in lowered:
+                raise
+            invalid.append(usernames.pop(lowered.index(bad.lower())))
+    return ([], invalid, [])
+
+PROFILE_FIELDS = ['first_name', 'last_name', 'rating', 'rank', 'color', 'updated_at']
+
+@transaction.atomic
+def save_user_info(cf_users, invalid=()):
+    # type: (List[cf_get.CfUser], Iterable[str]) -> None
+    now = timezone.now()
+    handles = {} # type: Dict[str, Handle]
+    # Handles which don't exist are remembered too, so they aren't re-queried on every view.
+    for username in invalid:
+        handles[username] = Handle(username=username, updated_at=now)
+    for cf_user in cf_users:
+        handles[cf_user.username] = Handle(
+            username=cf_user.username,
+            first_name=cf_user.first_name,
+            last_name=cf_user.last_name,
+            rating=cf_user.rating,
+            rank=cf_user.rank,
+            color=cf_user.color,
+            updated_at=now,
+        )
+    # Locked in a fixed order, so that concurrent refreshes of overlapping chunks don't deadlock.
+    existing = list(Handle.objects.select_for_update().filter(username__in=handles).order_by('username'))
+    for row in existing:
+        handle = handles.pop(row.username)
+        for field in PROFILE_FIELDS:
+            setattr(row, field, getattr(handle, field))
+    Handle.objects.bulk_update(existing, PROFILE_FIELDS)
+    # Another process may insert the same new handles first; its data is as fresh.
+    Handle.objects.bulk_create(handles.values(), ignore_conflicts=True)
+
+def refresh_handles(usernames, priority=cf_get.PRIORITY_BACKGROUND):
+    # type: (Iterable[str], int) -> List[str]
+    """Refresh profile data of handles, chunk by chunk. Returns handles which don't exist."""
+    invalid = [] # type: List[str]
+    for chunk in cf_get.chunked(sorted(set(usernames)), settings.CF_API_HANDLES_PER_REQUEST):
+        cf_users, chunk_invalid, _ = fetch_user_info(chunk, priority)
+        save_user_info(cf_users, chunk_invalid)
+        invalid.extend(chunk_invalid)
+    return invalid
+
+def stale_handles(usernames):
+    # type: (Iterable[str]) -> Set[str]
+    usernames = set(usernames)
+    cutoff = timezone.now() - timedelta(seconds=settings.CF_HANDLE_INFO_MAX_AGE)
+    fresh = Handle.objects.filter(username__in=usernames, updated_at__gte=cutoff)
+    return usernames - set(fresh.values_list('username', flat=True))
+
+def refresh_in_background(usernames):
+    # type: (Iterable[str]) -> None
+    lock_key = 'handles:refreshing'
+    if not cache.add(lock_key, 1, settings.CF_HANDLE_REFRESH_TIMEOUT):
+        return
+    usernames = list(usernames)
+
+    def refresh():
+        # type: () -> None
+        try:
+            refresh_handles(usernames)
+        except Exception:
+            # Not only API errors: anything else would end the thread without a trace.
+            logger.warning('Background refresh of %d handles failed', len(usernames), exc_info=True)
+        finally:
+            cache.delete(lock_key)
+            connection.close()
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+def get_colors(usernames):
+    # type: (Iterable[str]) -> Dict[str, str]
+    """
+    Return known colors of handles without calling the API.
+    Missing and stale handles are refreshed in the background.
+    """
+    usernames = set(usernames)
+    rows = Handle.objects.filter(username__in=usernames).values_list('username', 'color', 'updated_at')
+    cutoff = timezone.now() - timedelta(seconds=settings.CF_HANDLE_INFO_MAX_AGE)
+    colors = {}
+    fresh = set()
+    for username, color, updated_at in rows:
+        colors[username] = color
+        if updated_at is not None and updated_at >= cutoff:
+            fresh.add(username)
+    if usernames - fresh:
+        refresh_in_background(usernames - fresh)
+    return colors
+
+def apply_colors(participants):
+    # type: (Iterable[cf_get.Participant]) -> None
+    participants = [p for p in participants if not p.is_team]
+    colors = get_colors(p.username for p in participants)
+    for p in participants:
+        p.color = colors.get(p.username, '')
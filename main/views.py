@@ -1,8 +1,31 @@
-from django.http import HttpResponse, Http404
-from django.shortcuts import render
-from django.contrib.auth.models import User
-from .cf_get import get_contest_info, get_user_info, CfApiError
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, Http404
+from django.shortcuts import get_object_or_404, render
+from django.template.loader import get_template, render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+from .cf_get import CfApiError
+from .caching import get_standings_entry
+from .handles import get_handle_set
+from . import api
+from . import importing
+from . import live
+from . import snapshots
+from .groups import group_participants, set_intra_ranks
+from .models import Contest, Season
+from .templatetags.assets import critical_css_text
+from .timing import cache_lookup, metric_lines, render_metrics, span
+from .userinfo import apply_colors, get_colors
+from .worker import METRICS_KEY
 from django.conf import settings
+from typing import Dict, List
 
 def base_response(request, body, title=None):
     context_dict = {"base_body": body}
@@ -10,64 +33,282 @@ def base_response(request, body, title=None):
         context_dict["base_title"] = title
     return render(request, "base.html", context_dict)
 
-def ldrbrd(request, contest_id=None):
+def parse_ldrbrd_args(params, contest_id, group=None):
+    # params are the query parameters, e.g. request.GET.
     try:
-        contest_id = int(contest_id or request.GET.get('contest'))
+        contest_id = int(contest_id or params.get('contest'))
     except (TypeError, ValueError):
         raise Http404('Invalid Contest ID')
     try:
-        show_unofficial = request.GET['show_unofficial'].lower() not in ('false', '0', '')
+        show_unofficial = params['show_unofficial'].lower() not in ('false', '0', '')
     except KeyError:
         show_unofficial = settings.SHOW_UNOFFICIAL
+    group = group or params.get('group') or None
+    return (contest_id, show_unofficial, group)
 
-    usernames = User.objects.values_list('username', flat=True)
+def ldrbrd_args(request, contest_id, group=None):
+    return parse_ldrbrd_args(request.GET, contest_id, group)
 
+def get_ldrbrd_context(contest_id, show_unofficial, group_slug=None):
+    with span('handles'):
+        handle_set = get_handle_set()
+    group = None
+    if group_slug is not None:
+        group = handle_set.groups.get(group_slug)
+        if group is None:
+            raise Http404('No such group')
     try:
-        contest, problems, participants = get_contest_info(contest_id, usernames, show_unofficial)
+        # Always for all registered handles, so that groups share upstream calls.
+        with span('standings'):
+            entry = get_standings_entry(contest_id, handle_set.usernames, show_unofficial, handle_set.digest)
     except CfApiError as e:
-        raise Http404(e.response.json()['comment'])
-    else:
-        context = {
-            "contest_id": contest_id,
-            "contest": contest,
-            "problems": problems,
-            "participants": participants,
-        }
+        raise Http404(e.comment)
+    contest, problems, participants = entry['value']
+    # Identifies the set of participants in ETags, besides the standings digest.
+    scope = ''
+    if group is not None:
+        participants = group_participants(participants, group.usernames)
+        scope = 'group:{}:{}'.format(group.slug, group.digest)
+    set_intra_ranks(participants)
+    with span('colors'):
+        apply_colors(participants)
+    base_path = '/ldrbrd/{}/'.format(contest_id)
+    if group is not None:
+        base_path = '/group/{}'.format(group.slug) + base_path
+    return {
+        "contest_id": contest_id,
+        "show_unofficial": show_unofficial,
+        "group": group,
+        "base_path": base_path,
+        "contest": contest,
+        "problems": problems,
+        "participants": participants,
+        "standings_digest": entry['digest'],
+        "scope": scope,
+        "etag": ldrbrd_etag(templates_version() + scope, contest_id, entry['digest'], participants),
+        "last_modified": int(entry['fetched_at']),
+        "live_poll_interval": settings.LIVE_POLL_INTERVAL,
+    }
+
+@lru_cache()
+def templates_version():
+    # type: () -> str
+    # Rendered pages depend on templates and the stylesheets inlined in
+    # them too, which can change across deploys.
+    sources = [get_template(name).template.source for name in
+        ("base.html", "ldrbrd.html", "ldrbrd_table.html")]
+    sources.append(critical_css_text('ldrbrd'))
+    return hashlib.sha1(''.join(sources).encode('utf-8')).hexdigest()
+
+def ldrbrd_etag(version, contest_id, standings_digest, participants):
+    # version identifies the representation (templates or API encoding).
+    h = hashlib.sha1()
+    h.update(version.encode('utf-8'))
+    h.update(str(contest_id).encode('utf-8'))
+    h.update(standings_digest.encode('utf-8'))
+    # Colors come from the Handle table, not from the cached standings.
+    h.update(';'.join(p.color for p in participants).encode('utf-8'))
+    return '"{}"'.format(h.hexdigest())
+
+def render_table(context):
+    key = 'ldrbrd_html:' + context['etag'].strip('"')
+    html = cache.get(key)
+    cache_lookup('render', 'hit' if html is not None else 'miss')
+    if html is None:
+        html = render_to_string("ldrbrd_table.html", context)
+        cache.set(key, html, settings.LDRBRD_RENDER_CACHE_TTL)
+    return mark_safe(html)
+
+def ldrbrd_response(request, context):
+    response = get_conditional_response(request, etag=context['etag'],
+        last_modified=context['last_modified'])
+    if response is None:
+        with span('render'):
+            context['table_html'] = render_table(context)
+            response = render(request, "ldrbrd.html", context)
+    response['ETag'] = context['etag']
+    response['Last-Modified'] = http_date(context['last_modified'])
+    # Standings change while a contest runs, so browsers must always revalidate.
+    patch_cache_control(response, no_cache=True)
+    return response
+
+def ldrbrd(request, contest_id=None, group=None):
+    contest_id, show_unofficial, group = ldrbrd_args(request, contest_id, group)
+    context = get_ldrbrd_context(contest_id, show_unofficial, group)
+    return ldrbrd_response(request, context)
+
+def _ldrbrd_off_thread(request, contest_id, group):
+    # Runs on an executor thread of its own. Django only closes the connections
+    # of request threads, so this thread's are closed before it is reused.
+    try:
+        return ldrbrd(request, contest_id, group)
+    finally:
+        connections.close_all()
+
+async def ldrbrd_async(request, contest_id=None, group=None):
+    # Same as ldrbrd, for ASGI servers. The event loop isn't blocked while
+    # standings are fetched. Not thread sensitive: Django 3.2 runs all
+    # thread-sensitive code of a process on one thread, one request at a time.
+    return await sync_to_async(_ldrbrd_off_thread, thread_sensitive=False)(request, contest_id, group)
+
+def ldrbrd_api(request, contest_id, group=None):
+    try:
+        contest_id, show_unofficial, group = ldrbrd_args(request, contest_id, group)
+        context = get_ldrbrd_context(contest_id, show_unofficial, group)
+    except Http404 as e:
+        return JsonResponse({'error': str(e)}, status=404)
+    # Weak, because the same ETag is used for every Content-Encoding.
+    etag = 'W/' + ldrbrd_etag('api' + api.ENCODING_VERSION + context['scope'], contest_id,
+        context['standings_digest'], context['participants'])
+    response = get_conditional_response(request, etag=etag, last_modified=context['last_modified'])
+    if response is None:
+        with span('encode'):
+            body, encoding = api.encoded_body(etag, request.META.get('HTTP_ACCEPT_ENCODING', ''),
+                lambda: api.encode_standings(contest_id, context['contest'], context['problems'],
+                    context['participants']))
+        response = HttpResponse(body, content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Content-Length'] = str(len(body))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(context['last_modified'])
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+def ldrbrd_history(request, contest_id, group=None):
+    # The leaderboard at the time given by ?at=<unix time> or ?minute=<minutes
+    # since the start>, from recorded snapshots (see main.snapshots).
+    contest_id, show_unofficial, group = ldrbrd_args(request, contest_id, group)
+    handle_set = get_handle_set()
+    if group is not None and group not in handle_set.groups:
+        raise Http404('No such group')
+    contest_row = get_object_or_404(Contest, contest_id=contest_id, show_unofficial=show_unofficial)
+    minute = None
+    try:
+        if 'minute' in request.GET:
+            minute = int(request.GET['minute'])
+            start = snapshots.start_time(contest_row)
+            if start is None:
+                raise Http404('No snapshots of this contest')
+            when = start + timedelta(minutes=minute)
+        elif 'at' in request.GET:
+            when = datetime.fromtimestamp(int(request.GET['at']), dt_timezone.utc)
+        else:
+            when = datetime.now(dt_timezone.utc)
+    except (ValueError, OverflowError):
+        raise Http404('Invalid time')
+    with span('snapshots'):
+        result = snapshots.standings_at(contest_row, when)
+    if result is None:
+        raise Http404('No snapshots of this contest at that time')
+    taken_at, (contest, problems, participants) = result
+    if group is not None:
+        participants = group_participants(participants, handle_set.groups[group].usernames)
+    set_intra_ranks(participants)
+    with span('colors'):
+        apply_colors(participants)
+    context = {
+        "contest_id": contest_id,
+        "show_unofficial": show_unofficial,
+        "group": handle_set.groups.get(group) if group is not None else None,
+        "contest": contest,
+        "problems": problems,
+        "participants": participants,
+        "taken_at": taken_at,
+        "minute": minute,
+    }
+    with span('render'):
+        context['table_html'] = mark_safe(render_to_string("ldrbrd_table.html", context))
         return render(request, "ldrbrd.html", context)
 
+def ldrbrd_live(request, contest_id, group=None):
+    # A Server-Sent Events stream which holds a worker thread as long as
+    # the page is open, so it needs a threaded server (see gunicorn_conf.py).
+    # Under ASGI, streams are served by live.asgi_app instead.
+    contest_id, show_unofficial, group = ldrbrd_args(request, contest_id, group)
+    if group is not None and group not in get_handle_set().groups:
+        raise Http404('No such group')
+    if not live.acquire_stream():
+        # Leaves threads for other requests. EventSource doesn't reconnect
+        # after a 204, and live.js polls the JSON API instead.
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(live.ThreadedStream(contest_id, show_unofficial, group),
+        content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stops nginx-like proxies from buffering events.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def metrics(request):
+    if not settings.SHOW_METRICS_PAGE:
+        raise Http404('metrics page has been disabled')
+    lines = [] # type: List[str]
+    # Reported by the refresh worker, which is a separate process.
+    worker = cache.get(METRICS_KEY)
+    if worker is not None:
+        for name in ('queue_depth', 'in_flight', 'scheduled_contests', 'lag', 'max_lag', 'updated_at'):
+            lines += metric_lines('refresh_worker_' + name, 'Refresh worker ' + name.replace('_', ' ') + '.',
+                'gauge', [], [((), worker[name])])
+        for name in ('refreshed', 'failed'):
+            lines += metric_lines('refresh_worker_' + name + '_total', 'Refresh worker jobs ' + name + '.',
+                'counter', [], [((), worker[name])])
+    return HttpResponse(render_metrics(lines), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def season(request, slug):
+    season = get_object_or_404(Season, slug=slug)
+    scores = list(season.scores.filter(contests__gt=0).order_by('-points', 'username'))
+    colors = get_colors(score.username for score in scores)
+    for score in scores:
+        score.color = colors.get(score.username, '')
+    context = {
+        "season": season,
+        "scores": scores,
+        "contest_ids": season.contests.values_list('contest_id', flat=True),
+    }
+    return render(request, "season.html", context)
+
 def index(request):
     if not settings.SHOW_ADD_USERS_PAGE:
         raise Http404('add_users page has been disabled')
     context = {}
     if request.method == 'POST':
-        if "usernames" in request.POST and request.POST["usernames"]:
-            usernames = request.POST["usernames"]
+        handles = importing.parse_handles(request.POST.get("usernames", ""))
+        if "csv_file" in request.FILES:
             try:
-                cf_users = get_user_info([usernames])
-            except CfApiError as e:
-                message = e.response.json()['comment']
-                if message.startswith("handles: "):
-                    message = message[len("handles: "):]
-                context["error"] = message
-            else:
-                new_users = []
-                updated_users = []
-                for cf_user in cf_users:
-                    try:
-                        user = User.objects.get(username=cf_user.username)
-                        user.first_name = cf_user.first_name
-                        user.last_name = cf_user.last_name
-                        user.save()
-                        updated_users.append(cf_user.username)
-                    except User.DoesNotExist:
-                        User.objects.create_user(cf_user.username, first_name=cf_user.first_name, last_name=cf_user.last_name)
-                        new_users.append(cf_user.username)
-                if new_users:
-                    plural = 's' if len(new_users) > 1 else ''
-                    context["add_success"] = "Successfully added user{} {}.".format(plural, ", ".join(new_users))
-                if updated_users:
-                    plural = 's' if len(updated_users) > 1 else ''
-                    context["update_success"] = "Successfully updated user{} {}.".format(plural, ", ".join(updated_users))
-        else:
+                text = request.FILES["csv_file"].read().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                text = ""
+                context["error"] = "The CSV file must be in UTF-8."
+            handles = importing.parse_handles(' '.join(handles + importing.parse_csv(text)))
+        if len(handles) > settings.IMPORT_MAX_WEB_HANDLES:
+            context["error"] = ("At most {} users can be added at once, and {} were given. Add them in parts, "
+                "or import them with manage.py import_handles.".format(settings.IMPORT_MAX_WEB_HANDLES, len(handles)))
+        elif handles:
+            outcomes = importing.import_handles(handles, max_calls=settings.IMPORT_MAX_WEB_CALLS)
+            by_outcome = {} # type: Dict[str, List[str]]
+            for handle, outcome in outcomes.items():
+                by_outcome.setdefault(outcome, []).append(handle)
+            new_users = by_outcome.get(importing.CREATED, [])
+            updated_users = by_outcome.get(importing.UPDATED, []) + by_outcome.get(importing.UNCHANGED, [])
+            if new_users:
+                plural = 's' if len(new_users) > 1 else ''
+                context["add_success"] = "Successfully added user{} {}.".format(plural, ", ".join(new_users))
+            if updated_users:
+                plural = 's' if len(updated_users) > 1 else ''
+                context["update_success"] = "Successfully updated user{} {}.".format(plural, ", ".join(updated_users))
+            errors = []
+            if importing.NOT_FOUND in by_outcome:
+                errors.append("Users not found: {}.".format(", ".join(by_outcome[importing.NOT_FOUND])))
+            if importing.FAILED in by_outcome:
+                errors.append("Could not check users (try again later): {}.".format(
+                    ", ".join(by_outcome[importing.FAILED])))
+            if importing.UNCHECKED in by_outcome:
+                errors.append("Too many users were not found to check the rest in one go; add them again: {}.".format(
+                    ", ".join(by_outcome[importing.UNCHECKED])))
+            if errors:
+                context["error"] = " ".join(errors)
+        elif "error" not in context:
             context["error"] = "Usernames field cannot be empty."
+    context["groups"] = sorted(get_handle_set().groups.values(), key=lambda group: group.name)
     return render(request, "index.html", context)
@@ -0,0 +1,28 @@
+"""
+Work which a process would otherwise do while serving its first requests:
+importing the URLconf and views, compiling templates and reading the
+stylesheets inlined in pages. project_conf.wsgi.create_app() does it in
+gunicorn's master process, so that forked workers start with it done.
+"""
+
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+TEMPLATES = ['base.html', 'index.html', 'ldrbrd.html', 'ldrbrd_table.html', 'season.html']
+
+def warm_up():
+    # type: () -> None
+    # Importing the URLconf imports the views and everything they use.
+    get_resolver().url_patterns
+    # Compiled templates are kept by the cached template loader (when DEBUG is off).
+    for name in TEMPLATES:
+        get_template(name)
+    from .views import templates_version
+    templates_version()
+    # Modules which cf_get imports on its first API call.
+    from . import cf_get
+    cf_get._requests()
+    cf_get._ijson()
+    # Forked workers must not share database connections with the master.
+    connections.close_all()
@@ -0,0 +1,300 @@
+"""
+A background refresher, run by `python manage.py refresh_worker`.
+
+It keeps the standings cache warm for contests which are running, about to
+start or have just finished, and refreshes stale handle data, so that web
+processes rarely have to call Codeforces inline.
+
+Contests are discovered from contest.list and from contests in the database
+which haven't finished. Each contest is refreshed at an interval which
+depends on its phase and on the time left: upcoming contests are first
+refreshed when they start, running contests as often as the cache TTL of
+their phase allows, and finished contests less and less often until they
+are dropped (by then their standings are in the database).
+
+Jobs run on a bounded thread pool. Metrics (queue depth, refresh lag, ...)
+are logged and stored in the cache under METRICS_KEY.
+
+All of this only helps web processes if they read the same cache, so the
+worker refuses to run with a cache backend which other machines can't see
+(see check_cache_shared).
+"""
+
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from . import cf_get
+from . import models
+from . import timing
+from . import userinfo
+from .caching import get_fresh_standings_entry, ttl_for_phase
+from .handles import get_handle_set
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = 'refresh_worker:metrics'
+
+DISCOVER = 'discover'
+HANDLES = 'handles'
+METRICS = 'metrics'
+
+# Contests are dropped after this many failed refreshes in a row.
+MAX_CONTEST_FAILURES = 5
+
+class ScheduledContest:
+    def __init__(self, contest_id, phase, start_time=None, end_time=None):
+        # type: (int, str, Optional[int], Optional[int]) -> None
+        self.contest_id = contest_id
+        self.phase = phase
+        self.start_time = start_time
+        self.end_time = end_time
+        # Refreshes since the contest was first seen FINISHED.
+        self.finished_refreshes = 0
+
+def contest_interval(contest, now):
+    # type: (ScheduledContest, float) -> Optional[float]
+    """Seconds until the next refresh of a contest, or None to stop refreshing it."""
+    if contest.phase == 'BEFORE':
+        if contest.start_time is not None and contest.start_time > now:
+            return min(contest.start_time - now, settings.WORKER_MAX_INTERVAL)
+        return ttl_for_phase('BEFORE')
+    elif contest.phase == 'CODING':
+        interval = ttl_for_phase('CODING')
+        if contest.end_time is not None and contest.end_time > now:
+            # Refresh right after the end too, to catch the final standings.
+            interval = min(interval, contest.end_time - now + 1)
+        return interval
+    elif contest.phase == 'FINISHED':
+        if contest.finished_refreshes > settings.WORKER_FINISHED_REFRESHES:
+            return None
+        return min(settings.CF_STANDINGS_TTL_DEFAULT * 2 ** contest.finished_refreshes,
+            settings.WORKER_MAX_INTERVAL)
+    return ttl_for_phase(contest.phase)
+
+# Backends whose entries are only seen by one process, or one machine.
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache')
+MACHINE_LOCAL_CACHES = ('django.core.cache.backends.filebased.FileBasedCache',)
+
+def check_cache_shared(same_machine=False):
+    # type: (bool) -> Optional[str]
+    """
+    Return why the default cache isn't shared with web processes, or None
+    if it is. same_machine allows caches which are only shared by the
+    processes of one machine.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in PROCESS_LOCAL_CACHES:
+        return '{} is private to each process'.format(backend)
+    if backend in MACHINE_LOCAL_CACHES and not same_machine:
+        return '{} is private to each machine (or dyno)'.format(backend)
+    return None
+
+def failure_interval(failures):
+    # type: (int) -> float
+    return min(settings.CF_STANDINGS_TTL_DEFAULT * 2 ** (failures - 1), settings.WORKER_MAX_INTERVAL)
+
+class RefreshWorker:
+    def __init__(self, threads=None):
+        # type: (Optional[int]) -> None
+        self.threads = threads or settings.WORKER_THREADS
+        self.executor = ThreadPoolExecutor(self.threads)
+        # Jobs are only handed to the pool when a thread is free, so jobs which
+        # are due but waiting stay in the heap, where they are counted.
+        self.slots = threading.BoundedSemaphore(self.threads)
+        self.lock = threading.Condition()
+        self.heap = [] # type: List[Tuple[float, int, Any]]
+        self.seq = 0
+        self.running = set() # type: Set[Any]
+        self.contests = {} # type: Dict[int, ScheduledContest]
+        self.failures = {} # type: Dict[Any, int]
+        self.stopped = threading.Event()
+        self.stats = {'refreshed': 0, 'failed': 0, 'lag': 0.0, 'max_lag': 0.0}
+
+    def schedule(self, job, delay):
+        # type: (Any, float) -> None
+        with self.lock:
+            self.seq += 1
+            heapq.heappush(self.heap, (time.time() + delay, self.seq, job))
+            self.lock.notify()
+
+    def stop(self):
+        # type: () -> None
+        self.stopped.set()
+        with self.lock:
+            self.lock.notify()
+
+    def next_job(self):
+        # type: () -> Optional[Tuple[float, Any]]
+        with self.lock:
+            while not self.stopped.is_set():
+                if self.heap and self.heap[0][0] <= time.time():
+                    due, _, job = heapq.heappop(self.heap)
+                    return (due, job)
+                timeout = self.heap[0][0] - time.time() if self.heap else None
+                self.lock.wait(timeout)
+        return None
+
+    def run(self):
+        # type: () -> None
+        self.schedule(DISCOVER, 0)
+        self.schedule(HANDLES, 0)
+        self.schedule(METRICS, settings.WORKER_METRICS_INTERVAL)
+        while True:
+            self.slots.acquire()
+            item = self.next_job()
+            if item is None:
+                break
+            due, job = item
+            if job == METRICS:
+                self.report()
+                self.schedule(METRICS, settings.WORKER_METRICS_INTERVAL)
+                self.slots.release()
+                continue
+            with self.lock:
+                if job in self.running:
+                    # Already being refreshed; it is rescheduled when that's done.
+                    self.slots.release()
+                    continue
+                self.running.add(job)
+                lag = time.time() - due
+                self.stats['lag'] = lag
+                self.stats['max_lag'] = max(self.stats['max_lag'], lag)
+            self.executor.submit(self.run_job, job)
+        self.executor.shutdown(wait=True)
+
+    def run_job(self, job):
+        # type: (Any) -> None
+        # Jobs run on several threads; failures and stats are only changed under the lock.
+        delay = None # type: Optional[float]
+        failures = 0
+        try:
+            if job == DISCOVER:
+                self.discover()
+                delay = settings.WORKER_DISCOVERY_INTERVAL
+            elif job == HANDLES:
+                self.refresh_handles()
+                delay = settings.WORKER_HANDLES_INTERVAL
+            else:
+                with self.lock:
+                    scheduled = self.contests[job]
+                delay = self.refresh_contest(scheduled)
+            with self.lock:
+                self.failures.pop(job, None)
+                self.stats['refreshed'] += 1
+        except Exception:
+            with self.lock:
+                failures = self.failures[job] = self.failures.get(job, 0) + 1
+                self.stats['failed'] += 1
+            logger.warning('Refresh of %s failed (%d in a row)', job, failures, exc_info=True)
+            delay = failure_interval(failures)
+        finally:
+            connection.close()
+            with self.lock:
+                self.running.discard(job)
+            self.slots.release()
+        if isinstance(job, int) and failures >= MAX_CONTEST_FAILURES:
+            logger.warning('Giving up on contest %d', job)
+            delay = None
+        if delay is None:
+            logger.info('No longer refreshing contest %d', job)
+            with self.lock:
+                del self.contests[job]
+                self.failures.pop(job, None)
+        else:
+            self.schedule(job, delay)
+
+    def add_contest(self, contest):
+        # type: (ScheduledContest) -> None
+        with self.lock:
+            known = self.contests.get(contest.contest_id)
+            if known is not None:
+                # Phases from standings are more recent than those from contest.list.
+                known.start_time = contest.start_time or known.start_time
+                known.end_time = contest.end_time or known.end_time
+                return
+            self.contests[contest.contest_id] = contest
+        now = time.time()
+        delay = 0.0
+        if contest.phase == 'BEFORE' and contest.start_time is not None:
+            delay = max(0.0, contest.start_time - now)
+        self.schedule(contest.contest_id, delay)
+
+    def discover(self):
+        # type: () -> None
+        now = time.time()
+        finished = set(models.Contest.objects.filter(phase='FINISHED').values_list('contest_id', flat=True))
+        for contest in cf_get.get_contest_list(cf_get.PRIORITY_BACKGROUND):
+            if contest.phase == 'BEFORE':
+                wanted = contest.start_time is not None and contest.start_time - now < settings.WORKER_LOOKAHEAD
+            elif contest.phase == 'FINISHED':
+                wanted = (contest.id not in finished and contest.end_time is not None
+                    and now - contest.end_time < settings.WORKER_LOOKBEHIND)
+            else:
+                wanted = True
+            if wanted:
+                self.add_contest(ScheduledContest(contest.id, contest.phase,
+                    contest.start_time, contest.end_time))
+        # Contests which people have looked at and which aren't over,
+        # including ones contest.list doesn't return (like gym contests).
+        unfinished = models.Contest.objects.exclude(phase='FINISHED').values_list('contest_id', 'phase')
+        for contest_id, phase in unfinished.distinct():
+            self.add_contest(ScheduledContest(contest_id, phase))
+
+    def refresh_contest(self, scheduled):
+        # type: (ScheduledContest) -> Optional[float]
+        now = time.time()
+        if not (scheduled.phase == 'BEFORE' and scheduled.start_time is not None
+                and scheduled.start_time > now):
+            handle_set = get_handle_set()
+            entry = get_fresh_standings_entry(scheduled.contest_id, handle_set.usernames,
+                settings.SHOW_UNOFFICIAL, cf_get.PRIORITY_BACKGROUND, handle_set.digest)
+            contest = entry['value'][0]
+            scheduled.phase = contest.phase
+            scheduled.start_time = contest.start_time or scheduled.start_time
+            scheduled.end_time = contest.end_time or scheduled.end_time
+            if scheduled.phase == 'FINISHED':
+                scheduled.finished_refreshes += 1
+        return contest_interval(scheduled, now)
+
+    def refresh_handles(self):
+        # type: () -> None
+        usernames = userinfo.stale_handles(get_handle_set())
+        if usernames:
+            userinfo.refresh_handles(usernames)
+
+    def metrics(self):
+        # type: () -> Dict[str, Any]
+        now = time.time()
+        with self.lock:
+            due = [job for due, _, job in self.heap if due <= now]
+            return {
+                'queue_depth': len(due),
+                'in_flight': len(self.running),
+                'scheduled_contests': len(self.contests),
+                'refreshed': self.stats['refreshed'],
+                'failed': self.stats['failed'],
+                'lag': round(self.stats['lag'], 3),
+                'max_lag': round(self.stats['max_lag'], 3),
+                'updated_at': now,
+            }
+
+    def report(self):
+        # type: () -> None
+        with self.lock:
+            metrics = self.metrics()
+            self.stats['max_lag'] = 0.0
+        cache.set(METRICS_KEY, metrics, 10 * settings.WORKER_METRICS_INTERVAL)
+        # Its API calls are summed into /metrics with those of the web processes.
+        timing.publish()
+        logger.info('queue_depth=%(queue_depth)d in_flight=%(in_flight)d '
+            'scheduled_contests=%(scheduled_contests)d refreshed=%(refreshed)d failed=%(failed)d '
+            'lag=%(lag).3f max_lag=%(max_lag).3f', metrics)
@@ -0,0 +1,19 @@
+"ASGI config: It exposes the ASGI callable as a module-level variable named ``application``."
+
+import os
+from os.path import dirname, abspath
+
+from django.core.asgi import get_asgi_application
+
+CONF_DIR = dirname(abspath(__file__))
+BASE_DIR = dirname(CONF_DIR)
+CONF_DIR_NAME = os.path.relpath(CONF_DIR, BASE_DIR)
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", CONF_DIR_NAME + ".settings")
+# Route leaderboard pages to async views; see ASYNC_VIEWS in settings.
+os.environ.setdefault("ASYNC_VIEWS", "1")
+django_application = get_asgi_application()
+
+# Live leaderboards are streamed without holding a thread each (see main.live).
+from main.live import asgi_app
+application = asgi_app(django_application)
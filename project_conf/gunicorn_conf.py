@@ -0,0 +1,23 @@
+"""
+Gunicorn config: every worker keeps its own pooled Codeforces API session.
+
+Use it as `gunicorn "project_conf.wsgi:create_app()" --config project_conf/gunicorn_conf.py`.
+"""
+
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+keepalive = 5
+# Load the app (see create_app in wsgi.py) in the master, once, instead of
+# in every worker; workers which are restarted come up without importing it.
+preload_app = True
+
+def post_fork(server, worker):
+    # Connections inherited from the master must not be shared with it.
+    from main import cf_get
+    cf_get.reset_session()
+
+def worker_exit(server, worker):
+    from main import cf_get
+    cf_get.close_session()
@@ -1,6 +1,7 @@
 "Generated by 'django-admin startproject' using Django 1.9.6."
 
 import os
+import tempfile
 from os.path import dirname, abspath
 
 CONF_DIR = dirname(dirname(abspath(__file__)))
@@ -12,6 +13,114 @@ PROJECT_TITLE = 'Codeforces Leaderboard'
 
 SHOW_UNOFFICIAL = True
 SHOW_ADD_USERS_PAGE = True
+# Prometheus metrics at /metrics, summed over the processes which share the cache.
+SHOW_METRICS_PAGE = False
+# Seconds between each process storing its metrics in the cache, and after
+# which the metrics of a process which stopped doing so are dropped.
+METRICS_PUBLISH_INTERVAL = 10
+METRICS_PROCESS_TIMEOUT = 60 * 60
+
+# Serve leaderboards from async views. project_conf/asgi.py turns this on.
+ASYNC_VIEWS = bool(os.environ.get('ASYNC_VIEWS'))
+
+# Codeforces API client: connection pool size and (connect, read) timeouts in seconds.
+CF_API_POOL_CONNECTIONS = 2
+CF_API_POOL_MAXSIZE = 10
+CF_API_TIMEOUT = (3.05, 20.0)
+CF_API_BASE_URL = os.environ.get('CF_API_BASE_URL', 'http://codeforces.com/api')
+
+# 'live', 'record' (call the API and save responses in CF_API_FIXTURE_DIR)
+# or 'replay' (answer API calls from CF_API_FIXTURE_DIR, without network access).
+CF_API_MODE = os.environ.get('CF_API_MODE', 'live')
+CF_API_FIXTURE_DIR = os.environ.get('CF_API_FIXTURE_DIR', os.path.join(BASE_DIR, 'cf_fixtures'))
+
+# Codeforces allows about one API call every two seconds per IP.
+# All worker processes share a token bucket with this rate (calls per second)
+# and burst size. Transient failures are retried up to CF_API_MAX_RETRIES times.
+CF_API_RATE_LIMIT = 0.5
+CF_API_BURST = 4
+CF_API_MAX_RETRIES = 3
+
+# Maximum number of handles in a single API call, to keep URLs short enough.
+# Longer handle lists are fetched in chunks, up to CF_API_MAX_PARALLEL at a time.
+CF_API_HANDLES_PER_REQUEST = 300
+
+CF_API_MAX_PARALLEL = 4
+
+# Most handles the add users form imports at once, and most API calls it makes
+# for them, so that it finishes within the 30 s request timeout of Heroku.
+# Each chunk of handles is a call, and each handle which doesn't exist one
+# more: user.info fails naming one of them, and the chunk is asked for again
+# without it. Handles left when the calls run out are reported as unchecked.
+# Longer lists are imported with manage.py import_handles, which has no limit.
+IMPORT_MAX_WEB_HANDLES = 2 * CF_API_HANDLES_PER_REQUEST
+IMPORT_MAX_WEB_CALLS = 12
+
+# Ratings and colors of handles are refreshed in the background once older than this (seconds).
+CF_HANDLE_INFO_MAX_AGE = 24 * 60 * 60
+CF_HANDLE_REFRESH_TIMEOUT = 10 * 60
+
+# Seconds a process may keep its copy of the set of registered handles.
+# Changes to users normally invalidate it right away, through the cache.
+HANDLE_SET_MAX_AGE = 5 * 60
+
+# Contest standings cache: seconds an entry stays fresh, by contest phase.
+# Stale entries are served for up to CF_STANDINGS_STALE_TTL more seconds
+# while a background refresh runs.
+CF_STANDINGS_TTL = {
+    'BEFORE': 60,
+    'CODING': 10,
+    'PENDING_SYSTEM_TEST': 30,
+    'SYSTEM_TEST': 30,
+    'FINISHED': 6 * 60 * 60,
+}
+CF_STANDINGS_TTL_DEFAULT = 60
+CF_STANDINGS_STALE_TTL = 10 * 60
+CF_STANDINGS_REFRESH_TIMEOUT = 60
+
+# Rendered leaderboard tables are cached under a hash of their contents,
+# so this only bounds how long unused ones take up cache space.
+LDRBRD_RENDER_CACHE_TTL = 60 * 60
+
+# Snapshots of standings of running contests, for leaderboards at past times.
+# Seconds between snapshots, unless the phase changes:
+SNAPSHOT_INTERVAL = 60
+# Every this many snapshots, one holds the whole state instead of changes:
+SNAPSHOT_CHECKPOINT_EVERY = 30
+
+# Live leaderboards (Server-Sent Events).
+# Seconds between keep-alive comments on an idle stream:
+LIVE_HEARTBEAT = 15
+# Seconds a poller keeps running after its last viewer has left:
+LIVE_IDLE_TIMEOUT = 60
+# Events buffered per viewer; viewers which fall further behind are disconnected:
+LIVE_QUEUE_SIZE = 100
+# Seconds browsers wait before reconnecting:
+LIVE_RETRY = 3
+# Streams served at once by a process under WSGI, each of which holds a
+# thread. Half of the gunicorn threads, so that pages are still served:
+LIVE_MAX_STREAMS = max(int(os.environ.get('GUNICORN_THREADS', 4)) // 2, 1)
+# Seconds between polls of the JSON API by viewers who didn't get a stream:
+LIVE_POLL_INTERVAL = 15
+
+# Background refresher (python manage.py refresh_worker), in seconds unless noted.
+# Threads which refresh contests and handles:
+WORKER_THREADS = 4
+# How often to look for new contests:
+WORKER_DISCOVERY_INTERVAL = 10 * 60
+# Upcoming contests are scheduled once they start within this time:
+WORKER_LOOKAHEAD = 24 * 60 * 60
+# Finished contests are picked up if they ended within this time:
+WORKER_LOOKBEHIND = 24 * 60 * 60
+# Refreshes of a finished contest, at doubling intervals, before it is dropped:
+WORKER_FINISHED_REFRESHES = 4
+WORKER_MAX_INTERVAL = 6 * 60 * 60
+WORKER_HANDLES_INTERVAL = 10 * 60
+WORKER_METRICS_INTERVAL = 60
+
+# Directory for lock files used to coalesce API calls across worker processes.
+# Set to None to coalesce only within each process.
+CF_LOCK_DIR = os.path.join(tempfile.gettempdir(), PROJECT_NAME + '-locks')
 
 SECURE_CONTENT_TYPE_NOSNIFF = True
 SECURE_BROWSER_XSS_FILTER = True
@@ -27,10 +136,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'whitenoise.runserver_nostatic',
     'django.contrib.staticfiles',
+    'main.apps.MainConfig',
 ]
 
 MIDDLEWARE = [
+    # First, so that it times everything else.
+    'main.timing.timing_middleware',
     'django.middleware.security.SecurityMiddleware',
+    'main.staticfiles.static_files_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -60,6 +173,24 @@ TEMPLATES = [
 
 WSGI_APPLICATION = CONF_DIR_NAME + '.wsgi.application'
 
+# Timings of each request are logged by main.timing at INFO, and API calls by main.cf_get at DEBUG.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '{asctime} {name} {levelname} {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'main': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
 
 # Internationalization
 
@@ -68,35 +199,31 @@ USE_I18N = True
 USE_L10N = True
 USE_TZ = True
 
-# Customize admin site
-
-from django.contrib import admin
-admin.site.site_header = PROJECT_TITLE
-admin.site.site_title = PROJECT_TITLE
-
-
 # Static files (CSS, JavaScript, Images)
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
-STATICFILES_STORAGE = 'whitenoise.django.GzipManifestStaticFilesStorage'
-
-JQUERY_LOCAL_URL = STATIC_URL + 'jquery.js'
-JQUERY_CDN_URL = 'https://code.jquery.com/jquery-3.1.1.min.js'
-BOOTSTRAP_CSS_LOCAL_URL = STATIC_URL + 'bootstrap.css'
-BOOTSTRAP_JS_LOCAL_URL = STATIC_URL + 'bootstrap.js'
-BOOTSTRAP_CSS_CDN_URL = 'https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0-alpha.5/css/bootstrap.min.css'
-BOOTSTRAP_JS_CDN_URL = 'https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0-alpha.5/js/bootstrap.min.js'
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# collectstatic adds content hashes to file names, and gzip and brotli
+# (if the brotli package is installed) versions of them. WhiteNoise serves
+# files with hashed names with far-future, immutable Cache-Control headers.
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Import other settings
+# Chosen without importing anything, so that errors in local.py aren't
+# mistaken for its absence. Nothing is printed, since settings are loaded
+# by every process and command (main.apps logs which ones were used).
 
 if "HEROKU" in os.environ:
+    SETTINGS_FLAVOR = 'heroku'
+elif os.path.exists(os.path.join(CONF_DIR, 'settings', 'local.py')):
+    SETTINGS_FLAVOR = 'local'
+else:
+    SETTINGS_FLAVOR = 'default'
+
+if SETTINGS_FLAVOR == 'heroku':
     from .heroku import *
-    print("Using heroku settings")
+elif SETTINGS_FLAVOR == 'local':
+    from .local import *
 else:
-    try:
-        from .local import *
-        print("Using local settings")
-    except ImportError:
-        from .default import *
-        print("Using default settings")
+    from .default import *
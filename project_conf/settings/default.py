@@ -2,7 +2,6 @@ from __future__ import print_function
 
 import os
 from os.path import dirname, abspath
-from . import JQUERY_LOCAL_URL, BOOTSTRAP_CSS_LOCAL_URL, BOOTSTRAP_JS_LOCAL_URL
 
 CONF_DIR = dirname(dirname(abspath(__file__)))
 BASE_DIR = dirname(CONF_DIR)
@@ -23,17 +22,19 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'sqlite3.db'),
+        # Wait for locks held by concurrent writers (e.g. background refreshes).
+        'OPTIONS': {'timeout': 20},
     }
 }
 
-# Time zone
+# Cache
 
-TIME_ZONE = 'Asia/Kolkata'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
 
-# Static assets
+# Time zone
 
-os.makedirs(os.path.join(BASE_DIR, 'extstatic'), exist_ok=True)
-STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static'), os.path.join(BASE_DIR, 'extstatic')]
-JQUERY_URL = JQUERY_LOCAL_URL
-BOOTSTRAP_CSS_URL = BOOTSTRAP_CSS_LOCAL_URL
-BOOTSTRAP_JS_URL = BOOTSTRAP_JS_LOCAL_URL
+TIME_ZONE = 'Asia/Kolkata'
@@ -2,7 +2,6 @@ from __future__ import print_function
 
 import os
 from os.path import dirname, abspath
-from . import JQUERY_CDN_URL, BOOTSTRAP_CSS_CDN_URL, BOOTSTRAP_JS_CDN_URL
 
 CONF_DIR = dirname(dirname(abspath(__file__)))
 BASE_DIR = dirname(CONF_DIR)
@@ -26,17 +25,41 @@ AUTH_PASSWORD_VALIDATORS = [
 
 # Database
 
+# Connections are kept for CONN_MAX_AGE seconds, so that requests don't
+# each open a new one, and checked before they are reused (see main.db).
+# Every thread of every gunicorn worker holds one: keep
+# WEB_CONCURRENCY * GUNICORN_THREADS below the database's connection limit.
+
 import dj_database_url
-db_from_env = dj_database_url.config()
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 600))
+db_from_env = dj_database_url.config(conn_max_age=CONN_MAX_AGE)
+# Django < 4.1 ignores this; main.db.close_unusable, which runs on request_started,
+# reads it and does the check instead.
+db_from_env['CONN_HEALTH_CHECKS'] = True
 DATABASES = {'default': db_from_env}
 
-# Time zone
+# Cache
+# File-based, so that all gunicorn workers on a dyno share cached standings.
+# Dynos don't share files, so the background refresher needs the database
+# cache: set CACHE_TABLE and run `python manage.py createcachetable`.
 
-TIME_ZONE = 'Asia/Kolkata'
+import tempfile
+CACHE_TABLE = os.environ.get('CACHE_TABLE')
+if CACHE_TABLE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': CACHE_TABLE,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(tempfile.gettempdir(), 'cf_ldrbrd_cache'),
+        }
+    }
 
-# Static assets
+# Time zone
 
-STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
-JQUERY_URL = JQUERY_CDN_URL
-BOOTSTRAP_CSS_URL = BOOTSTRAP_CSS_CDN_URL
-BOOTSTRAP_JS_URL = BOOTSTRAP_JS_CDN_URL
+TIME_ZONE = 'Asia/Kolkata'
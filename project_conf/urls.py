@@ -1,10 +1,22 @@
 from django.conf.urls import url
+from django.conf import settings
 from django.contrib import admin
 import main.views
 
+ldrbrd_view = main.views.ldrbrd_async if settings.ASYNC_VIEWS else main.views.ldrbrd
+
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
     url(r'^$', main.views.index),
-    url(r'^ldrbrd/(?P<contest_id>[1-9]\d*)/$', main.views.ldrbrd),
-    url(r'^ldrbrd/$', main.views.ldrbrd),
+    url(r'^ldrbrd/(?P<contest_id>[1-9]\d*)/$', ldrbrd_view),
+    url(r'^ldrbrd/(?P<contest_id>[1-9]\d*)/live/$', main.views.ldrbrd_live),
+    url(r'^ldrbrd/(?P<contest_id>[1-9]\d*)/history/$', main.views.ldrbrd_history),
+    url(r'^ldrbrd/$', ldrbrd_view),
+    url(r'^group/(?P<group>[-\w]+)/ldrbrd/(?P<contest_id>[1-9]\d*)/$', ldrbrd_view),
+    url(r'^group/(?P<group>[-\w]+)/ldrbrd/(?P<contest_id>[1-9]\d*)/live/$', main.views.ldrbrd_live),
+    url(r'^group/(?P<group>[-\w]+)/ldrbrd/(?P<contest_id>[1-9]\d*)/history/$', main.views.ldrbrd_history),
+    url(r'^season/(?P<slug>[-\w]+)/$', main.views.season),
+    url(r'^api/ldrbrd/(?P<contest_id>[1-9]\d*)/$', main.views.ldrbrd_api),
+    url(r'^api/group/(?P<group>[-\w]+)/ldrbrd/(?P<contest_id>[1-9]\d*)/$', main.views.ldrbrd_api),
+    url(r'^metrics$', main.views.metrics),
 ]
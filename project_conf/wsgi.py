@@ -4,7 +4,6 @@ import os
 from os.path import dirname, abspath
 
 from django.core.wsgi import get_wsgi_application
-from whitenoise.django import DjangoWhiteNoise
 
 CONF_DIR = dirname(abspath(__file__))
 BASE_DIR = dirname(CONF_DIR)
@@ -12,4 +11,13 @@ CONF_DIR_NAME = os.path.relpath(CONF_DIR, BASE_DIR)
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", CONF_DIR_NAME + ".settings")
 application = get_wsgi_application()
-application = DjangoWhiteNoise(get_wsgi_application())
+
+def create_app():
+    """
+    Application factory for gunicorn ("project_conf.wsgi:create_app()"),
+    which also does the work of first requests (see main.warmup). With
+    preload_app, it runs once in the master, before workers are forked.
+    """
+    from main.warmup import warm_up
+    warm_up()
+    return application
@@ -0,0 +1,163 @@
+// Keeps the leaderboard table up to date with events from /ldrbrd/<contest_id>/live/.
+// See main/live.py for the format of events.
+(function() {
+    "use strict";
+    var script = document.currentScript;
+    var table = document.getElementById("ldrbrd");
+    var phase = document.getElementById("phase");
+    var rows = {};
+    var order = [];
+
+    function keyOf(pair) {
+        return JSON.stringify(pair);
+    }
+
+    function escapeHtml(s) {
+        return String(s).replace(/[&<>"']/g, function(c) {
+            return "&#" + c.charCodeAt(0) + ";";
+        });
+    }
+
+    function formatTime(seconds) {
+        var h = Math.floor(seconds / 3600);
+        var m = Math.floor(seconds / 60) % 60;
+        var s = seconds % 60;
+        return h + ":" + (m < 10 ? "0" : "") + m + ":" + (s < 10 ? "0" : "") + s;
+    }
+
+    function loadSnapshot(board) {
+        var p = board.participants;
+        rows = {};
+        order = [];
+        for (var i = 0; i < p.username.length; i++) {
+            var key = keyOf([p.username[i], p.type[i]]);
+            var attempts = [];
+            for (var j = 0; j < p.attempts.points[i].length; j++) {
+                attempts.push([p.attempts.points[i][j], p.attempts.rejects[i][j], p.attempts.time[i][j]]);
+            }
+            rows[key] = {username: p.username[i], type: p.type[i], rank: p.rank[i],
+                points: p.points[i], is_team: p.is_team[i], color: p.color[i], attempts: attempts};
+            order.push(key);
+        }
+        phase.textContent = board.contest.phase;
+    }
+
+    function applyDiff(diff) {
+        var i;
+        if (diff.contest) {
+            phase.textContent = diff.contest.phase;
+        }
+        (diff.removed || []).forEach(function(pair) {
+            delete rows[keyOf(pair)];
+        });
+        (diff.rows || []).forEach(function(changed) {
+            var key = keyOf(changed.key);
+            var row = rows[key];
+            if (!row) {
+                row = rows[key] = {username: changed.key[0], type: changed.key[1], attempts: []};
+                order.push(key);
+            }
+            ["rank", "points", "is_team", "color"].forEach(function(field) {
+                if (field in changed) {
+                    row[field] = changed[field];
+                }
+            });
+            for (i in changed.attempts || {}) {
+                row.attempts[+i] = changed.attempts[i];
+            }
+        });
+        if (diff.order) {
+            order = diff.order.map(keyOf);
+        } else {
+            order = order.filter(function(key) { return key in rows; });
+        }
+    }
+
+    // Mirrors templates/ldrbrd_table.html and main.groups.set_intra_ranks.
+    function renderRow(p, intraRank) {
+        var cells = [];
+        cells.push(p.rank ? "<td> " + intraRank + " </td><td> " + p.rank + " </td>" : "<td></td><td></td>");
+        var name = escapeHtml(p.username);
+        if (!p.is_team) {
+            name = '<a href="http://codeforces.com/profile/' + name + '"' +
+                (p.color ? ' class="cf_' + escapeHtml(p.color) + ' cf_user"' : "") + ">" + name + "</a>";
+        }
+        cells.push("<td> " + name + (p.type !== "CONTESTANT" ? "*" : "") + " </td>");
+        cells.push("<td> " + p.points + " </td>");
+        p.attempts.forEach(function(a) {
+            if (a[0] === 0) {
+                cells.push("<td> - </td>");
+            } else {
+                cells.push("<td> " + a[0] + (p.type !== "PRACTICE" ? " <br />(" + formatTime(a[2]) + ")" : "") + "</td>");
+            }
+        });
+        return "<tr>" + cells.join("") + "</tr>";
+    }
+
+    function render() {
+        var intraRank = 0, previous = null;
+        table.tBodies[0].innerHTML = order.map(function(key, i) {
+            if (rows[key].rank !== previous) {
+                intraRank = i + 1;
+                previous = rows[key].rank;
+            }
+            return renderRow(rows[key], intraRank);
+        }).join("");
+    }
+
+    // Used when the server has no stream to spare (it answers 204, after which
+    // EventSource gives up) or the browser has no EventSource.
+    function poll() {
+        var interval = +script.getAttribute("data-poll-interval") * 1000;
+        // no-cache revalidates with the ETag, so unchanged boards cost a 304.
+        fetch(script.getAttribute("data-api-url"), {cache: "no-cache"}).then(function(response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.json();
+        }).then(function(board) {
+            loadSnapshot(board);
+            render();
+            if (board.contest.phase !== "FINISHED") {
+                setTimeout(poll, interval);
+            }
+        }, function() {
+            showError("The leaderboard could not be refreshed.");
+        });
+    }
+
+    function showError(message) {
+        var notice = document.createElement("p");
+        notice.className = "alert alert-danger";
+        notice.textContent = message + " Reload the page to try again.";
+        table.parentNode.insertBefore(notice, table);
+    }
+
+    if (!table) {
+        return;
+    }
+    if (!window.EventSource) {
+        if (window.fetch) {
+            poll();
+        }
+        return;
+    }
+    var source = new EventSource(script.getAttribute("data-url"));
+    source.addEventListener("snapshot", function(e) {
+        loadSnapshot(JSON.parse(e.data));
+        render();
+    });
+    source.addEventListener("diff", function(e) {
+        applyDiff(JSON.parse(e.data));
+        render();
+    });
+    source.addEventListener("error", function(e) {
+        if (e.data) {
+            // Sent by the server when the standings can't be fetched.
+            source.close();
+            showError(JSON.parse(e.data).comment + ".");
+        } else if (source.readyState === EventSource.CLOSED && window.fetch) {
+            poll();
+        }
+    });
+})();